@@ -57,6 +57,9 @@ from .chromatin.chrom_analysis import (gauss_weighted_contact,
                                        rad_distr_hists,
                                        get_all_rog_stats,
                                        get_contact_mat_analysis,
+                                       stream_contact_mat_analysis,
+                                       sparse_gauss_weighted_contact,
+                                       sparse_contact_mat_analysis,
                                        get_end_end_distance,
                                        calc_rad_of_gyration,
                                        find_neighbors,
@@ -68,8 +71,16 @@ from .chromatin.chrom_analysis import (gauss_weighted_contact,
 
 from .chromatin.chrom_seed_scan_analysis import(get_scan_cond_data,
                                                 get_scan_avg_contact_mat,
+                                                get_scan_avg_contact_level,
+                                                get_scan_idx_dist_stats,
+                                                aggregate_scan_contacts,
                                                 get_scan_avg_kymo)
 
+from .chromatin.hic_pyramid import (coarsen_contact_mat,
+                                    write_hic_pyramid,
+                                    read_hic_level,
+                                    get_hic_bin_edges)
+
 
 from .chromatin.chrom_graph_funcs import (make_total_distr_plots,
                                           make_min_distr_plots,
@@ -38,11 +38,63 @@ def parse_args():
                                  'collect',
                                  'cluster',
                                  'connect',
-                                 'stress'
+                                 'stress',
+                                 'stress_field'
                                  ],
                         default=None,
                         help=" Specify analysis and what hdf5 file will be written.")
 
+    parser.add_argument("-w ", "--workers", type=int, default=1,
+                        help=" Number of processes used to parse files when collecting raw data or stress.")
+
+    parser.add_argument("--append", action='store_true',
+                        help=" When collecting, only add frames missing from an existing raw data or stress file.")
+
+    parser.add_argument("--stride", type=int, default=1,
+                        help=" Only read every stride-th ConBlock file when collecting stress.")
+
+    parser.add_argument("--grid", type=int, nargs=3, default=None,
+                        metavar=('NX', 'NY', 'NZ'),
+                        help=" Bins of the stress field grid over the simulation box.\n"
+                        " The stress field is binned per bead if not given.")
+
+    parser.add_argument("--layout", choices=['auto', 'frame', 'bead'],
+                        default='auto',
+                        help=" Chunk layout of collected raw data.\n"
+                        " frame: fast reads of whole frames\n"
+                        " bead: fast reads of bead time series")
+
+    parser.add_argument("--compression",
+                        choices=[None, 'gzip', 'lzf', 'blosc', 'zstd'],
+                        default=None,
+                        help=" Compression of collected raw data. blosc and zstd need hdf5plugin.")
+
+    parser.add_argument("--schema", choices=['packed', 'split', 'ragged'],
+                        default='packed',
+                        help=" Storage schema of collected raw data.\n"
+                        " packed: one float array per object kind\n"
+                        " split: float coordinates and int32 ids in separate data sets\n"
+                        " ragged: concatenated rows and frame offsets, for runs where\n"
+                        "         the number of sylinders or proteins changes")
+
+    parser.add_argument("--precision", choices=['f4', 'f8'], default='f4',
+                        help=" Floating point precision of collected raw data.")
+
+    parser.add_argument("--store", choices=[None, 'npy', 'zarr'], default=None,
+                        help=" Also export collected raw data to an array store that\n"
+                        " many processes can slice without loading it.\n"
+                        " npy: memory mapped .npy files, zarr: zarr group (needs zarr)")
+
+    parser.add_argument("--cache_size", type=float, default=2048,
+                        help=" Size in MB of cached analysis products kept per raw data file.\n"
+                        " Least recently used parameter sets are deleted beyond it.")
+
+    parser.add_argument("--memory", type=float, default=1024,
+                        help=" Memory budget in MB of streamed analyses (e.g. contact matrices).")
+
+    parser.add_argument("--threads", type=int, default=None,
+                        help=" Number of threads of multithreaded analysis kernels (default all cores).")
+
     parser.add_argument("-s ", "--start_index", type=int, default=0,
                         help=" At what time index to start analysis.")
 
@@ -107,6 +159,8 @@ def parse_args():
 
     # Post parsing changes to options
     opts.path = Path(opts.path).resolve()
+    opts.cache_bytes = int(opts.cache_size * 2**20)
+    opts.mem_bytes = int(opts.memory * 2**20)
     print(opts.path)
 
     opts.result_dir = opts.path / 'result'
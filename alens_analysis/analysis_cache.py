@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: analysis_cache.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Cache of analysis products in an HDF5 group. Every entry is a
+group keyed by a hash of the producing function, its parameters, and the
+identity of the raw data it was computed from, so different
+parameterizations are kept side by side and stale results are never reused.
+"""
+
+import hashlib
+import json
+import time
+import types
+import warnings
+
+import h5py
+import numpy as np
+
+CACHE_GRP_NAME = 'cache'
+# Products written to the analysis group before the cache existed are moved
+# here, under their own names, instead of being deleted
+UNKEYED_GRP_NAME = 'unkeyed'
+# Total size of cached data sets above which least recently used entries
+# are deleted
+DEFAULT_CACHE_BYTES = 2 * 2**30
+
+
+def _jsonable(val):
+    """Parameter value as a JSON serializable object."""
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (list, tuple)):
+        return [_jsonable(v) for v in val]
+    if isinstance(val, dict):
+        return {str(k): _jsonable(v) for k, v in val.items()}
+    return val
+
+
+def _hash_code(code, sha):
+    """Add the byte code, constants, and global names of a code object (and
+    of the functions and comprehensions defined in it) to a hash."""
+    sha.update(code.co_code)
+    sha.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(const, sha)
+        elif isinstance(const, frozenset):
+            # Set order depends on the per-process string hash seed
+            sha.update(repr(sorted(map(repr, const))).encode())
+        else:
+            sha.update(repr(const).encode())
+
+
+def get_func_id(func, version=None):
+    """Identity of an analysis function: its qualified name and a hash of its
+    byte code, constants, and names, so editing the function invalidates its
+    cached results. Edits to the functions it calls are not seen; bump
+    version when a change to them alters the results.
+
+    @param func Analysis function
+    @param version Version tag of the function's results (optional)
+    @return: Identity string
+
+    """
+    code = getattr(func, '__code__', None)
+    code_hash = ''
+    if code is not None:
+        sha = hashlib.sha1()
+        _hash_code(code, sha)
+        code_hash = sha.hexdigest()[:12]
+    func_id = f'{func.__module__}.{func.__qualname__}:{code_hash}'
+    return func_id if version is None else f'{func_id}:v{version}'
+
+
+def get_source_id(h5_data):
+    """Identity of the raw data of a file: shapes and completed frame counts
+    of the raw data sets and the last time. Does not use the file
+    modification time since the cache itself may live in the same file."""
+    ident = {}
+    if 'time' in h5_data:
+        time_dset = h5_data['time']
+        ident['time'] = [list(time_dset.shape),
+                         float(time_dset[-1]) if time_dset.shape[0] else None]
+    if 'raw_data' in h5_data:
+        posit_grp = h5_data['raw_data']
+        ident['schema'] = _jsonable(posit_grp.attrs.get('schema', 'packed'))
+        for name in posit_grp.keys():
+            dset = posit_grp[name]
+            ident[name] = [list(dset.shape),
+                           _jsonable(dset.attrs.get('nframes_complete'))]
+    return hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+
+
+def get_cache_key(func, params, source_id, version=None):
+    """Hash of an analysis function (and version tag), its parameters, and its
+    source data."""
+    key_dict = {'func': get_func_id(func, version),
+                'params': _jsonable(params),
+                'source': source_id}
+    return hashlib.sha1(
+        json.dumps(key_dict, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _group_nbytes(grp):
+    nbytes = [0]
+
+    def add(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            nbytes[0] += obj.size * obj.dtype.itemsize
+    grp.visititems(add)
+    return nbytes[0]
+
+
+class AnalysisCache():
+
+    """Parameter-keyed cache of analysis products in an HDF5 group.
+
+    Entries live in <analysis_grp>/cache/<name>/<key>. The functions in this
+    package that take an `analysis` group write their products into the
+    entry group they are given. After a lookup or store, soft links with the
+    names of the entry's products are made in the analysis group, so readers
+    of e.g. analysis/contact_kymo see the parameterization used last.
+
+    Usage mirrors the old `if name not in analysis_grp` checks:
+
+        entry, hit = cache.lookup('pos_kymo', get_pos_kymo_data, params)
+        if not hit:
+            get_pos_kymo_data(..., analysis=entry)
+            cache.store(entry)
+        pos_kymo = entry['pos_kymo'][...]
+    """
+
+    def __init__(self, analysis_grp, source_id,
+                 max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        @param analysis_grp HDF5 group opened for writing
+        @param source_id Identity of the raw data (see get_source_id)
+        @param max_bytes Total size of cached data sets to keep, None for no
+                         limit. Freed space in an HDF5 file is reused but the
+                         file does not shrink without h5repack.
+        """
+        self.analysis_grp = analysis_grp
+        self.cache_grp = analysis_grp.require_group(CACHE_GRP_NAME)
+        self.source_id = source_id
+        self.max_bytes = max_bytes
+        # Entries used while this cache is open are never evicted
+        self._used = set()
+
+    def key(self, func, params, version=None):
+        return get_cache_key(func, params, self.source_id, version)
+
+    def lookup(self, name, func, params, version=None):
+        """Entry group of an analysis product and whether it holds a complete
+        result.
+
+        @param name Name of the product (e.g. 'contact_mat')
+        @param func Function computing the product
+        @param params Dictionary of every parameter the product depends on,
+                      including keys of the entries it was computed from
+        @param version Version tag of func's results. Bump it when a change
+                       to a function func calls alters the product.
+        @return: (entry group, hit). On a miss the group is new and empty.
+
+        """
+        key = self.key(func, params, version)
+        name_grp = self.cache_grp.require_group(name)
+        entry = name_grp.get(key)
+        if entry is not None and entry.attrs.get('complete', False):
+            entry.attrs['last_used'] = time.time()
+            self._used.add(entry.name)
+            self._link(entry)
+            return entry, True
+        if entry is not None:
+            # Left over from an interrupted computation
+            del name_grp[key]
+        entry = name_grp.create_group(key)
+        entry.attrs['func'] = get_func_id(func, version)
+        entry.attrs['params'] = json.dumps(_jsonable(params), sort_keys=True)
+        entry.attrs['source'] = self.source_id
+        self._used.add(entry.name)
+        return entry, False
+
+    def store(self, entry):
+        """Mark an entry complete, link its products, and evict old entries
+        if the cache is over its size limit."""
+        entry.attrs['nbytes'] = _group_nbytes(entry)
+        entry.attrs['last_used'] = time.time()
+        entry.attrs['complete'] = True
+        self._link(entry)
+        self.evict()
+
+    def _link(self, entry):
+        for child in entry.keys():
+            link = self.analysis_grp.get(child, getlink=True)
+            if isinstance(link, h5py.SoftLink):
+                if link.path == f'{entry.name}/{child}':
+                    continue
+                # Link to another entry
+                del self.analysis_grp[child]
+            elif link is not None:
+                self._move_unkeyed(child)
+            self.analysis_grp[child] = h5py.SoftLink(f'{entry.name}/{child}')
+
+    def _move_unkeyed(self, child):
+        """Move a product written before the cache existed out of the way of
+        a link. Its parameters are unknown, so it is kept (and never evicted)
+        in <cache>/unkeyed instead of becoming an entry."""
+        unkeyed_grp = self.cache_grp.require_group(UNKEYED_GRP_NAME)
+        if child in unkeyed_grp:
+            del unkeyed_grp[child]
+        warnings.warn(f"Moving unkeyed {self.analysis_grp.name}/{child} to "
+                      f"{unkeyed_grp.name}/{child}.")
+        self.analysis_grp.move(child, f'{unkeyed_grp.name}/{child}')
+
+    def entries(self):
+        """All complete entries, least recently used first."""
+        entries = []
+        for name, name_grp in self.cache_grp.items():
+            if name == UNKEYED_GRP_NAME:
+                continue
+            for entry in name_grp.values():
+                if entry.attrs.get('complete', False):
+                    entries += [entry]
+        return sorted(entries, key=lambda e: e.attrs['last_used'])
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in
+        max_bytes. Entries used since the cache was opened are kept."""
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(int(e.attrs['nbytes']) for e in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name in self._used:
+                continue
+            total -= int(entry.attrs['nbytes'])
+            path = entry.name
+            del self.cache_grp.file[path]
+        self._unlink_dangling()
+
+    def _unlink_dangling(self):
+        """Remove links of the analysis group to evicted entries."""
+        for child in list(self.analysis_grp.keys()):
+            link = self.analysis_grp.get(child, getlink=True)
+            if (isinstance(link, h5py.SoftLink) and
+                    link.path.startswith(self.cache_grp.name) and
+                    link.path not in self.analysis_grp.file):
+                del self.analysis_grp[child]
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
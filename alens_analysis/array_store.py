@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: array_store.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Directory array stores of raw data (a directory of memory
+mapped .npy files or a zarr group) that are read through the same group and
+data set interface as an HDF5 raw data file. Slicing a data set of a store
+only reads the requested part, and any number of processes can read a store
+at once without going through the HDF5 library lock.
+"""
+
+import json
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+STORE_SUFFIXES = {'npy': '.npystore', 'zarr': '.zarr'}
+NPY_ATTRS_FILE = 'attrs.json'
+# Touched when an export finishes, so stores older than their raw data file
+# (or only partly written) are not used
+EXPORT_MARK_FILE = '.exported'
+
+
+def _to_json(val):
+    """Attribute value as a JSON serializable object."""
+    if isinstance(val, bytes):
+        return val.decode()
+    if isinstance(val, np.ndarray):
+        return [_to_json(v) for v in val.tolist()]
+    if isinstance(val, (list, tuple)):
+        return [_to_json(v) for v in val]
+    if isinstance(val, np.generic):
+        return val.item()
+    return val
+
+
+def _is_fancy(key):
+    """Whether an index holds integer or boolean arrays."""
+    if not isinstance(key, tuple):
+        key = (key,)
+    return any(isinstance(k, (list, np.ndarray)) for k in key)
+
+
+class NpyDirBackend():
+
+    """Data sets stored as .npy files (opened with np.memmap) in a directory
+    tree that mirrors the HDF5 groups. Attributes of every node are kept in
+    one JSON file at the root of the store."""
+
+    def __init__(self, root, mode='r'):
+        self.root = Path(root)
+        self.mode = mode
+        attrs_path = self.root / NPY_ATTRS_FILE
+        if attrs_path.exists():
+            with attrs_path.open('r') as f:
+                self._attrs = json.load(f)
+        else:
+            self._attrs = {}
+        self._arrays = {}
+
+    def _path(self, name):
+        return self.root / name.strip('/')
+
+    def is_array(self, name):
+        return self._path(name).with_suffix('.npy').is_file()
+
+    def is_group(self, name):
+        return self._path(name).is_dir()
+
+    def list(self, name):
+        path = self._path(name)
+        return sorted(p.stem if p.suffix == '.npy' else p.name
+                      for p in path.iterdir()
+                      if p.is_dir() or p.suffix == '.npy')
+
+    def open_array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self._path(name).with_suffix('.npy'),
+                                         mmap_mode='r')
+        return self._arrays[name]
+
+    def create_array(self, name, shape, dtype, chunks=None):
+        path = self._path(name).with_suffix('.npy')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                         shape=shape)
+
+    def create_group(self, name):
+        self._path(name).mkdir(parents=True, exist_ok=True)
+
+    def get_attrs(self, name):
+        return self._attrs.get(name.strip('/'), {})
+
+    def set_attrs(self, name, attrs):
+        self._attrs[name.strip('/')] = {k: _to_json(v)
+                                        for k, v in attrs.items()}
+
+    def flush(self):
+        if self.mode != 'r':
+            with (self.root / NPY_ATTRS_FILE).open('w') as f:
+                json.dump(self._attrs, f)
+
+
+class ZarrBackend():
+
+    """Data sets stored as chunked zarr arrays in a zarr group."""
+
+    def __init__(self, root, mode='r'):
+        if zarr is None:
+            raise ImportError('Zarr array stores require the zarr package.')
+        self.root = Path(root)
+        self.mode = mode
+        self.grp = zarr.open_group(str(root), mode=mode)
+
+    def _node(self, name):
+        name = name.strip('/')
+        return self.grp[name] if name else self.grp
+
+    def is_array(self, name):
+        return name.strip('/') in self.grp and isinstance(
+            self._node(name), zarr.Array)
+
+    def is_group(self, name):
+        return (not name.strip('/') or name.strip('/') in self.grp) and \
+            isinstance(self._node(name), zarr.Group)
+
+    def list(self, name):
+        return sorted(self._node(name).keys())
+
+    def open_array(self, name):
+        return self._node(name)
+
+    def create_array(self, name, shape, dtype, chunks=None):
+        return self.grp.create_dataset(name.strip('/'), shape=shape,
+                                       dtype=dtype, chunks=chunks or True,
+                                       overwrite=True)
+
+    def create_group(self, name):
+        self.grp.require_group(name.strip('/'))
+
+    def get_attrs(self, name):
+        return self._node(name).attrs.asdict()
+
+    def set_attrs(self, name, attrs):
+        self._node(name).attrs.update({k: _to_json(v)
+                                       for k, v in attrs.items()})
+
+    def flush(self):
+        pass
+
+
+STORE_BACKENDS = {'npy': NpyDirBackend,
+                  'zarr': ZarrBackend}
+
+
+class StoreDataset():
+
+    """Data set of an array store. Indexing reads only the requested part
+    and returns an in-memory ndarray, like an h5py.Dataset."""
+
+    def __init__(self, store, name):
+        self.file = store
+        self.name = name
+        self._arr = store.backend.open_array(name)
+        self.attrs = store.backend.get_attrs(name)
+
+    @property
+    def shape(self):
+        return tuple(self._arr.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(self._arr.dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if _is_fancy(key) and hasattr(self._arr, 'oindex'):
+            return np.asarray(self._arr.oindex[key])
+        out = self._arr[key]
+        # Copy out of the memory map like h5py reads into memory
+        return np.array(out) if isinstance(out, np.ndarray) else out
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[...], dtype=dtype)
+
+
+class StoreGroup():
+
+    """Group of an array store with the read interface of an h5py.Group."""
+
+    def __init__(self, store, name):
+        self.file = store
+        self.name = name
+        self.attrs = store.backend.get_attrs(name)
+
+    def _child(self, key):
+        return f'{self.name.rstrip("/")}/{key}'
+
+    def __contains__(self, key):
+        name = self._child(key)
+        return (self.file.backend.is_array(name)
+                or self.file.backend.is_group(name))
+
+    def __getitem__(self, key):
+        name = self._child(key)
+        if self.file.backend.is_array(name):
+            return StoreDataset(self.file, name)
+        if self.file.backend.is_group(name):
+            return StoreGroup(self.file, name)
+        raise KeyError(f"{key} is not in {self.name} of {self.file.filename}.")
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return self.file.backend.list(self.name)
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+class ArrayStore(StoreGroup):
+
+    """Root group of an array store. Can be used as a context manager like
+    h5py.File."""
+
+    def __init__(self, path, backend=None, mode='r'):
+        """
+        @param path Store directory
+        @param backend 'npy' or 'zarr', guessed from the suffix if None
+        @param mode 'r' to read or 'w' to create the store
+        """
+        path = Path(path)
+        if backend is None:
+            backend = get_store_backend_name(path)
+        self.filename = str(path)
+        self.backend = STORE_BACKENDS[backend](path, mode)
+        super().__init__(self, '/')
+
+    def close(self):
+        self.backend.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_store_backend_name(path):
+    """Backend of a store directory from its suffix."""
+    for name, suffix in STORE_SUFFIXES.items():
+        if Path(path).suffix == suffix:
+            return name
+    raise ValueError(f"{path} is not an array store. Store directories end "
+                     f"in one of {list(STORE_SUFFIXES.values())}.")
+
+
+def get_store_path(h5_path, backend):
+    """Path of the array store written beside a raw data file."""
+    h5_path = Path(h5_path)
+    return h5_path.with_suffix(STORE_SUFFIXES[backend])
+
+
+def export_raw_store(h5_path, backend='npy', store_path=None,
+                     frames_per_copy=256, rows_per_copy=2**20):
+    """Copy every group, data set, and attribute of a raw data file into an
+    array store.
+
+    Parameters
+    ----------
+    h5_path : Path
+        Raw data HDF5 file
+    backend : str, optional
+        'npy' (memory mapped .npy files) or 'zarr' (requires zarr), by
+        default 'npy'
+    store_path : Path, optional
+        Store directory, by default beside h5_path (see get_store_path)
+    frames_per_copy : int, optional
+        Number of frames (last axis) of a packed (N, ncols, nframes) data set
+        copied at once to bound memory, by default 256
+    rows_per_copy : int, optional
+        Number of rows (first axis) of any other data set, e.g. ragged
+        (total_rows, ncols) rows or offsets, copied at once, by default 2**20
+
+    Returns
+    -------
+    Path
+        Store directory
+    """
+    if store_path is None:
+        store_path = get_store_path(h5_path, backend)
+    store_path = Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+    (store_path / EXPORT_MARK_FILE).unlink(missing_ok=True)
+    dst = STORE_BACKENDS[backend](store_path, mode='w')
+
+    def copy_node(name, obj):
+        if isinstance(obj, h5py.Group):
+            dst.create_group(name)
+        else:
+            dst_arr = dst.create_array(name, obj.shape, obj.dtype, obj.chunks)
+            if obj.ndim == 0:
+                dst_arr[...] = obj[()]
+            elif obj.ndim == 3:
+                # Packed frames
+                n = obj.shape[-1]
+                for start in range(0, n, frames_per_copy):
+                    end = min(start + frames_per_copy, n)
+                    dst_arr[..., start:end] = obj[..., start:end]
+            else:
+                n = obj.shape[0]
+                for start in range(0, n, rows_per_copy):
+                    end = min(start + rows_per_copy, n)
+                    dst_arr[start:end] = obj[start:end]
+            if isinstance(dst_arr, np.memmap):
+                dst_arr.flush()
+        dst.set_attrs(name, obj.attrs)
+
+    with h5py.File(h5_path, 'r') as h5_data:
+        dst.set_attrs('', h5_data.attrs)
+        h5_data.visititems(copy_node)
+    dst.flush()
+    (store_path / EXPORT_MARK_FILE).touch()
+    return store_path
+
+
+def open_raw_data(path, mode='r'):
+    """Open a raw data HDF5 file or array store.
+
+    @param path: HDF5 file or store directory
+    @param mode: File mode. Stores can only be opened for reading.
+    @return: h5py.File or ArrayStore, both usable as context managers
+
+    """
+    path = Path(path)
+    if path.is_dir():
+        if mode != 'r':
+            raise ValueError(f"Array store {path} can only be read.")
+        return ArrayStore(path)
+    return h5py.File(path, mode)
+
+
+def find_raw_data(h5_path):
+    """Array store beside a raw data file if one was exported after the file
+    was last written, otherwise the raw data file itself."""
+    h5_path = Path(h5_path)
+    for backend in STORE_BACKENDS:
+        mark_path = get_store_path(h5_path, backend) / EXPORT_MARK_FILE
+        if (mark_path.exists() and
+                mark_path.stat().st_mtime >= h5_path.stat().st_mtime):
+            return mark_path.parent
+    return h5_path
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
@@ -7,11 +7,10 @@ Email: alamson@flatironinstitute.org
 Description:
 """
 # Basic useful imports
-import yaml
 import h5py
 from copy import deepcopy
 from time import time
-from functools import reduce
+from functools import reduce, partial
 
 
 # Data manipulation
@@ -19,11 +18,19 @@ import numpy as np
 import torch
 import scipy.stats as stats
 from scipy.signal import savgol_filter
+from scipy.sparse import coo_matrix
 
 # Clustering stuff
 from itertools import cycle
 
-from ..helpers import contiguous_regions, Timer
+from ..helpers import batch_contiguous_regions, Timer
+from ..raw_schema import get_raw_dset
+from ..array_store import open_raw_data, find_raw_data
+from ..sim_data import get_sim_data
+from ..time_blocks import iter_time_blocks
+from ..periodic import find_pairs_within, pair_distances
+from .contact_kernels import accumulate_contacts, get_kernel_block_size
+from .hic_pyramid import write_hic_pyramid, PYRAMID_GRP_NAME
 
 from .chrom_poly_stats import get_connect_torch_smat, get_connect_smat, connect_autocorr, connect_diag_autocorr
 
@@ -40,18 +47,55 @@ def log_gauss_weighted_contact(sep_mat, sigma=.020):
     return -np.power(sep_mat, 2) / (2. * (sigma * sigma)) / np.log(10)
 
 
+def sparse_gauss_weighted_contact(com_arr, sigma=.020, radius_arr=None,
+                                  n_sigma=5., box_size=None):
+    """Gaussian weighted contact matrix of a single frame, keeping only pairs
+    within n_sigma * sigma of contact. Beyond that the weights of
+    gauss_weighted_contact are below exp(-n_sigma**2 / 2).
+
+    @param com_arr Nx3 array of bead centers at one time
+    @param sigma Width of the Gaussian contact weight
+    @param radius_arr Bead radii; contact is measured from the bead surfaces
+    @param n_sigma Number of sigmas beyond contact to keep
+    @param box_size Lengths of a periodic box, None if not periodic
+    @return: NxN scipy.sparse csr_matrix of contact weights (with the
+             diagonal, like gauss_weighted_contact)
+
+    """
+    nbeads = com_arr.shape[0]
+    cutoff = n_sigma * sigma
+    if radius_arr is not None:
+        radius_arr = np.asarray(radius_arr)
+        cutoff += 2. * radius_arr.max()
+    i_ind, j_ind, sep_vec = find_pairs_within(com_arr, cutoff, box_size)
+    sep = np.linalg.norm(sep_vec, axis=1)
+    diag = np.zeros(nbeads)
+    if radius_arr is not None:
+        sep -= radius_arr[i_ind] + radius_arr[j_ind]
+        diag -= 2. * radius_arr
+    weights = np.exp(-np.power(np.concatenate([sep, sep, diag]), 2) /
+                     (2. * (sigma * sigma)))
+    diag_ind = np.arange(nbeads)
+    rows = np.concatenate([i_ind, j_ind, diag_ind])
+    cols = np.concatenate([j_ind, i_ind, diag_ind])
+    return coo_matrix((weights, (rows, cols)),
+                      shape=(nbeads, nbeads)).tocsr()
+
+
 def get_link_energy_arrays(h5_data, write=False):
     """ Get the mean, standard deviation, and expected energy of all links in
     a bead-spring chain
 
-    @param h5_data HDF5 data file to analyze with all raw data about filaments
+    @param h5_data HDF5 data file (or SimulationData) to analyze with all raw
+                   data about filaments
     @param write If true, will write data directly to the analysis group in
                  the h5_data file.
     @return: TODO
 
     """
-    sy_dat = h5_data['raw_data']['sylinders'][...]
-    params = yaml.safe_load(h5_data.attrs['RunConfig'])
+    sim = get_sim_data(h5_data)
+    sy_dat = sim.sylinders()
+    params = sim.run_params
     k_spring = params['linkKappa']
     kbt = params['KBT']
 
@@ -76,23 +120,27 @@ def get_link_energy_arrays(h5_data, write=False):
 def get_link_tension(h5_data, write=False):
     """ Get the force on a bead for every time step
 
-    @param h5_data HDF5 data file to analyze with all raw data about filaments
+    @param h5_data HDF5 data file (or SimulationData) to analyze with all raw
+                   data about filaments
     @param write If true, will write data directly to the analysis group in
                  the h5_data file.
     @return: TODO
 
     """
-    sy_dat = h5_data['raw_data']['sylinders'][...]
-    params = yaml.safe_load(h5_data.attrs['RunConfig'])
-    k_spring = params['linkKappa']
+    sim = get_sim_data(h5_data)
 
-    rest_length = params['linkGap'] + sy_dat[1:, 1, :] + sy_dat[:-1, 1, :]
-    sep_vec = sy_dat[1:, 2:5, :] - sy_dat[:-1, 5:8, :]
+    def calc_tension():
+        sy_dat = sim.sylinders()
+        params = sim.run_params
+        k_spring = params['linkKappa']
 
-    sep_mag = np.linalg.norm(sep_vec, axis=1)
+        rest_length = params['linkGap'] + sy_dat[1:, 1, :] + sy_dat[:-1, 1, :]
+        sep_vec = sy_dat[1:, 2:5, :] - sy_dat[:-1, 5:8, :]
+
+        sep_mag = np.linalg.norm(sep_vec, axis=1)
 
-    tension_arr = k_spring * (sep_mag - rest_length)
-    return tension_arr
+        return k_spring * (sep_mag - rest_length)
+    return sim.memo('link_tension', calc_tension)
 
 
 def get_contact_kymo_data(contact_mat):
@@ -115,18 +163,17 @@ def get_pos_kymo_data(h5_data, ts_range=(0, None), bead_range=(0, None), bins=10
     time point in simulation.
 
 
-    @param h5_data Simulation hdf5 data
+    @param h5_data Simulation hdf5 data (or SimulationData)
     @return: TODO
 
     """
+    sim = get_sim_data(h5_data)
     # Get size of the system
-    params = yaml.safe_load(h5_data.attrs['RunConfig'])
+    params = sim.run_params
     sim_box_low = np.asarray(params['simBoxLow'])
     sim_box_high = np.asarray(params['simBoxHigh'])
     # Get center of mass of all beads for all times
-    sy_dat = h5_data['raw_data']['sylinders'][
-        bead_range[0]:bead_range[1], :, ts_range[0]:ts_range[-1]]
-    com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+    com_arr = sim.com(bead_range, ts_range)
     # Project bead positions onto unit vector from first to last bead
     proj_vec = com_arr[-1, :, 0] - com_arr[0, :, 0]
     proj_vec /= np.linalg.norm(proj_vec)
@@ -143,7 +190,7 @@ def get_pos_kymo_data(h5_data, ts_range=(0, None), bead_range=(0, None), bins=10
 
     hist_arr = np.asarray(hist_arr).T
 
-    time_arr = h5_data['time'][ts_range[0]:ts_range[-1]]
+    time_arr = sim.time(ts_range)
     if analysis is not None:
         pos_kymo_dset = analysis.create_dataset('pos_kymo', data=hist_arr)
         pos_kymo_bin_edges = analysis.create_dataset(
@@ -162,6 +209,14 @@ def get_pos_kymo_data(h5_data, ts_range=(0, None), bead_range=(0, None), bins=10
     return time_arr, hist_arr, bin_edges
 
 
+def get_cond_edge_coords(times, starts, ends):
+    """(M, 3) array of the time, start and end of every condensate, or an
+    empty array if there are none."""
+    if len(times) == 0:
+        return np.asarray([])
+    return np.column_stack((times, starts, ends))
+
+
 def get_contact_cond_data(time_arr, contact_kymo, threshold,
                           bead_win=0, time_win=0, analysis=None):
     """Given a contact kymo graph, finds condensates by regions that are above
@@ -177,18 +232,10 @@ def get_contact_cond_data(time_arr, contact_kymo, threshold,
     """
     # Doesn't matter which smoothing occurs first
     smooth_contact_kymo = smooth_kymo_mat(contact_kymo, bead_win, time_win)
-    cond_edge_coords = []
-    cond_num_arr = []
-    for i, t in enumerate(time_arr):
-        edges_inds = contiguous_regions(smooth_contact_kymo[:, i] > threshold)
-        cond_num_arr += [len(edges_inds)]
-        for start, end in edges_inds:
-            cond_edge_coords += [[t, start, end]]
-        # if len(edge_inds) == 0:
-            # cond_edge_coords += [[t, 0, 0]]
-
-    cond_edge_coords = np.asarray(cond_edge_coords)
-    cond_num_arr = np.asarray(cond_num_arr)
+    # Regions of every time point are found at once
+    time_inds, starts, ends, cond_num_arr = batch_contiguous_regions(
+        smooth_contact_kymo[:, :len(time_arr)] > threshold)
+    cond_edge_coords = get_cond_edge_coords(time_arr[time_inds], starts, ends)
     if analysis is not None:
         cond_edges_dset = analysis.create_dataset('contact_cond_edges',
                                                   data=cond_edge_coords)
@@ -235,16 +282,10 @@ def get_pos_cond_data(time_arr, pos_kymo, bin_centers, threshold,
     """
     smooth_pos_kymo = smooth_kymo_mat(pos_kymo, bin_win, time_win)
     # Doesn't matter which smoothing occurs first
-    cond_edge_coords = []
-    cond_num_arr = []
-    for i, t in enumerate(time_arr):
-        edges_inds = contiguous_regions(smooth_pos_kymo[:, i] > threshold)
-        cond_num_arr += [len(edges_inds)]
-        for start, end in edges_inds:
-            cond_edge_coords += [[t, bin_centers[start], bin_centers[end]]]
-
-    cond_edge_coords = np.asarray(cond_edge_coords)
-    cond_num_arr = np.asarray(cond_num_arr)
+    time_inds, starts, ends, cond_num_arr = batch_contiguous_regions(
+        smooth_pos_kymo[:, :len(time_arr)] > threshold)
+    cond_edge_coords = get_cond_edge_coords(
+        time_arr[time_inds], bin_centers[starts], bin_centers[ends])
     if analysis is not None:
         pos_cond_edge_dset = analysis.create_dataset(
             'pos_cond_edges', data=cond_edge_coords)
@@ -268,7 +309,7 @@ def get_sep_hist(h5_data, nbins=100, ss_ind=0, write=False):
     @return: TODO
 
     """
-    params = yaml.safe_load(h5_data.attrs['RunConfig'])
+    params = get_sim_data(h5_data).run_params
     hist_min = params['sylinderDiameter'] * .8
     hist_max = params['sylinderDiameter'] * 1.2
 
@@ -291,15 +332,11 @@ def get_sep_dist_mat(h5_data, ss_ind=0, bead_range=None, write=False):
     @return: TODO
 
     """
-    sy_dat = h5_data['raw_data']['sylinders'][...]
-
-    com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
-    if bead_range is not None:
-        com_arr = com_arr[bead_range[0]:bead_range[1]]
+    sim = get_sim_data(h5_data)
+    com_arr = sim.com(bead_range)
 
-    dist_mat = np.linalg.norm((com_arr[:, np.newaxis, :, ss_ind:] -
-                               com_arr[np.newaxis, :, :, ss_ind:]),
-                              axis=2)
+    # Minimum image distances if the run has a periodic box
+    dist_mat = pair_distances(com_arr[:, :, ss_ind:], sim.box_size)
 
     return dist_mat
 
@@ -475,7 +512,7 @@ def get_all_rog_stats(pos_mat, rel_ind=0):
 
 
 def get_contact_mat_analysis(com_arr, sigma=.02, avg_block_step=1, log=True,
-                             radius_arr=None, analysis=None):
+                             radius_arr=None, analysis=None, box_size=None):
     """Generate (and store if given an HDF5 directory) all analysis related to
     contact matrices related to chromatin. This is includes separation matrix at
     every time point (this is not stored because of the size), average contact
@@ -495,6 +532,9 @@ def get_contact_mat_analysis(com_arr, sigma=.02, avg_block_step=1, log=True,
         _description_, by default None
     analysis : _type_, optional
         _description_, by default None
+    box_size : array-like, optional
+        Lengths of a periodic box (zero along non-periodic axes), see
+        periodic.get_box_size, by default None
 
     Returns
     -------
@@ -503,8 +543,7 @@ def get_contact_mat_analysis(com_arr, sigma=.02, avg_block_step=1, log=True,
     """
     reduc_com_arr = com_arr[::avg_block_step, :, :]  # simple downsampling
 
-    sep_mat = np.linalg.norm(
-        reduc_com_arr[:, np.newaxis, :, :] - reduc_com_arr[np.newaxis, :, :, :], axis=2)
+    sep_mat = pair_distances(reduc_com_arr, box_size)
     # log_contact_mat = log_gauss_weighted_contact(sep_mat, sigma)
     contact_mat = gauss_weighted_contact(sep_mat, sigma, radius_arr)
     contact_kymo = get_contact_kymo_data(contact_mat)
@@ -515,23 +554,240 @@ def get_contact_mat_analysis(com_arr, sigma=.02, avg_block_step=1, log=True,
         avg_contact_mat = contact_mat.mean(axis=-1)
 
     if analysis is not None:
-        avg_contact_mat_dset = analysis.create_dataset('avg_contact_mat',
-                                                       data=avg_contact_mat)
-        avg_contact_mat_dset.attrs['sigma'] = sigma
-        avg_contact_mat_dset.attrs['avg_block_step'] = avg_block_step
-        avg_contact_mat_dset.attrs['log'] = log
-
-        contact_kymo = analysis.create_dataset('contact_kymo',
-                                               data=contact_kymo)
-        contact_kymo.attrs['sigma'] = sigma
-        contact_kymo.attrs['avg_block_step'] = avg_block_step
-        # contact_kymo.attrs['log'] = log
-        if radius_arr is not None:
-            avg_contact_mat_dset.attrs['radius_arr'] = radius_arr
-            contact_kymo.attrs['radius_arr'] = radius_arr
+        contact_kymo = write_contact_mat_analysis(
+            analysis, avg_contact_mat, contact_kymo, sigma, avg_block_step,
+            log, radius_arr)
     return avg_contact_mat, contact_mat, contact_kymo
 
 
+def write_contact_mat_analysis(analysis, avg_contact_mat, contact_kymo, sigma,
+                               avg_block_step, log, radius_arr=None):
+    """Store the average contact matrix and contact kymograph with the
+    parameters used to make them. The (linear) average contact matrix is
+    also stored as a multi-resolution pyramid (see hic_pyramid). Returns the
+    contact kymograph data set."""
+    avg_contact_mat_dset = analysis.create_dataset('avg_contact_mat',
+                                                   data=avg_contact_mat)
+    avg_contact_mat_dset.attrs['sigma'] = sigma
+    avg_contact_mat_dset.attrs['avg_block_step'] = avg_block_step
+    avg_contact_mat_dset.attrs['log'] = log
+
+    contact_kymo = analysis.create_dataset('contact_kymo',
+                                           data=contact_kymo)
+    contact_kymo.attrs['sigma'] = sigma
+    contact_kymo.attrs['avg_block_step'] = avg_block_step
+    # contact_kymo.attrs['log'] = log
+    if radius_arr is not None:
+        avg_contact_mat_dset.attrs['radius_arr'] = radius_arr
+        contact_kymo.attrs['radius_arr'] = radius_arr
+
+    pyramid_grp = analysis.require_group(PYRAMID_GRP_NAME)
+    write_hic_pyramid(pyramid_grp,
+                      np.exp(avg_contact_mat) if log else avg_contact_mat)
+    pyramid_grp.attrs['sigma'] = sigma
+    pyramid_grp.attrs['avg_block_step'] = avg_block_step
+    return contact_kymo
+
+
+def get_contact_block_size(nbeads, mem_bytes):
+    """Number of frames whose contact matrices fit in a memory budget. Each
+    frame needs the (N, N, 3) separation vectors plus the (N, N) separation
+    and contact matrices in float64."""
+    return max(1, int(mem_bytes // (5 * 8 * nbeads * nbeads)))
+
+
+def stream_contact_mat_analysis(com_src, sigma=.02, avg_block_step=1,
+                                log=True, radius_arr=None, analysis=None,
+                                mem_bytes=2**30, store_contact_mat=False,
+                                ts_range=(0, None), bead_range=(0, None),
+                                kernel='numpy', threads=None, box_size=None):
+    """Same analysis as get_contact_mat_analysis, but contact matrices are
+    made a block of frames at a time under a memory budget and only the
+    average contact matrix and the contact kymograph are accumulated.
+
+    Parameters
+    ----------
+    com_src : NxDxT ndarray, h5py.File, ArrayStore or SimulationData
+        Centers of mass, or a raw data file to stream them from
+    sigma : float, optional
+        Width of the Gaussian contact weight, by default .02
+    avg_block_step : int, optional
+        Only use every avg_block_step-th bead, by default 1
+    log : bool, optional
+        Return the log of the average contact matrix, by default True
+    radius_arr : ndarray, optional
+        Bead radii; contact is then measured from the bead surfaces, by
+        default None
+    analysis : h5py.Group, optional
+        Group to store the results in, by default None
+    mem_bytes : int, optional
+        Memory budget of the contact matrices of a block, by default 1 GiB
+    store_contact_mat : bool, optional
+        Write the contact matrix of every frame to a compressed
+        'contact_mat' data set of analysis instead of discarding it, by
+        default False
+    ts_range : tuple, optional
+        (start, stop) frames used when streaming from a file, by default
+        (0, None)
+    bead_range : tuple, optional
+        (start, stop) beads used when streaming from a file, by default
+        (0, None)
+    kernel : str, optional
+        'numpy' (vectorized over a block) or 'numba' (fused, multithreaded
+        pass over bead pairs, see contact_kernels.accumulate_contacts), by
+        default 'numpy'. The numba kernel can not store contact matrices.
+    threads : int, optional
+        Number of threads of the numba kernel, by default None (all cores)
+    box_size : array-like, optional
+        Lengths of a periodic box (zero along non-periodic axes), by
+        default None
+
+    Returns
+    -------
+    avg_contact_mat : NxN ndarray
+        (Log of the) time averaged contact matrix
+    contact_mat : h5py.Dataset or None
+        Per frame contact matrices if store_contact_mat, otherwise None
+    contact_kymo : NxT ndarray
+        Contact kymograph
+    """
+    if kernel not in ('numpy', 'numba'):
+        raise ValueError(f'Contact kernel "{kernel}" is not supported.')
+    if kernel == 'numba' and store_contact_mat:
+        raise ValueError("The numba contact kernel does not make per frame "
+                         "contact matrices to store.")
+    block_size_func = (get_contact_block_size if kernel == 'numpy' else
+                       partial(get_kernel_block_size, threads=threads))
+
+    if isinstance(com_src, np.ndarray):
+        com_arr = com_src[::avg_block_step, :, :]
+        nbeads, nframes = com_arr.shape[0], com_arr.shape[-1]
+        block_size = block_size_func(nbeads, mem_bytes)
+        blocks = (com_arr[:, :, i:i + block_size]
+                  for i in range(0, nframes, block_size))
+    else:
+        sy_shape = get_raw_dset(com_src, 'sylinders').shape
+        nbeads = len(range(sy_shape[0])[bead_range[0]:bead_range[-1]]
+                     [::avg_block_step])
+        nframes = len(range(sy_shape[-1])[ts_range[0]:ts_range[-1]])
+        block_size = block_size_func(nbeads, mem_bytes)
+        blocks = (block.data[::avg_block_step] for block in iter_time_blocks(
+            com_src, 'com', block_size=block_size, ts_range=ts_range,
+            bead_range=bead_range))
+
+    contact_mat_dset = None
+    if store_contact_mat:
+        if analysis is None:
+            raise ValueError(
+                "Storing contact matrices needs an analysis group.")
+        contact_mat_dset = analysis.create_dataset(
+            'contact_mat', shape=(nbeads, nbeads, nframes), dtype='f4',
+            chunks=(nbeads, nbeads, 1), compression='gzip', shuffle=True)
+        contact_mat_dset.attrs['sigma'] = sigma
+        contact_mat_dset.attrs['avg_block_step'] = avg_block_step
+
+    contact_sum = np.zeros((nbeads, nbeads))
+    contact_kymo = np.zeros((nbeads, nframes))
+    frame = 0
+    for com_block in blocks:
+        n = com_block.shape[-1]
+        if kernel == 'numba':
+            accumulate_contacts(com_block, contact_sum,
+                                contact_kymo[:, frame:frame + n], sigma,
+                                radius_arr, threads, box_size)
+            frame += n
+            continue
+        sep_mat = pair_distances(com_block, box_size)
+        contact_mat = gauss_weighted_contact(sep_mat, sigma, radius_arr)
+        del sep_mat
+        contact_sum += contact_mat.sum(axis=-1)
+        contact_kymo[:, frame:frame + n] = get_contact_kymo_data(contact_mat)
+        if contact_mat_dset is not None:
+            contact_mat_dset[:, :, frame:frame + n] = contact_mat
+        frame += n
+
+    avg_contact_mat = contact_sum / frame
+    if log:
+        avg_contact_mat = np.log(avg_contact_mat)
+
+    if analysis is not None:
+        write_contact_mat_analysis(analysis, avg_contact_mat, contact_kymo,
+                                   sigma, avg_block_step, log, radius_arr)
+    return avg_contact_mat, contact_mat_dset, contact_kymo
+
+
+def sparse_contact_mat_analysis(com_src, sigma=.02, avg_block_step=1,
+                                log=True, radius_arr=None, analysis=None,
+                                n_sigma=5., box_size=None, keep_frames=False,
+                                ts_range=(0, None), bead_range=(0, None),
+                                block_size=256):
+    """Contact matrix analysis of get_contact_mat_analysis using only the
+    pairs within n_sigma * sigma of contact (see
+    sparse_gauss_weighted_contact). Cost grows with the number of close
+    pairs instead of N**2 per frame.
+
+    Parameters
+    ----------
+    com_src : NxDxT ndarray, h5py.File, ArrayStore or SimulationData
+        Centers of mass, or a raw data file to stream them from
+    sigma, avg_block_step, log, radius_arr, analysis :
+        As in get_contact_mat_analysis
+    n_sigma : float, optional
+        Number of sigmas beyond contact to keep, by default 5
+    box_size : array-like, optional
+        Lengths of a periodic box, by default None (not periodic)
+    keep_frames : bool, optional
+        Return the csr contact matrix of every frame, by default False
+    ts_range, bead_range : tuple, optional
+        (start, stop) frames and beads used when streaming from a file
+    block_size : int, optional
+        Frames read at once when streaming from a file, by default 256
+
+    Returns
+    -------
+    avg_contact_mat : NxN csr_matrix or ndarray
+        Time averaged contact matrix, or the dense log of it if log (-inf
+        for pairs never within the cutoff)
+    contact_mats : list of csr_matrix or None
+        Contact matrix of every frame if keep_frames
+    contact_kymo : NxT ndarray
+        Contact kymograph
+    """
+    if isinstance(com_src, np.ndarray):
+        com_blocks = [com_src[::avg_block_step, :, :]]
+    else:
+        com_blocks = (block.data[::avg_block_step] for block in
+                      iter_time_blocks(com_src, 'com', block_size=block_size,
+                                       ts_range=ts_range,
+                                       bead_range=bead_range))
+
+    contact_sum = None
+    contact_mats = [] if keep_frames else None
+    kymo_cols = []
+    for com_block in com_blocks:
+        for i in range(com_block.shape[-1]):
+            contact_mat = sparse_gauss_weighted_contact(
+                com_block[:, :, i], sigma, radius_arr, n_sigma, box_size)
+            contact_sum = (contact_mat if contact_sum is None
+                           else contact_sum + contact_mat)
+            kymo_cols += [np.asarray(contact_mat.sum(axis=0)).ravel() - 1]
+            if keep_frames:
+                contact_mats += [contact_mat]
+    contact_kymo = np.stack(kymo_cols, axis=-1)
+
+    avg_contact_mat = contact_sum / len(kymo_cols)
+    if log:
+        with np.errstate(divide='ignore'):
+            avg_contact_mat = np.log(avg_contact_mat.toarray())
+
+    if analysis is not None:
+        write_contact_mat_analysis(
+            analysis, (avg_contact_mat if log else avg_contact_mat.toarray()),
+            contact_kymo, sigma, avg_block_step, log, radius_arr)
+        analysis['contact_kymo'].attrs['n_sigma'] = n_sigma
+    return avg_contact_mat, contact_mats, contact_kymo
+
+
 def get_end_end_distance(com_arr):
     return np.linalg.norm(com_arr[0, :, :] - com_arr[-1, :, :], axis=0)
 
@@ -554,13 +810,25 @@ def calc_rad_of_gyration(com_arr, device='cpu'):
     return torch.sqrt(rog_sqr_arr)
 
 
-def find_neighbors(com_arr, diam, time_ind=0):
+def find_neighbors(com_arr, diam, time_ind=0, sparse=False, box_size=None):
     """Find beads that are in close proximity with one another at any given time.
 
+    Separations are minimum images in a periodic box of lengths box_size if
+    given. With sparse=True the pairs are found with a KD-tree and an NxN
+    csr_matrix is returned.
+
     """
-    neighbor_mat = (np.linalg.norm((com_arr[:, np.newaxis, :, time_ind] -
-                                    com_arr[np.newaxis, :, :, time_ind]),
-                                   axis=2) < diam * 1.2).astype(int)
+    if sparse:
+        nbeads = com_arr.shape[0]
+        i_ind, j_ind, _ = find_pairs_within(com_arr[:, :, time_ind],
+                                            diam * 1.2, box_size)
+        diag_ind = np.arange(nbeads)
+        rows = np.concatenate([i_ind, j_ind, diag_ind])
+        cols = np.concatenate([j_ind, i_ind, diag_ind])
+        return coo_matrix((np.ones(rows.size, dtype=int), (rows, cols)),
+                          shape=(nbeads, nbeads)).tocsr()
+    neighbor_mat = (pair_distances(com_arr[:, :, time_ind], box_size) <
+                    diam * 1.2).astype(int)
     return neighbor_mat
 
 
@@ -578,11 +846,11 @@ def create_connect_hdf5(h5_raw_path, force=False, verbose=False,
         connect_path.unlink()
 
     # Run analysis
-    with h5py.File(h5_raw_path, 'r') as h5_data:
+    with open_raw_data(find_raw_data(h5_raw_path)) as h5_data:
         time_arr = h5_data['time'][start_ind:end_ind]
         lag_time_arr = time_arr - time_arr[0]
-        prot_dat = h5_data['raw_data/proteins'][:, :, start_ind:end_ind]
-        bead_num = h5_data['raw_data/sylinders'][...].shape[0]
+        prot_dat = get_raw_dset(h5_data, 'proteins')[:, :, start_ind:end_ind]
+        bead_num = get_raw_dset(h5_data, 'sylinders').shape[0]
         connect_mat_list = []
         # timer = Timer()
         for i in range(time_arr.size):
@@ -36,24 +36,35 @@ from .chrom_analysis import (get_link_energy_arrays, total_distr_hists,
                              cylin_distr_hists, rad_distr_hists,
                              calc_rad_of_gyration, get_contact_kymo_data,
                              get_pos_kymo_data, get_pos_cond_data,
-                             get_sep_dist_mat, get_contact_mat_analysis,
+                             get_sep_dist_mat,
                              get_link_tension, gauss_weighted_contact,
                              get_contact_cond_data,
+                             stream_contact_mat_analysis,
                              )
 
 from .chrom_condensate_analysis import (get_max_and_total_cond_size,
                                         gen_condensate_track_info,
                                         extract_condensates)
+from .hic_pyramid import read_hic_level, PYRAMID_GRP_NAME
+from ..sim_data import get_sim_data
+from ..analysis_cache import (AnalysisCache, DEFAULT_CACHE_BYTES,
+                              get_source_id)
+
+# Largest number of bins drawn in a Hi-C plot. Finer resolutions have more
+# bins than pixels in the figure.
+HIC_PLOT_MAX_BINS = 1024
 
 
 def make_all_condensate_graphs(h5_data, opts, overwrite=False):
     """TODO: Docstring for make_all_condensate_graphs.
 
-    @param h5_path TODO
+    @param h5_data HDF5 raw data file opened for writing (or SimulationData)
     @param **kwargs TODO
     @return: TODO
 
     """
+    # Raw data and derived arrays are read once and shared by all analyses
+    sim = get_sim_data(h5_data)
     cond_sty = {
         "axes.titlesize": 20,
         "axes.labelsize": 24,
@@ -68,10 +79,10 @@ def make_all_condensate_graphs(h5_data, opts, overwrite=False):
     }
     plt.style.use(cond_sty)
 
-    if overwrite and 'analysis' in h5_data.keys():
+    if overwrite and 'analysis' in sim.keys():
         print('Deleting analysis')
-        del h5_data['analysis']
-    analysis_grp = h5_data.require_group('analysis')
+        del sim['analysis']
+    analysis_grp = sim.require_group('analysis')
 
     # Start and end of data arrays
     ss_ind = 0
@@ -80,37 +91,44 @@ def make_all_condensate_graphs(h5_data, opts, overwrite=False):
     end_bead = None
     analysis_grp.attrs['timestep_range'] = [ss_ind, end_ind]
 
-    # Basic data
-    sy_dat = h5_data['raw_data']['sylinders'][start_bead:end_bead,
-                                              :, ss_ind:end_ind]
-    com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
-    nbeads = com_arr.shape[0]
+    # Analysis products are cached per parameter set and source data
+    cache = AnalysisCache(analysis_grp, get_source_id(sim),
+                          max_bytes=getattr(opts, 'cache_bytes',
+                                            DEFAULT_CACHE_BYTES))
+    time_arr = sim.time((ss_ind, end_ind))
 
     # Make combined position kymo graph and condensate graph
     fig1, axarr1 = plt.subplots(1, 3, figsize=(30, 8))
 
-    if 'pos_kymo' not in analysis_grp.keys():
-        time_arr, cond_hist_arr, bin_edges = get_pos_kymo_data(
-            h5_data, ts_range=(ss_ind, end_ind),
-            bead_range=(start_bead, end_bead),
-            bins=200,
-            analysis=analysis_grp)
+    pos_kymo_params = {'ts_range': [ss_ind, end_ind],
+                       'bead_range': [start_bead, end_bead],
+                       'bins': 200}
+    pos_kymo_grp, hit = cache.lookup('pos_kymo', get_pos_kymo_data,
+                                     pos_kymo_params)
+    if not hit:
+        _, cond_hist_arr, bin_edges = get_pos_kymo_data(
+            sim, analysis=pos_kymo_grp, **pos_kymo_params)
+        cache.store(pos_kymo_grp)
     else:
-        time_arr = h5_data['time'][ss_ind:end_ind]
-        cond_hist_arr = analysis_grp['pos_kymo'][...]
-        bin_edges = analysis_grp['pos_kymo_bin_edges'][...]
+        cond_hist_arr = pos_kymo_grp['pos_kymo'][...]
+        bin_edges = pos_kymo_grp['pos_kymo_bin_edges'][...]
     bin_centers = .5 * (bin_edges[:-1] + bin_edges[1:])
 
     plot_pos_kymo(fig1, axarr1[0], time_arr, cond_hist_arr, bin_edges)
 
     # Make position condensate graph
-    if 'pos_cond_edges' not in analysis_grp:
+    pos_cond_params = {'pos_kymo': pos_kymo_grp.name, 'threshold': 10,
+                       'bin_win': 0, 'time_win': 201}
+    pos_cond_grp, hit = cache.lookup('pos_cond', get_pos_cond_data,
+                                     pos_cond_params)
+    if not hit:
         pos_cond_edge_coords, pos_cond_num_arr = get_pos_cond_data(
             time_arr, cond_hist_arr, bin_centers, 10, bin_win=0,
-            time_win=201, analysis=analysis_grp)
+            time_win=201, analysis=pos_cond_grp)
+        cache.store(pos_cond_grp)
     else:
-        pos_cond_edge_coords = analysis_grp['pos_cond_edges'][...]
-        pos_cond_num_arr = analysis_grp['pos_cond_num'][...]
+        pos_cond_edge_coords = pos_cond_grp['pos_cond_edges'][...]
+        pos_cond_num_arr = pos_cond_grp['pos_cond_num'][...]
     plot_condensate_kymo(axarr1[1], pos_cond_edge_coords, ylims=(
         bin_centers[0], bin_centers[-1]))
 
@@ -125,55 +143,73 @@ def make_all_condensate_graphs(h5_data, opts, overwrite=False):
     # register_cmaps()
     plt.rcParams['image.cmap'] = 'YlOrRd'
 
-    # Make average hic plot
-    contact_mat = None
-    if 'avg_contact_mat' not in analysis_grp:
-        log_avg_contact_mat, contact_mat, contact_kymo = get_contact_mat_analysis(
-            com_arr, avg_block_step=1, analysis=analysis_grp)
+    # Make average hic plot and contact kymograph, streaming the contact
+    # matrices so they never all sit in memory
+    contact_params = {'ts_range': [ss_ind, end_ind],
+                      'bead_range': [start_bead, end_bead],
+                      'sigma': .02, 'avg_block_step': 1, 'log': True,
+                      'box_size': sim.box_size}
+    contact_grp, hit = cache.lookup('contact_mat', stream_contact_mat_analysis,
+                                    contact_params)
+    if not hit:
+        _, _, contact_kymo = stream_contact_mat_analysis(
+            sim, analysis=contact_grp,
+            mem_bytes=getattr(opts, 'mem_bytes', 2**30), kernel='numba',
+            threads=getattr(opts, 'threads', None), **contact_params)
+        cache.store(contact_grp)
+    else:
+        contact_kymo = contact_grp['contact_kymo'][...]
+
+    # Only read the resolution that is plotted
+    if PYRAMID_GRP_NAME in contact_grp:
+        pyramid_grp = contact_grp[PYRAMID_GRP_NAME]
+        nbeads = int(pyramid_grp.attrs['nbeads'])
+        avg_contact_level, _, bin_edges = read_hic_level(
+            pyramid_grp, max_bins=HIC_PLOT_MAX_BINS)
+        log_avg_contact_mat = np.log(avg_contact_level)
     else:
-        log_avg_contact_mat = analysis_grp['avg_contact_mat'][...]
+        # Cached before contact pyramids were stored
+        log_avg_contact_mat = contact_grp['avg_contact_mat'][...]
+        nbeads = log_avg_contact_mat.shape[0]
+        bin_edges = None
 
-    fig2, ax2 = make_hic_plot(nbeads, log_avg_contact_mat, vmin=-7)
+    fig2, ax2 = make_hic_plot(nbeads, log_avg_contact_mat, vmin=-7,
+                              bin_edges=bin_edges)
     fig2.savefig(opts.analysis_dir / f'average_log_contact.png')
 
     # Make contact kymograph and last image
     fig4, axarr4 = plt.subplots(1, 3, figsize=(24, 6))
-    if 'contact_kymo' not in analysis_grp:
-        if contact_mat is None:
-            log_avg_contact_mat, contact_mat, contact_kymo = get_contact_mat_analysis(
-                com_arr, avg_block_step=1)
-    else:
-        contact_kymo = analysis_grp['contact_kymo'][...]
     # TODO better handling of this. Options for vmin and vmax and stuff
-    if contact_mat is not None:
-        fig3, axarr3 = make_summed_contact_kymo_graph(
-            contact_mat, time_arr, contact_type="", vmin=-25, vmax=7,
-            avg_contact_mat=log_avg_contact_mat, avg_vmin=-7)
-
     plot_contact_kymo(fig4, axarr4[0], time_arr, contact_kymo, vmax=7)
 
     # Make contact condensate analysis
-    if 'contact_cond_edges' not in analysis_grp:
+    contact_cond_params = {'contact_mat': contact_grp.name, 'threshold': 3.5,
+                           'bead_win': 101, 'time_win': 201}
+    contact_cond_grp, hit = cache.lookup('contact_cond', get_contact_cond_data,
+                                         contact_cond_params)
+    if not hit:
         contact_cond_edges, contact_cond_num = get_contact_cond_data(
             time_arr, contact_kymo, 3.5, bead_win=101, time_win=201,
-            analysis=analysis_grp)
+            analysis=contact_cond_grp)
+        max_contact_cond_size, total_contact_cond_beads = get_max_and_total_cond_size(
+            time_arr, contact_cond_edges, contact_cond_num,
+            analysis=contact_cond_grp)
+        cond_grp = contact_cond_grp.create_group('condensates')
+        cond_lst = gen_condensate_track_info(
+            time_arr, contact_cond_edges, contact_cond_num, cond_grp)
+        cache.store(contact_cond_grp)
     else:
-        contact_cond_edges = analysis_grp['contact_cond_edges'][...]
-        contact_cond_num = analysis_grp['contact_cond_num'][...]
+        contact_cond_edges = contact_cond_grp['contact_cond_edges'][...]
+        contact_cond_num = contact_cond_grp['contact_cond_num'][...]
+        max_contact_cond_size = contact_cond_grp['max_contact_cond_size'][...]
+        total_contact_cond_beads = contact_cond_grp['total_contact_cond_beads'][...]
+        cond_lst = extract_condensates(contact_cond_grp['condensates'])
 
     plot_condensate_kymo(axarr4[1], contact_cond_edges,
                          xlims=[time_arr[0], time_arr[-1]],
                          ylims=[start_bead, nbeads],
                          ylabel='Bead index')
 
-    if 'max_contact_cond_size' not in analysis_grp:
-        max_contact_cond_size, total_contact_cond_beads = get_max_and_total_cond_size(
-            time_arr, contact_cond_edges, contact_cond_num,
-            analysis=analysis_grp)
-    else:
-        max_contact_cond_size = analysis_grp['max_contact_cond_size'][...]
-        total_contact_cond_beads = analysis_grp['total_contact_cond_beads'][...]
-
     plot_condensate_characterize(axarr4[2], time_arr,
                                  max_contact_cond_size,
                                  total_contact_cond_beads,
@@ -182,12 +218,6 @@ def make_all_condensate_graphs(h5_data, opts, overwrite=False):
     fig4.savefig(opts.analysis_dir / f'contact_cond_charact.png')
 
     fig5, axarr5 = plt.subplots(2, 2, figsize=(18, 13))
-    if 'condensates' not in analysis_grp:
-        cond_grp = analysis_grp.create_group('condensates')
-        cond_lst = gen_condensate_track_info(
-            time_arr, contact_cond_edges, contact_cond_num, cond_grp)
-    else:
-        cond_lst = extract_condensates(analysis_grp['condensates'])
 
     # NOTE: Add back in if you want to wipe out condensate info
     # if 'condensates' in analysis_grp:
@@ -214,10 +244,10 @@ def make_all_condensate_graphs(h5_data, opts, overwrite=False):
 
     plt.rcParams['image.cmap'] = 'coolwarm'
     # Make tension kymograph
-    fig6, ax6 = make_tension_kymo(h5_data, ss_ind, end_ind, time_win=201)
+    fig6, ax6 = make_tension_kymo(sim, ss_ind, end_ind, time_win=201)
     fig6.savefig(opts.analysis_dir / f'tension_kymo.png')
 
-    fig7, ax7 = make_tension_hists(h5_data, ss_ind, end_ind)
+    fig7, ax7 = make_tension_hists(sim, ss_ind, end_ind)
     fig7.savefig(opts.analysis_dir / f'tension_hists.png')
 
 
@@ -305,11 +335,24 @@ def make_min_distr_plots(com_arr, log_contact_avg=None,
     return fig, ax
 
 
-def make_hic_plot(nbeads, log_contact_avg, vmin=-7, vmax=None):
+def make_hic_plot(nbeads, log_contact_avg, vmin=-7, vmax=None,
+                  bin_edges=None):
+    """Plot a log contact matrix.
+
+    @param nbeads Number of beads of the full matrix
+    @param log_contact_avg Log of the (possibly binned) average contact matrix
+    @param bin_edges Bead index edges of the bins of log_contact_avg. Defaults
+                     to evenly sized bins.
+    @return: fig, ax
+
+    """
     fig, ax = plt.subplots(figsize=(10, 8))
 
     # nbeads = com_arr.shape[0]
-    x = np.arange(nbeads + 1)[::int((nbeads) / log_contact_avg.shape[0])]
+    if bin_edges is None:
+        x = np.arange(nbeads + 1)[::int((nbeads) / log_contact_avg.shape[0])]
+    else:
+        x = bin_edges
     X, Y = np.meshgrid(x, x)
     c = ax.pcolorfast(X, Y, log_contact_avg, vmax=vmax, vmin=vmin)
     ax.set_aspect('equal')
@@ -459,12 +502,13 @@ def make_summed_contact_kymo_graph(contact_mat,
 def make_tension_kymo(h5_data, ss_ind, end_ind, time_win=1001):
     """TODO: Docstring for make_tension_kymo.
 
-    @param h5_data TODO
+    @param h5_data HDF5 raw data file or SimulationData
     @return: TODO
 
     """
-    time_arr = h5_data['time'][ss_ind:end_ind]
-    tension_arr = get_link_tension(h5_data)[:, ss_ind:end_ind]
+    sim = get_sim_data(h5_data)
+    time_arr = sim.time((ss_ind, end_ind))
+    tension_arr = get_link_tension(sim)[:, ss_ind:end_ind]
     tension_arr = savgol_filter(tension_arr, time_win, 3, axis=-1)
     fig, ax = plt.subplots(figsize=(10, 8), )
     x = np.append(time_arr, [time_arr[-1] + time_arr[2] - time_arr[1]])
@@ -478,17 +522,19 @@ def make_tension_kymo(h5_data, ss_ind, end_ind, time_win=1001):
 def make_tension_hists(h5_data, ss_ind, end_ind):
     """TODO: Docstring for make_tension_kymo.
 
-    @param h5_data TODO
+    @param h5_data HDF5 raw data file or SimulationData
     @return: TODO
 
     """
+    sim = get_sim_data(h5_data)
     fig, axarr = plt.subplots(2, 2, sharex=True, sharey=True, figsize=(16, 14))
-    time_arr = h5_data['time'][ss_ind:-1]
+    time_arr = sim.time((ss_ind, -1))
 
-    tension_arr0 = get_link_tension(h5_data)[0, ss_ind:end_ind]
-    tension_arr1 = get_link_tension(h5_data)[1, ss_ind:end_ind]
-    tension_arr_1 = get_link_tension(h5_data)[-1, ss_ind:end_ind]
-    tension_arr_2 = get_link_tension(h5_data)[-2, ss_ind:end_ind]
+    tension_arr = get_link_tension(sim)
+    tension_arr0 = tension_arr[0, ss_ind:end_ind]
+    tension_arr1 = tension_arr[1, ss_ind:end_ind]
+    tension_arr_1 = tension_arr[-1, ss_ind:end_ind]
+    tension_arr_2 = tension_arr[-2, ss_ind:end_ind]
 
     _ = axarr[0, 0].hist(tension_arr0, bins=60)
     _ = axarr[0, 0].axvline(tension_arr0.mean(),
@@ -547,8 +593,9 @@ def plot_link_energy_vs_time(ax, h5_data, ss_frac=.75):
     @return: TODO
 
     """
-    mean_energy, sem_energy, expt_energy = get_link_energy_arrays(h5_data)
-    time = h5_data['time'][...]
+    sim = get_sim_data(h5_data)
+    mean_energy, sem_energy, expt_energy = get_link_energy_arrays(sim)
+    time = sim.time()
 
     ax.plot(time, mean_energy)
     ax.fill_between(time,
@@ -23,6 +23,8 @@ import numpy as np
 
 import alens_analysis as aa
 from alens_analysis.helpers import gen_id
+from ..time_blocks import iter_time_blocks
+from ..raw_schema import get_raw_dset
 
 
 def avg_dist_from_poly_com(com_arr, device='cpu'):
@@ -46,28 +48,152 @@ def poly_bead_msd(com_arr, device='cpu'):
     return msd
 
 
+def idx_dist_block_sums(com_arr, contact_thresh=None, max_idx_dist=None,
+                        device='cpu'):
+    """Sums over bead pairs of the distances (and contacts) of every index
+    distance s = |i - j| and frame of a block of frames. Each index distance
+    is one vectorized difference of the bead array with itself shifted by s,
+    so no N x N matrix is made.
+
+    @param com_arr (N, 3, T) array of bead positions
+    @param contact_thresh Distance below which beads are in contact, None to
+                          skip contacts
+    @param max_idx_dist Largest index distance, None for N - 1
+    @return: (S, T) tensor of distance sums, (S, T) tensor of contact sums
+             (None without contact_thresh), (S,) array of pairs per frame
+
+    """
+    tcom_arr = torch.as_tensor(com_arr, dtype=torch.float64).to(device)
+    nbeads, _, nframes = tcom_arr.shape
+    max_s = nbeads - 1 if max_idx_dist is None else min(max_idx_dist,
+                                                        nbeads - 1)
+    dist_sum = torch.zeros((max_s, nframes), dtype=torch.float64,
+                           device=device)
+    cont_sum = (None if contact_thresh is None else
+                torch.zeros((max_s, nframes), dtype=torch.float64,
+                            device=device))
+    for s in range(1, max_s + 1):
+        dist = torch.norm(tcom_arr[s:] - tcom_arr[:-s], dim=1)
+        dist_sum[s - 1] = dist.sum(dim=0)
+        if cont_sum is not None:
+            cont_sum[s - 1] = (dist < contact_thresh).sum(dim=0)
+    npairs = nbeads - np.arange(1, max_s + 1)
+    return dist_sum, cont_sum, npairs
+
+
 def dist_vs_idx_dist(com_arr, device='cpu'):
-    tcom_arr = torch.from_numpy(com_arr).to(device)
-    sep_mat = torch.norm(
-        tcom_arr[:, None, :] - tcom_arr[None, :, :], dim=2)
-    avg_dist_arr = torch.zeros((sep_mat.shape[0]-1))
-    # avg_dist_sem_arr = torch.zeros((sep_mat.shape[0]))
-    for i in range(1, sep_mat.shape[0]):
-        diag = torch.diagonal(sep_mat, i)
-        avg_dist_arr[i-1] = diag.mean()
-    #     avg_dist_sem_arr[i] = stats.sem(diag)
-    return avg_dist_arr
+    dist_sum, _, npairs = idx_dist_block_sums(com_arr[:, :, np.newaxis],
+                                              device=device)
+    return (dist_sum[:, 0].cpu() / torch.from_numpy(npairs)).float()
+
 
 def contact_vs_idx_dist(com_arr, contact_thresh, device='cpu'):
-    tcom_arr = torch.from_numpy(com_arr).to(device)
-    sep_mat = torch.norm(
-        tcom_arr[:, None, :] - tcom_arr[None, :, :], dim=2)
-    contact_mat = (sep_mat < contact_thresh).float()
-    avg_cont_arr = torch.zeros((sep_mat.shape[0]-1))
-    for i in range(1, contact_mat.shape[0]):
-        diag = torch.diagonal(contact_mat, i)
-        avg_cont_arr[i-1] = diag.mean()
-    return avg_cont_arr
+    _, cont_sum, npairs = idx_dist_block_sums(com_arr[:, :, np.newaxis],
+                                              contact_thresh, device=device)
+    return (cont_sum[:, 0].cpu() / torch.from_numpy(npairs)).float()
+
+
+def get_idx_dist_stats(com_src, contact_thresh=None, max_idx_dist=None,
+                       ts_range=(0, None), bead_range=(0, None),
+                       block_size=256, per_frame=False, analysis=None,
+                       device='cpu'):
+    """Mean distance and contact probability of bead pairs against their
+    index (genomic) distance |i - j|, P(s), over a whole run. Frames are
+    processed in blocks so the run is never fully in memory.
+
+    Parameters
+    ----------
+    com_src : NxDxT ndarray, h5py.File, ArrayStore or SimulationData
+        Bead centers, or a raw data file to stream them from
+    contact_thresh : float, optional
+        Distance below which a pair is in contact, by default None (no
+        contact probability)
+    max_idx_dist : int, optional
+        Largest index distance, by default None (N - 1)
+    ts_range : tuple, optional
+        (start, stop) frames to use, by default (0, None)
+    bead_range : tuple, optional
+        (start, stop) beads to use, by default (0, None)
+    block_size : int, optional
+        Frames per block, by default 256
+    per_frame : bool, optional
+        Return (S, T) curves of every frame instead of the time average, by
+        default False
+    analysis : h5py.Group, optional
+        Group to store the results in, by default None
+    device : str, optional
+        Torch device, by default 'cpu'
+
+    Returns
+    -------
+    idx_dist : (S,) ndarray
+        Index distances 1...S
+    avg_dist : (S,) or (S, T) ndarray
+        Mean distance of pairs at every index distance
+    avg_contact : (S,) or (S, T) ndarray or None
+        Fraction of pairs in contact at every index distance
+    """
+    if isinstance(com_src, np.ndarray):
+        nbeads_tot, nframes_tot = com_src.shape[0], com_src.shape[-1]
+        com_arr = com_src[bead_range[0]:bead_range[-1], :,
+                          ts_range[0]:ts_range[-1]]
+        blocks = (com_arr[..., i:i + block_size]
+                  for i in range(0, com_arr.shape[-1], block_size))
+    else:
+        nbeads_tot = get_raw_dset(com_src, 'sylinders').shape[0]
+        nframes_tot = com_src['time'].shape[0]
+        blocks = (block.data for block in iter_time_blocks(
+            com_src, 'com', block_size=block_size, ts_range=ts_range,
+            bead_range=bead_range))
+
+    dist_parts, cont_parts = [], []
+    dist_tot = cont_tot = None
+    nframes = 0
+    for block in blocks:
+        dist_sum, cont_sum, npairs = idx_dist_block_sums(
+            block, contact_thresh, max_idx_dist, device)
+        nframes += block.shape[-1]
+        if per_frame:
+            dist_parts += [dist_sum.cpu().numpy()]
+            if cont_sum is not None:
+                cont_parts += [cont_sum.cpu().numpy()]
+            continue
+        dist_sum = dist_sum.sum(dim=1).cpu().numpy()
+        dist_tot = dist_sum if dist_tot is None else dist_tot + dist_sum
+        if cont_sum is not None:
+            cont_sum = cont_sum.sum(dim=1).cpu().numpy()
+            cont_tot = cont_sum if cont_tot is None else cont_tot + cont_sum
+
+    if per_frame:
+        avg_dist = np.concatenate(dist_parts, axis=-1) / npairs[:, np.newaxis]
+        avg_contact = (np.concatenate(cont_parts, axis=-1) /
+                       npairs[:, np.newaxis] if cont_parts else None)
+    else:
+        avg_dist = dist_tot / (npairs * nframes)
+        avg_contact = (None if cont_tot is None else
+                       cont_tot / (npairs * nframes))
+    idx_dist = np.arange(1, npairs.size + 1)
+
+    if analysis is not None:
+        # Integer bounds, since HDF5 attributes can not hold None
+        ts_bounds = range(nframes_tot)[slice(*ts_range)]
+        bead_bounds = range(nbeads_tot)[slice(*bead_range)]
+        ts_range = [ts_bounds.start, ts_bounds.stop]
+        bead_range = [bead_bounds.start, bead_bounds.stop]
+        avg_dist_dset = analysis.create_dataset('idx_dist_avg_dist',
+                                                data=avg_dist)
+        avg_dist_dset.attrs['timestep_range'] = ts_range
+        avg_dist_dset.attrs['bead_range'] = bead_range
+        avg_dist_dset.attrs['nframes'] = nframes
+        if avg_contact is not None:
+            avg_contact_dset = analysis.create_dataset(
+                'idx_dist_contact_prob', data=avg_contact)
+            avg_contact_dset.attrs['contact_thresh'] = contact_thresh
+            avg_contact_dset.attrs['timestep_range'] = ts_range
+            avg_contact_dset.attrs['bead_range'] = bead_range
+            avg_contact_dset.attrs['nframes'] = nframes
+    return idx_dist, avg_dist, avg_contact
+
 
 # def dist_vs_idx_dist_time_avg(com_arr):
 #     sep_mat = np.linalg.norm(com_arr[:, np.newaxis, :] - com_arr[np.newaxis, :, :], axis=2)
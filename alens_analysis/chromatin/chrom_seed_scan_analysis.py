@@ -9,21 +9,52 @@ Description:
 
 import yaml
 from copy import deepcopy
+from pathlib import Path
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
 
 # Data manipulation
 import numpy as np
 import scipy.stats as stats
 from scipy.signal import savgol_filter
 
+from ..read_func import get_mp_context
+from .chrom_poly_stats import get_idx_dist_stats
+from .hic_pyramid import (read_hic_level, get_pyramid_bin_size,
+                          coarsen_contact_mat, get_hic_bin_edges,
+                          get_pair_counts, PYRAMID_GRP_NAME)
+
+
+SCAN_CONTACT_GRP_NAME = 'scan_contacts'
+
+
+def open_seed_file(sd_h5_data):
+    """Context manager of a seed file given as a path (opened read only and
+    closed after) or as an open file (left open)."""
+    if isinstance(sd_h5_data, (str, Path)):
+        return h5py.File(sd_h5_data, 'r')
+    return nullcontext(sd_h5_data)
+
+
+def iter_seed_files(sd_h5_data_lst):
+    """Yield the open seed files of a list of paths or open files. Paths are
+    opened one at a time and closed before the next is opened."""
+    for sd_h5_data in sd_h5_data_lst:
+        with open_seed_file(sd_h5_data) as h5d:
+            yield h5d
+
 
 def get_scan_cond_data(sd_h5_data_lst, analysis=None):
-    ss_ind = sd_h5_data_lst[0]['analysis/pos_kymo'].attrs['timestep_range'][0]
-    end_ind = sd_h5_data_lst[0]['analysis/pos_kymo'].attrs['timestep_range'][1]
+    with open_seed_file(sd_h5_data_lst[0]) as h5d:
+        ss_ind = h5d['analysis/pos_kymo'].attrs['timestep_range'][0]
+        end_ind = h5d['analysis/pos_kymo'].attrs['timestep_range'][1]
 
     sd_cond_num_arr = None  # Row=time, Column=Seed
     sd_max_width_arr = None
     sd_total_bead_arr = None
-    for h5d in sd_h5_data_lst:
+    for h5d in iter_seed_files(sd_h5_data_lst):
         time_arr = h5d['time'][ss_ind:end_ind]
 
         cond_num_arr = h5d['analysis']['contact_cond_num'][...]
@@ -82,25 +113,208 @@ def get_scan_cond_data(sd_h5_data_lst, analysis=None):
 
 
 def get_scan_avg_contact_mat(sd_h5_data_lst, analysis=None):
+    """Log of the seed averaged contact matrix. Log matrices are summed in log
+    space so small contact probabilities do not underflow."""
     num_seeds = len(sd_h5_data_lst)
-    avg_contact_mat = None
-    for h5d in sd_h5_data_lst:
-        is_log = h5d['analysis']['avg_contact_mat'].attrs['log']
-        if avg_contact_mat is None:
-            avg_contact_mat = h5d['analysis']['avg_contact_mat'][...] if not is_log else np.exp(
-                h5d['analysis']['avg_contact_mat'][...])
-        else:
-            avg_contact_mat += h5d['analysis']['avg_contact_mat'][...] if not is_log else np.exp(
-                h5d['analysis']['avg_contact_mat'][...])
-    log_avg_contact_mat = np.log(avg_contact_mat) - np.log(num_seeds)
+    log_sum_contact_mat = None
+    for h5d in iter_seed_files(sd_h5_data_lst):
+        log_contact_mat, _ = read_log_avg_contact_mat(h5d)
+        log_sum_contact_mat = (log_contact_mat if log_sum_contact_mat is None
+                               else np.logaddexp(log_sum_contact_mat,
+                                                 log_contact_mat))
+    log_avg_contact_mat = log_sum_contact_mat - np.log(num_seeds)
     return log_avg_contact_mat
 
 
+def read_log_avg_contact_mat(h5d, bin_size=None):
+    """Log average contact matrix of one seed and the bead index edges of its
+    bins. The full matrix is read unless a bin size is given, which is read
+    from the seed's contact pyramid, or binned from the full matrix if the
+    seed has no pyramid level of that size."""
+    analysis_grp = h5d['analysis']
+    pyramid_grp = analysis_grp.get(PYRAMID_GRP_NAME)
+    if (bin_size is not None and pyramid_grp is not None
+            and str(bin_size) in pyramid_grp['resolutions']):
+        contact_level, _, bin_edges = read_hic_level(pyramid_grp,
+                                                     bin_size=bin_size)
+        with np.errstate(divide='ignore'):
+            return np.log(contact_level), bin_edges
+    avg_contact_dset = analysis_grp['avg_contact_mat']
+    avg_contact_mat = avg_contact_dset[...]
+    if bin_size is not None:
+        # Same bin means as a pyramid level
+        if avg_contact_dset.attrs['log']:
+            avg_contact_mat = np.exp(avg_contact_mat)
+        nbeads = avg_contact_mat.shape[0]
+        contact_level = (coarsen_contact_mat(avg_contact_mat, bin_size)
+                         / get_pair_counts(nbeads, bin_size))
+        with np.errstate(divide='ignore'):
+            return (np.log(contact_level),
+                    get_hic_bin_edges(nbeads, bin_size))
+    if not avg_contact_dset.attrs['log']:
+        with np.errstate(divide='ignore'):
+            avg_contact_mat = np.log(avg_contact_mat)
+    return avg_contact_mat, np.arange(avg_contact_mat.shape[0] + 1)
+
+
+def _read_seed_contacts(sd_h5_data, bin_size=None, max_bins=None):
+    with open_seed_file(sd_h5_data) as h5d:
+        if bin_size is None and max_bins is not None:
+            pyramid_grp = h5d['analysis'].get(PYRAMID_GRP_NAME)
+            if pyramid_grp is not None:
+                bin_size = get_pyramid_bin_size(pyramid_grp, max_bins)
+        log_contact_mat, bin_edges = read_log_avg_contact_mat(h5d, bin_size)
+        contact_kymo = h5d['analysis']['contact_kymo'][...]
+        seed = yaml.safe_load(h5d.attrs['RunConfig'])['rngSeed']
+        source = str(h5d.filename)
+    return log_contact_mat, bin_edges, contact_kymo, seed, source, bin_size
+
+
+def _iter_seed_contacts(sd_h5_data_lst, bin_size, workers):
+    """Yield the contacts of the seeds in list order. With more than one
+    worker, seeds given as paths are read by a process pool, at most
+    `workers` at a time. Open files are read in this process."""
+    if workers == 1:
+        for sd_h5_data in sd_h5_data_lst:
+            yield _read_seed_contacts(sd_h5_data, bin_size)
+        return
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=get_mp_context()) as executor:
+        for start in range(0, len(sd_h5_data_lst), workers):
+            batch = [executor.submit(_read_seed_contacts, sd, bin_size)
+                     if isinstance(sd, (str, Path)) else sd
+                     for sd in sd_h5_data_lst[start:start + workers]]
+            for item in batch:
+                if isinstance(item, h5py.File):
+                    yield _read_seed_contacts(item, bin_size)
+                else:
+                    yield item.result()
+
+
+def aggregate_scan_contacts(sd_h5_data_lst, analysis=None, max_bins=None,
+                            workers=1):
+    """Average the contact matrices and contact kymographs of the seeds of a
+    scan. Seeds are read in seed list order, by a process pool of `workers`
+    if given as paths, and added to a running log-sum-exp of the matrices and
+    a running sum of the kymographs. So memory stays at a few matrices for
+    any number of seeds, and no matrix is exponentiated.
+
+    Parameters
+    ----------
+    sd_h5_data_lst : list
+        Seed files, as paths (opened one at a time) or open files
+    analysis : h5py.Group, optional
+        Group of the scan file to store the averages and their provenance in,
+        by default None
+    max_bins : int, optional
+        Use the finest resolution of the first seed's contact pyramid with at
+        most this many bins, by default None (full resolution). Later seeds
+        without that level are binned from their full matrix. Without a
+        pyramid in the first seed, all seeds are read at full resolution.
+    workers : int, optional
+        Number of seeds read at the same time, by default 1
+
+    Returns
+    -------
+    log_avg_contact_mat : ndarray
+        Log of the seed averaged contact matrix
+    bin_edges : ndarray
+        Bead index edges of the bins of the matrix
+    avg_contact_kymo : ndarray
+        Seed averaged contact kymograph
+
+    Raises
+    ------
+    ValueError
+        If the seed list is empty
+    """
+    if len(sd_h5_data_lst) == 0:
+        raise ValueError("No seed files to average contacts over.")
+    # The first seed read sets the resolution of all seeds
+    log_sum_contact_mat, bin_edges, sum_contact_kymo, seed, source, \
+        bin_size = _read_seed_contacts(sd_h5_data_lst[0], max_bins=max_bins)
+    seeds, sources = [seed], [source]
+    for log_contact_mat, _, contact_kymo, seed, source, _ in \
+            _iter_seed_contacts(sd_h5_data_lst[1:], bin_size,
+                                max(1, workers or 1)):
+        np.logaddexp(log_sum_contact_mat, log_contact_mat,
+                     out=log_sum_contact_mat)
+        sum_contact_kymo += contact_kymo
+        seeds += [seed]
+        sources += [source]
+
+    num_seeds = len(seeds)
+    log_avg_contact_mat = log_sum_contact_mat - np.log(num_seeds)
+    avg_contact_kymo = sum_contact_kymo / num_seeds
+
+    if analysis is not None:
+        if SCAN_CONTACT_GRP_NAME in analysis:
+            del analysis[SCAN_CONTACT_GRP_NAME]
+        scan_grp = analysis.create_group(SCAN_CONTACT_GRP_NAME)
+        scan_grp.attrs['seeds'] = seeds
+        scan_grp.attrs['sources'] = sources
+        scan_grp.attrs['bin_size'] = 1 if bin_size is None else bin_size
+        avg_contact_dset = scan_grp.create_dataset(
+            'log_avg_contact_mat', data=log_avg_contact_mat)
+        avg_contact_dset.attrs['log'] = True
+        scan_grp.create_dataset('bin_edges', data=bin_edges)
+        scan_grp.create_dataset('avg_contact_kymo', data=avg_contact_kymo)
+    return log_avg_contact_mat, bin_edges, avg_contact_kymo
+
+
+def get_scan_avg_contact_level(sd_h5_data_lst, max_bins=None):
+    """Log average contact matrix of a seed scan at the finest stored
+    resolution with at most max_bins bins. Only that resolution is read from
+    every seed with a contact pyramid (see aggregate_scan_contacts).
+
+    @param sd_h5_data_lst List of seed HDF5 files (open or paths)
+    @param max_bins Largest number of bins, None for the full resolution
+    @return: log average contact matrix, bead index edges of its bins
+
+    """
+    log_avg_contact_mat, bin_edges, _ = aggregate_scan_contacts(
+        sd_h5_data_lst, max_bins=max_bins)
+    return log_avg_contact_mat, bin_edges
+
+
+def get_scan_idx_dist_stats(sd_h5_data_lst, contact_thresh=None,
+                            max_idx_dist=None, ts_range=(0, None),
+                            bead_range=(0, None), block_size=256,
+                            device='cpu'):
+    """Mean distance and contact probability against index distance, P(s),
+    averaged over the frames of every seed. Seeds are streamed one at a time
+    (see chrom_poly_stats.get_idx_dist_stats) and weighted by their number
+    of frames.
+
+    @param sd_h5_data_lst List of open seed raw data files
+    @return: index distances, average distances, average contact
+             probabilities (None without contact_thresh)
+
+    """
+    dist_tot = cont_tot = None
+    nframes_tot = 0
+    for h5d in iter_seed_files(sd_h5_data_lst):
+        nframes = h5d['time'][ts_range[0]:ts_range[-1]].size
+        idx_dist, avg_dist, avg_contact = get_idx_dist_stats(
+            h5d, contact_thresh, max_idx_dist, ts_range, bead_range,
+            block_size, device=device)
+        if dist_tot is None:
+            dist_tot = avg_dist * nframes
+            cont_tot = None if avg_contact is None else avg_contact * nframes
+        else:
+            dist_tot += avg_dist * nframes
+            if cont_tot is not None:
+                cont_tot += avg_contact * nframes
+        nframes_tot += nframes
+    return (idx_dist, dist_tot / nframes_tot,
+            None if cont_tot is None else cont_tot / nframes_tot)
+
+
 def get_scan_avg_kymo(sd_h5_data_lst, analysis=None):
     num_seeds = len(sd_h5_data_lst)
     avg_contact_kymo = None
 
-    for h5d in sd_h5_data_lst:
+    for h5d in iter_seed_files(sd_h5_data_lst):
         if avg_contact_kymo is None:
             avg_contact_kymo = h5d['analysis']['contact_kymo'][...]
         else:
@@ -9,7 +9,6 @@ Description:
 # Basic useful imports
 import re
 import time
-import yaml
 from pprint import pprint
 from pathlib import Path
 import h5py
@@ -28,19 +27,23 @@ from matplotlib.lines import Line2D
 import matplotlib.colors as colors
 
 from .chrom_seed_scan_analysis import (get_scan_cond_data,
-                                       get_scan_avg_contact_mat,
-                                       get_scan_avg_kymo)
+                                       aggregate_scan_contacts,
+                                       open_seed_file, iter_seed_files)
 
 from .chrom_graph_funcs import (make_hic_plot, plot_contact_kymo,
+                                HIC_PLOT_MAX_BINS,
                                 plot_condensate_avg_contact_vs_time,
                                 plot_condensate_size_vs_time)
 
 from .chrom_condensate_analysis import (gen_condensate_track_info,
                                         extract_condensates)
+from ..raw_schema import get_raw_dset
+from ..sim_data import get_sim_data
 
 
 def sd_num(h5_data):
-    ydict = yaml.safe_load(h5_data.attrs['RunConfig'])
+    with open_seed_file(h5_data) as h5d:
+        ydict = get_sim_data(h5d).run_params
     return ydict['rngSeed']
 
 
@@ -67,14 +70,15 @@ def make_all_seed_scan_condensate_graphs(
     #     del h5_data['analysis']
     # analysis_grp = h5_data.require_group('analysis')
 
-    # TODO: Cludge - make this better
-    ss_ind = sd_h5_data_lst[0]['analysis/pos_kymo'].attrs['timestep_range'][0]
-    end_ind = sd_h5_data_lst[0]['analysis/pos_kymo'].attrs['timestep_range'][1]
-    time_arr = sd_h5_data_lst[0]['time'][ss_ind:end_ind]
     # TODO: Cludge - make this better
     start_bead = 0
     end_bead = None
-    nbeads = sd_h5_data_lst[0]['raw_data']['sylinders'][start_bead:end_bead, 0, 0].shape[0]
+    with open_seed_file(sd_h5_data_lst[0]) as h5d:
+        ss_ind = h5d['analysis/pos_kymo'].attrs['timestep_range'][0]
+        end_ind = h5d['analysis/pos_kymo'].attrs['timestep_range'][1]
+        time_arr = h5d['time'][ss_ind:end_ind]
+        nbeads = get_raw_dset(h5d, 'sylinders')[
+            start_bead:end_bead, 0, 0].shape[0]
 
     fig1, axarr1 = plt.subplots(1, 3, figsize=(24, 6))
     cond_num_arr, max_width_arr, total_bead_arr = get_scan_cond_data(
@@ -96,13 +100,16 @@ def make_all_seed_scan_condensate_graphs(
     fig2.savefig(opts.analysis_dir / f'cond_tracks_avgs.png')
 
     plt.rcParams['image.cmap'] = 'YlOrRd'
-    log_avg_contact_mat = get_scan_avg_contact_mat(sd_h5_data_lst)
-    fig3, ax3 = make_hic_plot(nbeads, log_avg_contact_mat, vmin=-7.)
+    # Seeds are streamed into one log-space average, stored in the scan file
+    log_avg_contact_mat, bin_edges, avg_contact_kymo = aggregate_scan_contacts(
+        sd_h5_data_lst, analysis=h5_scan_data.require_group('analysis'),
+        max_bins=HIC_PLOT_MAX_BINS, workers=getattr(opts, 'workers', 1))
+    fig3, ax3 = make_hic_plot(nbeads, log_avg_contact_mat, vmin=-7.,
+                              bin_edges=bin_edges)
     fig3.tight_layout()
     fig3.savefig(opts.analysis_dir / f'log_avg_contact_mat.png')
 
     fig4, ax4 = plt.subplots(figsize=(8, 6))
-    avg_contact_kymo = get_scan_avg_kymo(sd_h5_data_lst)
     plot_contact_kymo(fig4, ax4, time_arr, avg_contact_kymo, vmax=7.)
     fig4.tight_layout()
     fig4.savefig(opts.analysis_dir / f'avg_contact_kymo.png')
@@ -142,7 +149,7 @@ def plot_condensate_size_sd_scan(
 
 
 def plot_avg_contact_tracks(ax, sd_h5_data_lst, time_arr):
-    for h5_data in sd_h5_data_lst:
+    for h5_data in iter_seed_files(sd_h5_data_lst):
         analysis_grp = h5_data['analysis']
 
         contact_kymo = analysis_grp['contact_kymo'][...]
@@ -160,7 +167,7 @@ def plot_avg_contact_tracks(ax, sd_h5_data_lst, time_arr):
 
 
 def plot_cond_size_tracks(ax, sd_h5_data_lst, time_arr):
-    for h5_data in sd_h5_data_lst:
+    for h5_data in iter_seed_files(sd_h5_data_lst):
         analysis_grp = h5_data['analysis']
 
         contact_kymo = analysis_grp['contact_kymo'][...]
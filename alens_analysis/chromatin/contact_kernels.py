@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: contact_kernels.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Numba kernels that compute bead separations, Gaussian contact
+weights, the summed contact matrix and the contact kymograph in one pass
+over bead pairs, without N x N x T temporaries.
+"""
+
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def _accumulate_contacts(com_arr, radius_arr, box_arr, sigma, nchunks,
+                         contact_sum, contact_kymo):
+    nbeads, _, nframes = com_arr.shape
+    inv_two_sigma2 = 1. / (2. * sigma * sigma)
+    periodic = (box_arr[0] > 0.) or (box_arr[1] > 0.) or (box_arr[2] > 0.)
+    # Every chunk owns its rows of contact_sum, but adds to the kymograph
+    # of both beads of a pair, so kymograph sums are kept per chunk
+    kymo_part = np.zeros((nchunks, nbeads, nframes))
+    for c in prange(nchunks):
+        # Interleaved rows balance the shrinking rows of the upper triangle
+        for i in range(c, nbeads, nchunks):
+            for j in range(i + 1, nbeads):
+                surf = radius_arr[i] + radius_arr[j]
+                pair_sum = 0.
+                for t in range(nframes):
+                    dx = com_arr[i, 0, t] - com_arr[j, 0, t]
+                    dy = com_arr[i, 1, t] - com_arr[j, 1, t]
+                    dz = com_arr[i, 2, t] - com_arr[j, 2, t]
+                    if periodic:
+                        # Minimum image along periodic axes
+                        if box_arr[0] > 0.:
+                            dx -= box_arr[0] * np.round(dx / box_arr[0])
+                        if box_arr[1] > 0.:
+                            dy -= box_arr[1] * np.round(dy / box_arr[1])
+                        if box_arr[2] > 0.:
+                            dz -= box_arr[2] * np.round(dz / box_arr[2])
+                    sep = np.sqrt(dx * dx + dy * dy + dz * dz) - surf
+                    weight = np.exp(-sep * sep * inv_two_sigma2)
+                    pair_sum += weight
+                    kymo_part[c, i, t] += weight
+                    kymo_part[c, j, t] += weight
+                contact_sum[i, j] += pair_sum
+                contact_sum[j, i] += pair_sum
+
+    for i in prange(nbeads):
+        surf = 2. * radius_arr[i]
+        self_weight = np.exp(-surf * surf * inv_two_sigma2)
+        contact_sum[i, i] += nframes * self_weight
+        for t in range(nframes):
+            # Matches get_contact_kymo_data, which removes a self contact of 1
+            kymo_sum = self_weight - 1.
+            for c in range(nchunks):
+                kymo_sum += kymo_part[c, i, t]
+            contact_kymo[i, t] += kymo_sum
+
+
+def accumulate_contacts(com_arr, contact_sum, contact_kymo, sigma=.02,
+                        radius_arr=None, threads=None, box_size=None):
+    """Add the Gaussian weighted contacts of a block of frames to a summed
+    contact matrix and write their contact kymograph, in one multithreaded
+    pass over the bead pairs i < j.
+
+    Parameters
+    ----------
+    com_arr : Nx3xT ndarray
+        Bead centers of the frames in the block
+    contact_sum : NxN ndarray
+        Contact matrix summed over frames, added to in place
+    contact_kymo : NxT ndarray
+        Kymograph of the block (sum of contacts of a bead minus one), added
+        to in place so it should start at zero
+    sigma : float, optional
+        Width of the Gaussian contact weight, by default .02
+    radius_arr : ndarray, optional
+        Bead radii; contact is measured from the bead surfaces, by default
+        None
+    threads : int, optional
+        Number of threads, at most NUMBA_NUM_THREADS, by default None
+        (numba's default, the number of cores or NUMBA_NUM_THREADS)
+    box_size : array-like, optional
+        Lengths of a periodic box (zero along non-periodic axes) for minimum
+        image separations, by default None
+    """
+    com_arr = np.ascontiguousarray(com_arr, dtype=np.float64)
+    if radius_arr is None:
+        radius_arr = np.zeros(com_arr.shape[0])
+    radius_arr = np.asarray(radius_arr, dtype=np.float64)
+    box_arr = (np.zeros(3) if box_size is None else
+               np.asarray(box_size, dtype=np.float64))
+
+    old_threads = numba.get_num_threads()
+    if threads is not None:
+        numba.set_num_threads(clamp_threads(threads))
+    try:
+        _accumulate_contacts(com_arr, radius_arr, box_arr, float(sigma),
+                             numba.get_num_threads(), contact_sum,
+                             contact_kymo)
+    finally:
+        numba.set_num_threads(old_threads)
+
+
+def clamp_threads(threads):
+    """Number of threads numba can run, between 1 and NUMBA_NUM_THREADS
+    (set_num_threads raises above it)."""
+    return max(1, min(int(threads), numba.config.NUMBA_NUM_THREADS))
+
+
+def get_kernel_block_size(nbeads, mem_bytes, threads=None):
+    """Number of frames per block of accumulate_contacts that fit in a
+    memory budget. A block holds the Nx3 centers and an NxT kymograph per
+    thread."""
+    threads = (numba.get_num_threads() if threads is None else
+               clamp_threads(threads))
+    return max(1, int(mem_bytes // (8 * nbeads * (threads + 4))))
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
@@ -9,34 +9,35 @@ Description:
 
 from pathlib import Path
 from time import time
+from functools import partial
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from matplotlib.gridspec import GridSpec
-from matplotlib.animation import FuncAnimation, FFMpegWriter
+from matplotlib.animation import FFMpegWriter
 import math
 import yaml
 from numba import jit, vectorize
 import argparse
 
 from ..objects import filament
-from ..read_func import (read_dat_sylinder,
-                         get_file_number,
-                         get_png_number,
-                         count_fils)
+from ..read_func import read_dat_sylinder, map_frames, count_fils
+from ..frame_manifest import get_frame_paths
+from ..array_store import open_raw_data, find_raw_data
+from ..raw_schema import get_raw_dset
+from ..periodic import get_box_size, pair_distances
+from .chrom_analysis import sparse_gauss_weighted_contact
 
 
 SQRT2 = np.sqrt(2)
 
 
-def make_separation_mat(com_arr, downsample=1):
+def make_separation_mat(com_arr, downsample=1, box_size=None):
     nbeads = com_arr.shape[0]
     reduc_com_arr = com_arr[::downsample]
     x = np.arange(nbeads + 1)[::int((nbeads) / reduc_com_arr.shape[0])]
     X, Y = np.meshgrid(x, x)
-    dist_mat = np.linalg.norm(
-        reduc_com_arr[:, np.newaxis, :] - reduc_com_arr[np.newaxis, :, :],
-        axis=-1)
+    dist_mat = pair_distances(reduc_com_arr, box_size)
     return dist_mat, X, Y
 
 
@@ -44,19 +45,34 @@ def gauss_weighted_contact(sep_mat, sigma=.020):
     return np.exp(-np.power(sep_mat, 2) / (2. * (sigma * sigma)))
 
 
-def create_hic_frame(fil_dat_path, style='sep',
-                     downsample=1, bead_range=None, **kwargs):
-    # Get filament data
-    fils = read_dat_sylinder(fil_dat_path)
-    com_arr = np.asarray([fil.get_com()
-                          for fil in fils if (fil.fil_type != 'L')])
+def hic_frame_from_com(com_arr, style='sep', downsample=1, bead_range=None,
+                       box_size=None, **kwargs):
+    """Hi-C style matrix of one frame of bead centers.
+
+    @param com_arr (N, 3) bead centers
+    @param style 'sep', 'contact', 'log_contact' or 'sparse_contact'
+    @param downsample Only use every downsample-th bead
+    @param bead_range [start] or [start, stop] beads to use
+    @param box_size Lengths of a periodic box (zero along non-periodic axes)
+    @return: matrix, X and Y bin edge grids
+
+    """
     if not bead_range is None:
         if len(bead_range) == 1:
             com_arr = com_arr[bead_range[0]:]
         else:
             com_arr = com_arr[bead_range[0]:bead_range[1]]
 
-    sep_mat, X, Y = make_separation_mat(com_arr, downsample)
+    if style == 'sparse_contact':
+        # Only pairs near contact are computed, the rest are zero
+        nbeads = com_arr.shape[0]
+        reduc_com_arr = com_arr[::downsample]
+        x = np.arange(nbeads + 1)[::int((nbeads) / reduc_com_arr.shape[0])]
+        X, Y = np.meshgrid(x, x)
+        return sparse_gauss_weighted_contact(
+            reduc_com_arr, box_size=box_size).toarray(), X, Y
+
+    sep_mat, X, Y = make_separation_mat(com_arr, downsample, box_size)
 
     if style == 'sep':
         return sep_mat, X, Y
@@ -68,41 +84,134 @@ def create_hic_frame(fil_dat_path, style='sep',
         raise RuntimeError(f' The style "{style}" is not supported currently.')
 
 
-def animate(i, fig, axarr, fil_dat_paths, png_paths, init_mutable, opts):
-    for ax in axarr:
-        ax.clear()
-
-    png = plt.imread(str(png_paths[i]))
-    img = axarr[0].imshow(png, resample=False)
-    axarr[0].set_axis_off()
+def create_hic_frame(fil_dat_path, style='sep',
+                     downsample=1, bead_range=None, **kwargs):
+    # Get filament data
+    fils = read_dat_sylinder(fil_dat_path)
+    com_arr = np.asarray([fil.get_com()
+                          for fil in fils if (fil.fil_type != 'L')])
+    return hic_frame_from_com(com_arr, style, downsample, bead_range)
+
+
+# Raw data files opened by a movie worker process, kept open between frames
+_WORKER_RAW_DATA = {}
+
+
+def make_movie_hic_frame(raw_path, params, job):
+    """Hi-C matrix (and image, if any) of one movie frame, read from a raw
+    data file. Runs in the worker processes of render_hic_movie.
+
+    @param raw_path Path of the raw data file
+    @param params Movie parameters (style, downsample, bead_range...)
+    @param job (frame index, image path or None)
+    @return: matrix, image array or None
+
+    """
+    frame, png_path = job
+    if raw_path not in _WORKER_RAW_DATA:
+        _WORKER_RAW_DATA[raw_path] = open_raw_data(find_raw_data(raw_path))
+    sy_dat = get_raw_dset(_WORKER_RAW_DATA[raw_path], 'sylinders')[:, :, frame]
+    com_arr = .5 * (sy_dat[:, 2:5] + sy_dat[:, 5:8])
+    mat, _, _ = hic_frame_from_com(com_arr, **params)
+    png = None if png_path is None else plt.imread(str(png_path))
+    return mat, png
+
+
+def get_movie_raw_path(opts):
+    """Raw data file of a seed used to make movies."""
+    raw_path = getattr(opts, 'raw_path', None)
+    if raw_path is None:
+        raw_path = opts.analysis_dir / f'raw_{opts.path.stem}.h5'
+    if not Path(raw_path).exists():
+        raise FileNotFoundError(
+            f'No raw data file {raw_path}. Run the collect analysis first.')
+    return Path(raw_path)
+
+
+def render_hic_movie(fig, hic_ax, movie_path, raw_path, frames, opts,
+                     img_ax=None, png_paths=None, colorbar_label=None):
+    """Render a Hi-C movie. Frame matrices are made from the raw data file in
+    a pool of opts.workers processes, drawn by updating artists made once,
+    and piped to ffmpeg in frame order.
+
+    @param fig Figure holding the axes
+    @param hic_ax Axes of the Hi-C matrix
+    @param movie_path Path of the movie to write
+    @param raw_path Raw data file of the seed
+    @param frames Raw data frame index of every movie frame
+    @param opts Parsed options with params (fps, style, vmin...) and workers
+    @param img_ax Axes of the simulation images, None for no images
+    @param png_paths Image of every movie frame
+    @param colorbar_label Label of a colorbar, None for no colorbar
+    @return: void, movie saved at movie_path
+
+    """
+    params = {k: v for k, v in opts.params.items()
+              if k in ('style', 'downsample', 'bead_range')}
+    with open_raw_data(find_raw_data(raw_path)) as h5_data:
+        time_arr = h5_data['time'][...]
+        params['box_size'] = get_box_size(
+            yaml.safe_load(h5_data.attrs['RunConfig']))
+    jobs = [(frame, None if png_paths is None else png_paths[i])
+            for i, frame in enumerate(frames)]
 
-    print(f'Making frame {i}')
+    writer = FFMpegWriter(
+        fps=opts.params['fps'],
+        codec='libx264',
+        bitrate=-1,
+        extra_args=[
+            '-pix_fmt',
+            'yuv420p'])
 
+    workers = getattr(opts, 'workers', 1)
+    frame_iter = map_frames(partial(make_movie_hic_frame, str(raw_path), params),
+                            jobs, workers=workers, chunksize=1)
+    hic_img = img = title = None
+    t_make = t_draw = 0.
     t0 = time()
-    frame, X, Y = create_hic_frame(fil_dat_paths[i], **opts.params)
-    t1 = time()
-    print(f"Frame {i} created in: {t1-t0:.2g} sec")
-    # c = axarr[1].pcolorfast(frames[i], vmax=vmax, vmin=0)
-
-    c = axarr[1].pcolorfast(X, Y, frame, vmin=opts.params['vmin'])
-    t2 = time()
-    print(f"Frame {i} drawn in: {t2 - t1:.2g} sec")
-    if init_mutable[0] == True:  # Cludge, there is a better way to do thisdf cdf
-        fig.colorbar(
-            c,
-            ax=axarr[1],
-            # label=r"$\log$(Inferred contact map) $\sim$
-            # ($r_{ij}^2/2\sigma^2$)")
-            label=r"Log contact probability $\sim$ ($-r_{ij}^2$)")
-        init_mutable[0] = False
-
-    axarr[1].set_xlabel(r"Bead index")
-    axarr[1].set_ylabel(r"Bead index")
-
-    # pcm = ax.pcolorfast(frames[i], cmap='gray', vmax=vmax)
-    axarr[0].set_title("Time {:.2f} sec".format(
-        float(i * opts.params['time_step'] * opts.params['n_graph'])))
-    return [img, c]
+    try:
+        with writer.saving(fig, movie_path, opts.params.get('dpi', 300)):
+            for frame in frames:
+                t1 = time()
+                mat, png = next(frame_iter)
+                t2 = time()
+                if hic_img is None:
+                    # Artists are made once and only their data changes after
+                    nbeads = mat.shape[0] * opts.params.get('downsample', 1)
+                    hic_img = hic_ax.imshow(
+                        mat, origin='lower', interpolation='nearest',
+                        extent=(0, nbeads, 0, nbeads),
+                        vmin=opts.params['vmin'],
+                        vmax=opts.params.get('vmax', mat.max()))
+                    if colorbar_label is not None:
+                        fig.colorbar(hic_img, ax=hic_ax, label=colorbar_label)
+                    if img_ax is not None:
+                        img = img_ax.imshow(png, resample=False)
+                        img_ax.set_axis_off()
+                        title = img_ax.set_title('')
+                else:
+                    hic_img.set_data(mat)
+                    # Upper color limit follows each frame unless it is fixed
+                    hic_img.set_clim(opts.params['vmin'],
+                                     opts.params.get('vmax', mat.max()))
+                    if img is not None:
+                        img.set_data(png)
+                if title is not None:
+                    title.set_text("Time {:.2f} sec".format(time_arr[frame]))
+                writer.grab_frame()
+                t_make += t2 - t1
+                t_draw += time() - t2
+    finally:
+        # Shuts the worker pool down
+        frame_iter.close()
+
+    t_tot = time() - t0
+    nframes = len(frames)
+    print(f"Rendered {nframes} frames in {t_tot:.3g} sec "
+          f"({nframes / max(t_tot, 1e-9):.3g} frames/sec)")
+    print(f"  Waiting for frame matrices: {t_make:.3g} sec "
+          f"({workers} workers)")
+    print(f"  Drawing and encoding: {t_draw:.3g} sec")
 
 
 def hic_animation(opts):
@@ -126,76 +235,27 @@ def hic_animation(opts):
         opts.params['time_step'] = run_params['timeSnap']
 
     result_dir = opts.result_dir
-    fil_dat_paths = sorted(result_dir.glob("**/SylinderAscii*.dat"),
-                           key=get_file_number)[::opts.params['n_graph']]
-    png_paths = sorted(result_dir.glob("PNG/*.png"),
-                       key=get_png_number)[::opts.params['n_graph']]
-
-    # print(png_paths)
-    init_mutable = [True]
-    nframes = len(png_paths)
+    raw_path = get_movie_raw_path(opts)
+    png_paths = get_frame_paths(
+        result_dir, 'image', 'png', 'PNG')[::opts.params['n_graph']]
+    with open_raw_data(find_raw_data(raw_path)) as h5_data:
+        frames = np.arange(h5_data['time'].shape[0])[::opts.params['n_graph']]
+    nframes = min(len(png_paths), frames.size)
     print(nframes)
-    fig, axarr = plt.subplots(1, 2, figsize=(20, 8))
-    # fig = plt.figure(figsize=(20, 8))
-    # gs = GridSpec(1, 3)
-    # axarr = [fig.add_subplot(gs[:-1])]
-    # axarr += [fig.add_subplot(gs[-1])]
 
-    axarr[1].set_aspect('equal')
-    writer = FFMpegWriter(
-        fps=opts.params['fps'],
-        codec='libx264',
-        bitrate=-1,
-        extra_args=[
-            '-pix_fmt',
-            'yuv420p'])
-    vmax = 0
-    ani = FuncAnimation(fig, animate, nframes,
-                        fargs=(
-                            fig,
-                            axarr,
-                            fil_dat_paths,
-                            png_paths,
-                            init_mutable, opts),
-                        blit=True)
+    fig, axarr = plt.subplots(1, 2, figsize=(20, 8))
     fig.set_size_inches(20, 8, True)
-    ani.save(
-        opts.analysis_dir /
-        f'{opts.params["style"]}_mat_vid.mp4',
-        writer=writer,
-        dpi=300)
-
-
-def animate_hic_only(i, fig, ax, fil_dat_paths, init_mutable, opts):
-    ax.clear()
-
-    print(f'Making frame {i}')
-
-    t0 = time()
-    frame, X, Y = create_hic_frame(fil_dat_paths[i], **opts.params)
-    t1 = time()
-    print(f"Frame {i} created in: {t1-t0:.2g} sec")
-
-    c = ax.pcolorfast(X, Y, frame, vmin=opts.params['vmin'])
-    t2 = time()
-    print(f"Frame {i} drawn in: {t2 - t1:.2g} sec")
-
-    # if init_mutable[0] == True:  # Cludge, there is a better way to do thisdf cdf
-    #     fig.colorbar(
-    #         c,
-    #         ax=ax,
-    #         # label=r"$\log$(Inferred contact map) $\sim$
-    #         # ($r_{ij}^2/2\sigma^2$)")
-    #         label=r"Log contact probability $\sim$ ($-r_{ij}^2$)")
-    #     init_mutable[0] = False
-
-    # ax.set_xlabel(r"Bead index")
-    # ax.set_ylabel(r"Bead index")
-
-    # pcm = ax.pcolorfast(frames[i], cmap='gray', vmax=vmax)
-    # ax.set_title("Time {:.2f} sec".format(
-    # float(i * opts.params['time_step'] * opts.params['n_graph'])))
-    return [c]
+    axarr[1].set_aspect('equal')
+    axarr[1].set_xlabel(r"Bead index")
+    axarr[1].set_ylabel(r"Bead index")
+    render_hic_movie(
+        fig, axarr[1],
+        opts.analysis_dir / f'{opts.params["style"]}_mat_vid.mp4',
+        raw_path, frames[:nframes], opts,
+        img_ax=axarr[0], png_paths=png_paths[:nframes],
+        # label=r"$\log$(Inferred contact map) $\sim$
+        # ($r_{ij}^2/2\sigma^2$)")
+        colorbar_label=r"Log contact probability $\sim$ ($-r_{ij}^2$)")
 
 
 def hic_only_animation(opts):
@@ -218,41 +278,20 @@ def hic_only_animation(opts):
         run_params = yaml.safe_load(yf)
         opts.params['time_step'] = run_params['timeSnap']
 
-    result_dir = opts.result_dir
-    fil_dat_paths = sorted(result_dir.glob("**/SylinderAscii*.dat"),
-                           key=get_file_number)[::opts.params['n_graph']]
-
-    # print(png_paths)
-    init_mutable = [True]
-    nframes = len(fil_dat_paths)
-    print(nframes)
+    raw_path = get_movie_raw_path(opts)
+    with open_raw_data(find_raw_data(raw_path)) as h5_data:
+        frames = np.arange(h5_data['time'].shape[0])[::opts.params['n_graph']]
 
     fig, axarr = plt.subplots(1, 1, figsize=(10, 8))
     axarr.tick_params(top=False, bottom=False, left=False, right=False,
                       labelleft=False, labelbottom=False)
-    writer = FFMpegWriter(
-        fps=opts.params['fps'],
-        codec='libx264',
-        bitrate=-1,
-        extra_args=[
-            '-pix_fmt',
-            'yuv420p'])
-    vmax = 0
     axarr.set_aspect('equal')
-    ani = FuncAnimation(fig, animate_hic_only, nframes,
-                        fargs=(
-                            fig,
-                            axarr,
-                            fil_dat_paths,
-                            init_mutable, opts),
-                        blit=True)
-
     fig.set_size_inches(10, 8, True)
-    ani.save(
+    render_hic_movie(
+        fig, axarr,
         opts.analysis_dir /
         f'{opts.params["style"]}_{opts.colormap}_mat_vid.mp4',
-        writer=writer,
-        dpi=300)
+        raw_path, frames, opts)
 
 
 ##########################################
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: hic_pyramid.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Multi-resolution (.mcool style) storage of contact matrices.
+The matrix is stored bin-summed at 1, 2, 4, 8... beads per bin so plots and
+seed averages only read the resolution they need.
+"""
+
+import numpy as np
+
+PYRAMID_GRP_NAME = 'avg_contact_pyramid'
+
+
+def coarsen_contact_mat(contact_mat, factor=2):
+    """Sum a square matrix over factor x factor bins. A partial last bin
+    holds the sum of the rows (columns) that are left.
+
+    @param contact_mat NxN matrix
+    @param factor Number of rows (columns) summed into one bin
+    @return: ceil(N/factor) x ceil(N/factor) matrix
+
+    """
+    n = contact_mat.shape[0]
+    nbins = -(-n // factor)
+    pad = nbins * factor - n
+    padded = np.pad(contact_mat, ((0, pad), (0, pad)))
+    return padded.reshape(nbins, factor, nbins, factor).sum(axis=(1, 3))
+
+
+def get_hic_bin_edges(nbeads, bin_size):
+    """Bead index edges of the bins of a resolution."""
+    return np.append(np.arange(0, nbeads, bin_size), nbeads)
+
+
+def get_pair_counts(nbeads, bin_size, bin_slice=slice(None)):
+    """Number of bead pairs summed into every bin of a resolution."""
+    sizes = np.diff(get_hic_bin_edges(nbeads, bin_size))[bin_slice]
+    return np.outer(sizes, sizes)
+
+
+def write_hic_pyramid(grp, contact_mat, min_bins=64, compression='gzip'):
+    """Store a contact matrix at 1, 2, 4... beads per bin, down to the first
+    resolution with at most min_bins bins.
+
+    @param grp HDF5 group to store the resolutions in
+    @param contact_mat NxN matrix of (linear, not log) contact values
+    @param min_bins Number of bins of the coarsest resolution
+    @param compression Compression of the stored matrices
+    @return: list of the stored bin sizes
+
+    """
+    contact_mat = np.asarray(contact_mat, dtype=float)
+    nbeads = contact_mat.shape[0]
+    grp.attrs['nbeads'] = nbeads
+    res_grp = grp.require_group('resolutions')
+    bin_size = 1
+    level = contact_mat
+    bin_sizes = []
+    while True:
+        name = str(bin_size)
+        if name in res_grp:
+            del res_grp[name]
+        chunk = min(256, level.shape[0])
+        dset = res_grp.create_dataset(name, data=level,
+                                      chunks=(chunk, chunk),
+                                      compression=compression)
+        dset.attrs['bin_size'] = bin_size
+        bin_sizes += [bin_size]
+        if level.shape[0] <= min_bins:
+            break
+        # Each level is made from the previous one, so every bead is only
+        # summed once per level
+        level = coarsen_contact_mat(level, 2)
+        bin_size *= 2
+    grp.attrs['bin_sizes'] = bin_sizes
+    return bin_sizes
+
+
+def get_pyramid_bin_size(grp, max_bins=None):
+    """Finest stored bin size with at most max_bins bins (the coarsest one
+    if none is small enough)."""
+    nbeads = int(grp.attrs['nbeads'])
+    bin_sizes = sorted(int(b) for b in grp.attrs['bin_sizes'])
+    if max_bins is None:
+        return bin_sizes[0]
+    for bin_size in bin_sizes:
+        if -(-nbeads // bin_size) <= max_bins:
+            return bin_size
+    return bin_sizes[-1]
+
+
+def read_hic_level(grp, max_bins=None, bin_size=None, mean=True,
+                   bead_range=None):
+    """Read one resolution of a contact pyramid.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+        Pyramid group written by write_hic_pyramid
+    max_bins : int, optional
+        Read the finest resolution with at most this many bins, by default
+        None (full resolution)
+    bin_size : int, optional
+        Read this stored bin size instead, by default None
+    mean : bool, optional
+        Divide the bin sums by the number of bead pairs in each bin, so
+        every resolution is on the scale of the full matrix, by default True
+    bead_range : tuple, optional
+        (start, stop) beads of a region to read, rounded out to whole bins,
+        by default None (whole matrix)
+
+    Returns
+    -------
+    contact_mat : ndarray
+        Binned contact matrix
+    bin_size : int
+        Beads per bin
+    bin_edges : ndarray
+        Bead index edges of the returned bins
+    """
+    if bin_size is None:
+        bin_size = get_pyramid_bin_size(grp, max_bins)
+    nbeads = int(grp.attrs['nbeads'])
+    dset = grp['resolutions'][str(bin_size)]
+    edges = get_hic_bin_edges(nbeads, bin_size)
+    if bead_range is None:
+        bin_slice = slice(None)
+    else:
+        start = bead_range[0] // bin_size
+        stop = (None if bead_range[-1] is None else
+                -(-bead_range[-1] // bin_size))
+        bin_slice = slice(start, stop)
+    # Only the requested region of the level is read
+    contact_mat = dset[bin_slice, bin_slice]
+    if mean:
+        contact_mat = contact_mat / get_pair_counts(nbeads, bin_size,
+                                                    bin_slice)
+    start = bin_slice.start or 0
+    return (contact_mat, bin_size,
+            edges[start:start + contact_mat.shape[0] + 1])
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
@@ -14,12 +14,15 @@ import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 
+from alens_analysis.sim_data import get_sim_data
+
 
 def make_motion_graph(h5_data):
-    time_arr = h5_data['time'][:]
+    sim = get_sim_data(h5_data)
+    time_arr = sim.time()
     #print(time_arr.size)
-    sy_dat = h5_data['raw_data']['sylinders'][...]
-    com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+    sy_dat = sim.sylinders()
+    com_arr = sim.com()
     fig, ax = plt.subplots()
     ax.plot(time_arr, np.linalg.norm(sy_dat[1,:,:],axis=0))
     return fig, ax
@@ -18,6 +18,9 @@ import numpy as np
 import scipy.stats as stats
 from scipy.signal import savgol_filter
 from alens_analysis.helpers import gen_id
+from alens_analysis.raw_schema import get_raw_dset
+from alens_analysis.sim_data import SimulationData, open_sim_data
+from alens_analysis.periodic import pair_distances, periodic_mean
 from sklearn.cluster import MeanShift, estimate_bandwidth, DBSCAN, OPTICS
 
 # Clustering stuff
@@ -223,9 +226,13 @@ def find_descendants(clusters, thresh=.6, nskip=1):
 
 
 def identify_spatial_clusters(com_arr,
-                              eps=0.05, min_samples=12, thresh=20, verbose=True):
-    clust = OPTICS(min_samples=min_samples, eps=eps, cluster_method='dbscan')
-    clust.fit(com_arr)
+                              eps=0.05, min_samples=12, thresh=20, verbose=True,
+                              box_size=None):
+    clust = OPTICS(min_samples=min_samples, eps=eps, cluster_method='dbscan',
+                   metric='euclidean' if box_size is None else 'precomputed')
+    # Minimum image distances in a periodic box
+    clust.fit(com_arr if box_size is None else
+              pair_distances(com_arr, box_size))
     labels = clust.labels_
 
     # Number of clusters in labels, ignoring noise if present.
@@ -243,7 +250,7 @@ def identify_spatial_clusters(com_arr,
         if cli.size < thresh:
             continue
         cluster_label_inds += [cli]
-        cluster_centers += [com_arr[cli, :].mean(axis=0)]
+        cluster_centers += [periodic_mean(com_arr[cli, :], box_size)]
     if verbose:
         print("number of thresholded clusters : %d" % len(cluster_centers))
 
@@ -257,12 +264,22 @@ def identify_spatial_clusters(com_arr,
 def collect_cluster_data(run_path,
                          ss_ind=1, end_ind=None, start_bead=0, end_bead=None,
                          **kwargs):
+    """Bead centers of mass and clusters of a run.
+
+    @param run_path Seed directory, or SimulationData of its raw data file
+    @return: time array, center of mass array (read only, see
+             SimulationData), clusters of each time
+
+    """
+    if isinstance(run_path, SimulationData):
+        sim_src = run_path
+        run_path = run_path.path.parent.parent
+    else:
+        sim_src = next(run_path.glob('analysis/raw*.h5'))
 
     # Get bead position information
-    with h5py.File(next(run_path.glob('analysis/raw*.h5')), 'r') as h5_data:
-        sy_dat = h5_data['raw_data/sylinders'][start_bead:end_bead,
-                                               :, ss_ind:end_ind]
-        com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+    with open_sim_data(sim_src) as sim:
+        com_arr = sim.com((start_bead, end_bead), (ss_ind, end_ind))
 
     # Get cluster information
     h5_clust_file = next(run_path.glob('analysis/cluster*.h5'))
@@ -326,6 +343,16 @@ def create_cluster_hdf5(anal_file_path,
                         ss_ind=1, end_ind=None, start_bead=0, end_bead=None,
                         thresh=20, force=True, verbose=False
                         ):
+    """Find spatial clusters of beads at every time and write them to a
+    cluster file beside the raw data.
+
+    @param anal_file_path Raw data file path, or SimulationData of it
+    @return: void
+
+    """
+    sim_src = anal_file_path
+    if isinstance(anal_file_path, SimulationData):
+        anal_file_path = anal_file_path.path
 
     # Create path for cluster data file
     clust_path = (anal_file_path.parent /
@@ -339,12 +366,11 @@ def create_cluster_hdf5(anal_file_path,
 
     # Load analysis data to get particle positions for cluster algorithms
     id_gen = gen_id()
-    with h5py.File(anal_file_path, 'r+') as h5_data:
-        time_arr = h5_data['time'][ss_ind:end_ind]
+    with open_sim_data(sim_src) as sim:
+        time_arr = sim.time((ss_ind, end_ind))
         print(time_arr.shape)
-        sy_dat = h5_data['raw_data/sylinders'][start_bead:end_bead,
-                                               :, ss_ind:end_ind]
-        com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+        com_arr = sim.com((start_bead, end_bead), (ss_ind, end_ind))
+        box_size = sim.box_size
 
     # Write cluster and write out data
     with h5py.File(clust_path, 'w') as h5_clust:
@@ -354,7 +380,8 @@ def create_cluster_hdf5(anal_file_path,
             time_grp = clust_grp.create_group(f'time_{t}')
             time_grp.attrs['time'] = t
             clust, cluster_centers, cluster_label_inds = identify_spatial_clusters(
-                com_arr[:, :, i], thresh=thresh, verbose=verbose)
+                com_arr[:, :, i], thresh=thresh, verbose=verbose,
+                box_size=box_size)
             for cli, cc in zip(cluster_label_inds, cluster_centers):
                 cluster = Cluster(next(id_gen), t, cli, cc)
                 cluster.write_clust_to_hdf5_dset(time_grp)
@@ -362,18 +389,19 @@ def create_cluster_hdf5(anal_file_path,
 
 def create_cluster_yaml(anal_file_path, ss_ind=1, end_ind=-1, start_bead=0,
                         end_bead=None):
-    with h5py.File(anal_file_path, 'r+') as h5_data:
-        time_arr = h5_data['time'][ss_ind:end_ind]
+    sim_src = anal_file_path
+    if isinstance(anal_file_path, SimulationData):
+        anal_file_path = anal_file_path.path
+    with open_sim_data(sim_src) as sim:
+        time_arr = sim.time((ss_ind, end_ind))
         print(time_arr.shape)
 
-        sy_dat = h5_data['raw_data/sylinders'][start_bead:end_bead,
-                                               :, ss_ind:end_ind]
-        com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+        com_arr = sim.com((start_bead, end_bead), (ss_ind, end_ind))
         clust_cent_list = []
         clust_label_list = []
         for i in range(time_arr.size):
             clust, cluster_centers, cluster_label_inds = identify_spatial_clusters(
-                com_arr[:, :, i], thresh=40)
+                com_arr[:, :, i], thresh=40, box_size=sim.box_size)
             clust_cent_list += [cluster_centers]
             clust_label_list += [cluster_label_inds]
     data_dict = {
@@ -396,7 +424,7 @@ def testing():
     with h5py.File(next(data_path.glob('analysis/*.h5')), 'r+') as h5_data:
         time_arr = h5_data['time'][ss_ind:end_ind]
         analysis_grp = h5_data['analysis']
-        sy_dat = h5_data['raw_data/sylinders'][start_bead:end_bead,
+        sy_dat = get_raw_dset(h5_data, 'sylinders')[start_bead:end_bead,
                                                :, ss_ind:end_ind]
         com_arr = .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
 
@@ -15,7 +15,8 @@ from datetime import datetime
 from .chromatin.chrom_graph_funcs import (make_all_condensate_graphs)
 from .chromatin.chrom_seed_scan_graph_funcs import (
     make_all_seed_scan_condensate_graphs)
-from .read_func import convert_dat_to_hdf, collect_stress_from_con_pvtp
+from .read_func import (convert_dat_to_hdf, collect_stress_from_con_pvtp,
+                        collect_stress_field_from_con_pvtp)
 from .chromatin.hic_animation import hic_animation, hic_only_animation
 from .min_animation import min_animation
 from .result_to_pvd import make_pvd_files
@@ -57,17 +58,10 @@ def make_seed_scan_graphs(opts):
 
     with h5py.File(h5_path, 'a') as h5_scan_data:
         overwrite = True if opts.analysis == 'overwrite' else False
-        try:
-            sd_h5_data_lst = [
-                h5py.File(sdh5, 'r')
-                for sdh5 in opts.result_dir.glob('s*/analysis/*.h5')]
-            make_all_seed_scan_condensate_graphs(
-                h5_scan_data, sd_h5_data_lst, opts, overwrite=overwrite)
-        except BaseException:
-            raise
-        finally:
-            for sdh5 in sd_h5_data_lst:
-                sdh5.close()
+        # Seed files are opened one (or a few) at a time by the analyses
+        sd_h5_path_lst = list(opts.result_dir.glob('s*/analysis/*.h5'))
+        make_all_seed_scan_condensate_graphs(
+            h5_scan_data, sd_h5_path_lst, opts, overwrite=overwrite)
 
 
 def seed_analysis(opts):
@@ -92,16 +86,39 @@ def seed_analysis(opts):
     if getattr(opts, 'analysis', None) == 'collect':
         t0 = time.time()
         print(f'raw_{opts.path.stem}')
-        convert_dat_to_hdf(h5_raw_path, opts.path)
+        convert_dat_to_hdf(h5_raw_path, opts.path,
+                           workers=getattr(opts, 'workers', 1),
+                           append=getattr(opts, 'append', False),
+                           layout=getattr(opts, 'layout', 'auto'),
+                           compression=getattr(opts, 'compression', None),
+                           schema=getattr(opts, 'schema', 'packed'),
+                           dtype=getattr(opts, 'precision', 'f4'),
+                           store=getattr(opts, 'store', None))
         print(f" HDF5 raw created in {time.time() - t0}")
 
     if getattr(opts, 'analysis', None) == 'stress':
         h5_stress_path = opts.analysis_dir / f'stress_{opts.path.stem}.h5'
         t0 = time.time()
         print(f'stress_{opts.path.stem}')
-        collect_stress_from_con_pvtp(h5_stress_path, opts.path)
+        collect_stress_from_con_pvtp(h5_stress_path, opts.path,
+                                     workers=getattr(opts, 'workers', 1),
+                                     stride=getattr(opts, 'stride', 1),
+                                     append=getattr(opts, 'append', False))
         print(f" HDF5 stress created in {time.time() - t0}")
 
+    if getattr(opts, 'analysis', None) == 'stress_field':
+        h5_stress_path = opts.analysis_dir / \
+            f'stress_field_{opts.path.stem}.h5'
+        t0 = time.time()
+        print(f'stress_field_{opts.path.stem}')
+        collect_stress_field_from_con_pvtp(
+            h5_stress_path, opts.path,
+            grid_shape=getattr(opts, 'grid', None),
+            workers=getattr(opts, 'workers', 1),
+            stride=getattr(opts, 'stride', 1),
+            append=getattr(opts, 'append', False))
+        print(f" HDF5 stress field created in {time.time() - t0}")
+
     if getattr(opts, 'analysis', None) == 'cluster':
         t0 = time.time()
         create_cluster_hdf5(h5_raw_path, force=opts.force,
@@ -117,6 +134,7 @@ def seed_analysis(opts):
         print(f" HDF5 connect file created in {time.time() - t0}")
 
     if getattr(opts, 'movie', None):
+        opts.raw_path = h5_raw_path
         MOVIE_DICT[opts.movie](opts)
         return
 
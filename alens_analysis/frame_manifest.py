@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: frame_manifest.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Persistent index of the frame files in an aLENS result directory
+(or zipped result archive) so they do not have to be found with a recursive
+glob or a central directory parse on every call.
+"""
+
+import io
+import os
+import re
+import json
+import atexit
+import zlib
+import struct
+import zipfile
+from pathlib import Path
+
+MANIFEST_NAME = '.frame_manifest.json'
+MANIFEST_VERSION = 1
+
+# SylinderAscii_10.dat, ConBlock_10.pvtp, ...
+FRAME_FILE_REG = re.compile(r'^(?P<kind>[A-Za-z]+)_(?P<frame>\d+)\.(?P<ext>\w+)$')
+# PNG/image.00010.png
+IMAGE_FILE_REG = re.compile(r'^(?P<kind>[A-Za-z]+)\.(?P<frame>\d+)\.(?P<ext>png)$')
+
+
+def parse_frame_file_name(name):
+    """Get the kind, frame number, and extension of a frame file name.
+
+    Parameters
+    ----------
+    name : str
+        File name, e.g. 'SylinderAscii_10.dat' or 'image.00010.png'
+
+    Returns
+    -------
+    tuple or None
+        (kind, frame, ext) or None if the name is not a frame file
+    """
+    match = FRAME_FILE_REG.match(name) or IMAGE_FILE_REG.match(name)
+    if match is None:
+        return None
+    return match['kind'], int(match['frame']), match['ext']
+
+
+class FrameManifest():
+
+    """Index of frame files (kind, frame number, path, size, mtime) in a result
+    directory. The index is stored in the result directory and refreshed
+    incrementally: only directories whose mtime changed are listed again, and
+    in the others only the newest frame file of each kind is stat'ed."""
+
+    def __init__(self, result_dir, save=True):
+        """
+        @param result_dir Directory holding result*/ directories and frames
+        @param save Write the manifest back to disk after refreshing
+        """
+        self.result_dir = Path(result_dir)
+        self.manifest_path = self.result_dir / MANIFEST_NAME
+        # Relative directory path -> {'mtime': int, 'subdirs': [...],
+        #                             'files': [[kind, frame, ext, name, size, mtime]]}
+        self.dirs = {}
+        self.load()
+        if self.refresh() and save:
+            self.save()
+
+    def load(self):
+        if not self.manifest_path.exists():
+            return
+        try:
+            with self.manifest_path.open('r') as mf:
+                manifest = json.load(mf)
+        except (OSError, ValueError):
+            return
+        if manifest.get('version') == MANIFEST_VERSION:
+            self.dirs = manifest['dirs']
+
+    def save(self):
+        # Overwriting an existing manifest in place does not change the mtime
+        # of the result directory, so saving does not trigger a rescan. A
+        # manifest cut short by an interruption fails to load and is rebuilt.
+        try:
+            with self.manifest_path.open('w') as mf:
+                json.dump({'version': MANIFEST_VERSION, 'dirs': self.dirs}, mf)
+        except OSError as e:
+            # Read-only result directories still work, just without caching
+            print(f"Could not save frame manifest: {e}")
+
+    def refresh(self):
+        """Rescan directories whose mtime changed since the last scan and
+        update the size and mtime of the newest frame files in the other
+        directories.
+
+        @return: True if anything changed
+        """
+        changed = False
+        seen = set()
+        stack = ['.']
+        while stack:
+            rel_dir = stack.pop()
+            seen.add(rel_dir)
+            abs_dir = self.result_dir / rel_dir
+            try:
+                mtime = os.stat(abs_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            entry = self.dirs.get(rel_dir)
+            if entry is None or entry['mtime'] != mtime:
+                entry = self._scan_dir(rel_dir, mtime)
+                self.dirs[rel_dir] = entry
+                changed = True
+            elif self._restat_files(rel_dir, entry):
+                changed = True
+            stack += entry['subdirs']
+
+        # Forget directories that were removed
+        for rel_dir in set(self.dirs) - seen:
+            del self.dirs[rel_dir]
+            changed = True
+        return changed
+
+    def _restat_files(self, rel_dir, entry):
+        """Update the size and mtime of the newest frame file of each kind in
+        a directory that was not rescanned. Appending to a frame file (e.g.
+        one still being written by a running simulation) does not change the
+        directory mtime, and only the last frame of a kind is still written.
+
+        @return: True if any file changed
+        """
+        newest = {}
+        for f_entry in entry['files']:
+            key = (f_entry[0], f_entry[2])
+            if key not in newest or f_entry[1] > newest[key][1]:
+                newest[key] = f_entry
+        changed = False
+        for f_entry in newest.values():
+            try:
+                st = os.stat(self.result_dir / rel_dir / f_entry[3])
+            except FileNotFoundError:
+                continue
+            if f_entry[4:] != [st.st_size, st.st_mtime_ns]:
+                f_entry[4:] = [st.st_size, st.st_mtime_ns]
+                changed = True
+        return changed
+
+    def _scan_dir(self, rel_dir, mtime):
+        subdirs = []
+        files = []
+        with os.scandir(self.result_dir / rel_dir) as it:
+            for de in it:
+                if de.is_dir():
+                    subdirs += [os.path.normpath(os.path.join(rel_dir, de.name))]
+                    continue
+                info = parse_frame_file_name(de.name)
+                if info is None:
+                    continue
+                st = de.stat()
+                files += [[*info, de.name, st.st_size, st.st_mtime_ns]]
+        return {'mtime': mtime, 'subdirs': sorted(subdirs), 'files': files}
+
+    def get_entries(self, kind, ext=None, dir_pattern=None):
+        """Get all files of one kind sorted by frame number.
+
+        @param kind File kind, e.g. 'SylinderAscii', 'ConBlock' or 'image'
+        @param ext File extension without the dot (optional)
+        @param dir_pattern Regex the relative directory must match (optional)
+        @return: List of dicts with frame, path, size, and mtime
+
+        """
+        dir_reg = None if dir_pattern is None else re.compile(dir_pattern)
+        entries = []
+        for rel_dir, dentry in self.dirs.items():
+            if dir_reg is not None and not dir_reg.fullmatch(rel_dir):
+                continue
+            for f_kind, frame, f_ext, name, size, mtime in dentry['files']:
+                if f_kind != kind or (ext is not None and f_ext != ext):
+                    continue
+                entries += [{'frame': frame,
+                             'path': self.result_dir / rel_dir / name,
+                             'size': size,
+                             'mtime': mtime}]
+        entries.sort(key=lambda x: x['frame'])
+        return entries
+
+    def get_paths(self, kind, ext=None, dir_pattern=None):
+        """Get paths of all files of one kind sorted by frame number."""
+        return [e['path'] for e in self.get_entries(kind, ext, dir_pattern)]
+
+
+def get_frame_paths(result_dir, kind, ext=None, dir_pattern=None):
+    """Sorted paths of all frame files of one kind in a result directory,
+    using (and updating) the directory's frame manifest.
+
+    Parameters
+    ----------
+    result_dir : Path
+        Result directory of a simulation
+    kind : str
+        File kind, e.g. 'SylinderAscii', 'ProteinAscii', 'ConBlock', 'image'
+    ext : str, optional
+        File extension without the dot, by default None (any)
+    dir_pattern : str, optional
+        Regex the directory relative to result_dir must match, e.g.
+        r'result.*-.*' or 'PNG', by default None (any)
+
+    Returns
+    -------
+    list of Path
+        Frame files sorted by frame number
+    """
+    return FrameManifest(result_dir).get_paths(kind, ext, dir_pattern)
+
+
+# Open archive file handles, keyed by process id, archive path, and archive
+# size/mtime. Handles inherited by forked workers share their file offset with
+# the parent, so every process opens its own.
+_ZIP_HANDLES = {}
+
+
+def close_zip_handles():
+    """Close the archive file handles opened by this process."""
+    pid = os.getpid()
+    for key in [k for k in _ZIP_HANDLES if k[0] == pid]:
+        _ZIP_HANDLES.pop(key).close()
+
+
+atexit.register(close_zip_handles)
+# Local file header: signature, versions, flags, method, time, date, crc,
+# sizes, then name and extra field lengths
+_LOCAL_HEADER = struct.Struct('<4s5HL2L2H')
+
+
+class ZipMember():
+
+    """Picklable handle to a frame file in a zip archive. Data is read from the
+    member's local header offset with one seek, so no ZipFile (and no parse
+    of the central directory) is needed, including in worker processes."""
+
+    def __init__(self, zip_path, stamp, frame, name, header_offset,
+                 compress_type, compress_size):
+        self.zip_path = str(zip_path)
+        self.stamp = tuple(stamp)
+        self.frame = frame
+        self.name = name
+        self.header_offset = header_offset
+        self.compress_type = compress_type
+        self.compress_size = compress_size
+
+    def __repr__(self):
+        return f'ZipMember({self.zip_path}:{self.name})'
+
+    def read_bytes(self):
+        if self.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            with zipfile.ZipFile(self.zip_path) as zf:
+                return zf.read(self.name)
+
+        key = (os.getpid(), self.zip_path, self.stamp)
+        zf = _ZIP_HANDLES.get(key)
+        if zf is None:
+            zf = _ZIP_HANDLES[key] = open(self.zip_path, 'rb')
+        zf.seek(self.header_offset)
+        header = _LOCAL_HEADER.unpack(zf.read(_LOCAL_HEADER.size))
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f'Bad local header for {self.name}.')
+        name_len, extra_len = header[-2:]
+        zf.seek(name_len + extra_len, io.SEEK_CUR)
+        data = zf.read(self.compress_size)
+        if self.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(data)
+        return data
+
+    def open(self, mode='r'):
+        if mode == 'rb':
+            return io.BytesIO(self.read_bytes())
+        return io.StringIO(self.read_bytes().decode())
+
+
+class ZipFrameIndex():
+
+    """Index of the frame files in a zip archive. The index (member names,
+    offsets, and sizes) is cached beside the archive and reused until the
+    archive's size or mtime changes."""
+
+    def __init__(self, zip_path, save=True):
+        """
+        @param zip_path Path to result.zip
+        @param save Write the index beside the archive if it was rebuilt
+        """
+        self.zip_path = Path(zip_path)
+        self.index_path = self.zip_path.with_name(
+            f'.{self.zip_path.name}{MANIFEST_NAME}')
+        st = self.zip_path.stat()
+        self.stamp = [st.st_size, st.st_mtime_ns]
+        # [kind, frame, ext, name, header_offset, compress_type, compress_size]
+        self.members = None
+        self.load()
+        if self.members is None:
+            self.build()
+            if save:
+                self.save()
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with self.index_path.open('r') as mf:
+                index = json.load(mf)
+        except (OSError, ValueError):
+            return
+        if (index.get('version') == MANIFEST_VERSION
+                and index.get('stamp') == self.stamp):
+            self.members = index['members']
+
+    def save(self):
+        try:
+            with self.index_path.open('w') as mf:
+                json.dump({'version': MANIFEST_VERSION, 'stamp': self.stamp,
+                           'members': self.members}, mf)
+        except OSError as e:
+            print(f"Could not save zip frame index: {e}")
+
+    def build(self):
+        self.members = []
+        with zipfile.ZipFile(self.zip_path) as zf:
+            for zinfo in zf.infolist():
+                info = parse_frame_file_name(Path(zinfo.filename).name)
+                if info is None or zinfo.is_dir():
+                    continue
+                self.members += [[*info, zinfo.filename, zinfo.header_offset,
+                                  zinfo.compress_type, zinfo.compress_size]]
+        # Keep the members in stored order so reading them is sequential
+        self.members.sort(key=lambda x: x[4])
+
+    def get_members(self, kind, ext=None):
+        """Get all members of one kind in the order they are stored.
+
+        @param kind File kind, e.g. 'SylinderAscii'
+        @param ext File extension without the dot (optional)
+        @return: List of ZipMember objects sorted by local header offset
+
+        """
+        return [ZipMember(self.zip_path, self.stamp, m[1], *m[3:])
+                for m in self.members
+                if m[0] == kind and (ext is None or m[2] == ext)]
+
+
+def get_zip_frame_members(zip_path, kind, ext=None):
+    """Sorted members of all frame files of one kind in a zip archive, using
+    (and updating) the archive's cached index.
+
+    Parameters
+    ----------
+    zip_path : Path
+        Zipped result directory, e.g. result.zip
+    kind : str
+        File kind, e.g. 'SylinderAscii' or 'ProteinAscii'
+    ext : str, optional
+        File extension without the dot, by default None (any)
+
+    Returns
+    -------
+    list of ZipMember
+        Readable members sorted by frame number. They can be opened in other
+        processes, so they can be parsed with read_func.map_frames workers.
+    """
+    # Collection writes the i-th path to time index i, so frames must be in
+    # order even if the archive stores them otherwise
+    members = ZipFrameIndex(zip_path).get_members(kind, ext)
+    members.sort(key=lambda m: m.frame)
+    return members
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
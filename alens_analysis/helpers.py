@@ -61,6 +61,29 @@ def contiguous_regions(condition):
     return idx
 
 
+def batch_contiguous_regions(condition):
+    """Contiguous True regions along the first axis of every column of a 2D
+    boolean array, found for all columns at once. Gives the same regions as
+    contiguous_regions(condition[:, i]) for every column i, including its
+    end index of size - 1 for regions that reach the end of a column.
+
+    @param condition (N, T) boolean array, e.g. a thresholded kymograph
+    @return: (R,) column, (R,) start, and (R,) end index of every region,
+             ordered by column then start, and (T,) number of regions in
+             every column
+
+    """
+    nrows, ncols = condition.shape
+    padded = np.zeros((nrows + 2, ncols), dtype=np.int8)
+    padded[1:-1] = condition
+    # +1 where a region starts, -1 one past where it ends
+    diff = np.diff(padded, axis=0).T
+    cols, starts = np.nonzero(diff == 1)
+    _, ends = np.nonzero(diff == -1)
+    ends[ends == nrows] = nrows - 1
+    return cols, starts, ends, np.bincount(cols, minlength=ncols)
+
+
 def collect_contiguous_intervals(arr, delta):
     """ Collect and return different contiguous regions of an array. """
     arr_deriv = np.gradient(arr, delta)
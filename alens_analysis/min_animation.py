@@ -19,6 +19,7 @@ from .read_func import (read_dat_sylinder,
                         get_file_number,
                         get_png_number,
                         count_fils)
+from .frame_manifest import get_frame_paths
 
 
 def animate(i, fig, ax, png_paths, opts):
@@ -56,8 +57,8 @@ def min_animation(opts):
         opts.params['time_step'] = run_params['timeSnap']
 
     result_dir = opts.result_dir
-    png_paths = sorted(result_dir.glob("PNG/image*.png"),
-                       key=get_png_number)[::opts.params['n_graph']]
+    png_paths = get_frame_paths(
+        result_dir, 'image', 'png', 'PNG')[::opts.params['n_graph']]
 
     nframes = len(png_paths)
     print(nframes)
@@ -9,6 +9,8 @@ import yaml
 import pathlib
 from collections import defaultdict
 
+from .raw_schema import get_raw_dset
+
 
 class Empirical_Motor_Density_Constructor:
 
@@ -44,8 +46,8 @@ class Empirical_Motor_Density_Constructor:
             if retrieve_num_T_steps == "all": retrieve_num_T_steps = None
             else: retrieve_num_T_steps += 2
 
-            self.P_data = h5_data['raw_data']['proteins'][:, 2:, 2:retrieve_num_T_steps]
-            self.S_data = h5_data['raw_data']['sylinders'][:, 2:-1, 2:retrieve_num_T_steps]
+            self.P_data = get_raw_dset(h5_data, 'proteins')[:, 2:, 2:retrieve_num_T_steps]
+            self.S_data = get_raw_dset(h5_data, 'sylinders')[:, 2:-1, 2:retrieve_num_T_steps]
             self.num_T_steps = len(h5_data['time'][2:retrieve_num_T_steps])     
 
     def retrieve_simulation_config_data(self):
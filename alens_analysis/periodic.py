@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: periodic.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Minimum image separations and neighbor searches in a (partially)
+periodic simulation box. A box is given by the lengths of its sides with
+zero for sides that are not periodic, the convention of scipy's cKDTree, so
+non-periodic runs and axes go through the same code as periodic ones.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def get_box_size(run_params):
+    """Periodic box lengths of a run from the simBoxLow, simBoxHigh and
+    simBoxPBC entries of its RunConfig.
+
+    @param run_params Parsed RunConfig dictionary
+    @return: (3,) array of box lengths, zero along non-periodic axes, or None
+             if no axis is periodic
+
+    """
+    pbc = np.asarray(run_params.get('simBoxPBC', [False] * 3), dtype=bool)
+    if not pbc.any():
+        return None
+    box_len = (np.asarray(run_params['simBoxHigh'], dtype=float) -
+               np.asarray(run_params['simBoxLow'], dtype=float))
+    return np.where(pbc, box_len, 0.)
+
+
+def _box_shape(box_size, ndim, axis):
+    """Box lengths shaped to broadcast along the coordinate axis of an array
+    with ndim dimensions."""
+    shape = [1] * ndim
+    shape[axis] = -1
+    return np.asarray(box_size, dtype=float).reshape(shape)
+
+
+def min_image(sep_vec, box_size=None, axis=-1):
+    """Minimum image of separation vectors.
+
+    @param sep_vec Array of separation vectors
+    @param box_size Box lengths (zero if not periodic), None for no box
+    @param axis Coordinate axis of sep_vec
+    @return: Separation vectors (a new array) shifted by whole box lengths to
+             the nearest image
+
+    """
+    if box_size is None:
+        return sep_vec
+    box = _box_shape(box_size, np.ndim(sep_vec), axis)
+    periodic = box > 0
+    safe_box = np.where(periodic, box, 1.)
+    return sep_vec - np.where(periodic, safe_box * np.round(sep_vec / safe_box),
+                              0.)
+
+
+def wrap_positions(pos_arr, box_size=None, box_low=None, axis=-1):
+    """Positions moved into [box_low, box_low + box_size) along periodic axes.
+
+    @param pos_arr Array of positions
+    @param box_size Box lengths (zero if not periodic), None for no box
+    @param box_low Lower corner of the box, by default the origin
+    @param axis Coordinate axis of pos_arr
+    @return: Wrapped positions
+
+    """
+    if box_size is None:
+        return pos_arr
+    box = _box_shape(box_size, np.ndim(pos_arr), axis)
+    low = (0. if box_low is None else
+           _box_shape(box_low, np.ndim(pos_arr), axis))
+    periodic = box > 0
+    safe_box = np.where(periodic, box, 1.)
+    return np.where(periodic, low + np.mod(pos_arr - low, safe_box), pos_arr)
+
+
+def pair_sep_vecs(pos_arr, box_size=None):
+    """Minimum image separation vectors of every pair of points.
+
+    @param pos_arr (N, D, ...) positions, e.g. (N, 3) or (N, 3, T)
+    @param box_size Box lengths (zero if not periodic), None for no box
+    @return: (N, N, D, ...) array of pos[j] - pos[i]
+
+    """
+    sep_vec = pos_arr[np.newaxis, :] - pos_arr[:, np.newaxis]
+    return min_image(sep_vec, box_size, axis=2)
+
+
+def pair_distances(pos_arr, box_size=None):
+    """Minimum image distances between every pair of points.
+
+    @param pos_arr (N, D, ...) positions, e.g. (N, 3) or (N, 3, T)
+    @param box_size Box lengths (zero if not periodic), None for no box
+    @return: (N, N, ...) array of distances
+
+    """
+    return np.linalg.norm(pair_sep_vecs(pos_arr, box_size), axis=2)
+
+
+def find_pairs_within(pos_arr, cutoff, box_size=None):
+    """Pairs of points closer than a cutoff and their separation vectors,
+    found with a KD-tree.
+
+    @param pos_arr Nx3 array of positions
+    @param cutoff Largest separation of a pair
+    @param box_size Lengths of a periodic box (minimum image separations,
+                    zero along non-periodic axes), None if not periodic
+    @return: (P,) i indices, (P,) j indices (i < j), Px3 separation vectors
+
+    """
+    if box_size is not None:
+        box_size = np.asarray(box_size, dtype=float)
+        # The tree needs positions inside [0, box_size) on periodic axes
+        pos_arr = wrap_positions(pos_arr, box_size)
+    tree = cKDTree(pos_arr, boxsize=box_size)
+    pairs = tree.query_pairs(cutoff, output_type='ndarray')
+    i_ind, j_ind = pairs[:, 0], pairs[:, 1]
+    sep_vec = min_image(pos_arr[j_ind] - pos_arr[i_ind], box_size)
+    return i_ind, j_ind, sep_vec
+
+
+def periodic_mean(pos_arr, box_size=None):
+    """Center of a cluster of points that may straddle periodic boundaries.
+    Points are unwrapped to the images nearest the first point, so the
+    cluster must be smaller than half the box.
+
+    @param pos_arr Nx3 array of positions
+    @param box_size Box lengths (zero if not periodic), None for no box
+    @return: (3,) center, wrapped into the box
+
+    """
+    rel_pos = min_image(pos_arr - pos_arr[0], box_size)
+    return wrap_positions(pos_arr[0] + rel_pos.mean(axis=0), box_size)
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
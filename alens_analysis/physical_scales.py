@@ -12,6 +12,8 @@ from scipy.special import erf
 import yaml
 import h5py
 
+from .raw_schema import get_raw_dset
+
 
 def get_drag_coeff(bead_rad, viscosity):
     ''' Drag coefficient of a sphere of radius bead_rad in a viscous fluid using Stokes-Einstein relations. Dimensions of Length/(Time*Force) = Length^2/(Time*Energy)'''
@@ -76,7 +78,7 @@ def get_fundamental_consts(h5_path):
         visc = float(rc_dict['viscosity'])
         kbT = float(rc_dict['KBT'])
         diam = float(rc_dict['sylinderDiameter'])
-        nbeads = h5_data['raw_data']['sylinders'].shape[0]
+        nbeads = get_raw_dset(h5_data, 'sylinders').shape[0]
         const_dict = {'drag_coeff': get_drag_coeff(diam * .5, visc),
                       'bead_diff_time': get_char_time(diam, visc, kbT),
                       'rouse_time': get_rouse_time(nbeads, diam, visc, kbT),
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: raw_benchmark.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Rewrite raw data files with different storage layouts and
+measure how fast the two common access patterns (whole frames and single
+bead time series) can be read back.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from .read_func import get_raw_dset_kwargs
+
+
+def rechunk_raw_data(src_path, dst_path, layout='frame', compression=None,
+                     frames_per_copy=256):
+    """Copy a raw data file into a new file with a different storage layout.
+
+    Parameters
+    ----------
+    src_path : Path
+        Existing raw data HDF5 file
+    dst_path : Path
+        File to write
+    layout : str, optional
+        Chunk layout passed to get_raw_dset_kwargs, by default 'frame'
+    compression : str, optional
+        Compression passed to get_raw_dset_kwargs, by default None
+    frames_per_copy : int, optional
+        Number of frames copied at once to bound memory, by default 256
+    """
+    with h5py.File(src_path, 'r') as h5_src, h5py.File(dst_path, 'w') as h5_dst:
+        for key, val in h5_src.attrs.items():
+            h5_dst.attrs[key] = val
+        h5_src.copy('time', h5_dst)
+        posit_grp = h5_dst.create_group('raw_data')
+        for name, src_dset in h5_src['raw_data'].items():
+            nframes = src_dset.shape[-1]
+            dst_dset = posit_grp.create_dataset(
+                name, shape=src_dset.shape, dtype=src_dset.dtype,
+                maxshape=src_dset.shape[:-1] + (None,),
+                **get_raw_dset_kwargs(src_dset.shape[:-1], layout, compression,
+                                      itemsize=src_dset.dtype.itemsize))
+            for key, val in src_dset.attrs.items():
+                dst_dset.attrs[key] = val
+            for start in range(0, nframes, frames_per_copy):
+                end = min(start + frames_per_copy, nframes)
+                dst_dset[..., start:end] = src_dset[..., start:end]
+
+
+def benchmark_raw_read(h5_path, dset_name='raw_data/sylinders', n_reads=20,
+                       seed=0, verbose=True):
+    """Measure read throughput of a raw data set for per-frame and per-bead
+    access.
+
+    Parameters
+    ----------
+    h5_path : Path
+        Raw data HDF5 file
+    dset_name : str, optional
+        Data set to read, by default 'raw_data/sylinders'
+    n_reads : int, optional
+        Number of random frames and beads to read, by default 20
+    seed : int, optional
+        Seed of the random indices, by default 0
+    verbose : bool, optional
+        Print a report, by default True
+
+    Returns
+    -------
+    dict
+        Throughput in MB/s of 'frame' and 'bead' reads plus file size in MB
+    """
+    rng = np.random.default_rng(seed)
+    with h5py.File(h5_path, 'r') as h5_data:
+        dset = h5_data[dset_name]
+        n_rows, _, nframes = dset.shape
+        frame_inds = rng.integers(0, nframes, n_reads)
+        bead_inds = rng.integers(0, n_rows, n_reads)
+
+        nbytes = 0
+        t0 = time.perf_counter()
+        for i in frame_inds:
+            nbytes += dset[:, :, i].nbytes
+        frame_rate = nbytes / (time.perf_counter() - t0) / 1e6
+
+        nbytes = 0
+        t0 = time.perf_counter()
+        for i in bead_inds:
+            nbytes += dset[i, :, :].nbytes
+        bead_rate = nbytes / (time.perf_counter() - t0) / 1e6
+
+        stats = {'frame': frame_rate,
+                 'bead': bead_rate,
+                 'file_size': Path(h5_path).stat().st_size / 1e6,
+                 'chunks': dset.chunks,
+                 'compression': dset.compression}
+    if verbose:
+        print(f"{Path(h5_path).name}: chunks={stats['chunks']}, "
+              f"compression={stats['compression']}, "
+              f"size={stats['file_size']:.1f} MB\n"
+              f"  frame reads: {frame_rate:.1f} MB/s\n"
+              f"  bead reads:  {bead_rate:.1f} MB/s")
+    return stats
+
+
+def compare_raw_layouts(src_path, work_dir=None,
+                        layouts=('frame', 'bead'),
+                        compressions=(None, 'lzf', 'gzip')):
+    """Rewrite a raw data file with every combination of layouts and
+    compressions and benchmark each copy.
+
+    Parameters
+    ----------
+    src_path : Path
+        Existing raw data HDF5 file
+    work_dir : Path, optional
+        Directory to write copies to, by default the directory of src_path
+    layouts : tuple of str, optional
+        Layouts to compare, by default ('frame', 'bead')
+    compressions : tuple, optional
+        Compressions to compare, by default (None, 'lzf', 'gzip')
+
+    Returns
+    -------
+    dict
+        Benchmark stats keyed by (layout, compression)
+    """
+    src_path = Path(src_path)
+    work_dir = src_path.parent if work_dir is None else Path(work_dir)
+    results = {('original', None): benchmark_raw_read(src_path)}
+    for layout in layouts:
+        for comp in compressions:
+            dst_path = work_dir / f'{src_path.stem}_{layout}_{comp}.h5'
+            try:
+                rechunk_raw_data(src_path, dst_path, layout, comp)
+            except ImportError as e:
+                print(e)
+                continue
+            results[(layout, comp)] = benchmark_raw_read(dst_path)
+            dst_path.unlink()
+    return results
+
+
+##########################################
+if __name__ == "__main__":
+    compare_raw_layouts(Path(sys.argv[1]))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: raw_schema.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Storage schemas of the raw sylinder and protein data, an
+accessor that reads the packed and split schemas as the original packed
+(N, ncols, T) array, and a reader of ragged (variable row count) frames.
+"""
+
+import numpy as np
+
+SYLINDER_COLUMNS = ['gid', 'radius',
+                    'minus pos x', 'minus pos y', 'minus pos z',
+                    'plus pos x', 'plus pos y', 'plus pos z',
+                    'group', ]
+PROTEIN_COLUMNS = ['gid', 'tag',
+                   'end1 pos x', 'end1 pos y', 'end1 pos z',
+                   'end2 pos x', 'end2 pos y', 'end2 pos z',
+                   'end1 bindID', 'end2 bindID']
+
+# 'packed': one (N, ncols, T) float data set per kind
+# 'split': floating point columns and integer (id) columns in separate data
+#          sets, (name, packed column indices, dtype). A dtype of None uses
+#          the precision chosen when collecting.
+SPLIT_SCHEMA = {
+    'sylinders': [('sylinder_pos', [1, 2, 3, 4, 5, 6, 7], None),
+                  ('sylinder_ids', [0, 8], 'i4')],
+    'proteins': [('protein_pos', [2, 3, 4, 5, 6, 7], None),
+                 ('protein_ids', [0, 1, 8, 9], 'i4')],
+}
+PACKED_COLUMNS = {'sylinders': SYLINDER_COLUMNS,
+                  'proteins': PROTEIN_COLUMNS}
+# 'ragged': rows of all frames concatenated in one (total rows, ncols) data
+#           set with the packed columns, plus CSR style indices: per frame
+#           row offsets and, per gid, the rows holding that gid.
+
+
+def _expand_key(key, ndim=3):
+    """Turn an index into a tuple of ndim indices without Ellipsis."""
+    if not isinstance(key, tuple):
+        key = (key,)
+    if any(k is Ellipsis for k in key):
+        i = next(i for i, k in enumerate(key) if k is Ellipsis)
+        fill = (slice(None),) * (ndim - len(key) + 1)
+        key = key[:i] + fill + key[i + 1:]
+    return key + (slice(None),) * (ndim - len(key))
+
+
+class PackedRawView():
+
+    """Read (and write) the split data sets of a raw data kind as if they
+    were a single packed (N, ncols, T) data set. Columns are assembled in
+    the packed order and returned as float64, so integer ids stay exact."""
+
+    def __init__(self, posit_grp, kind):
+        """
+        @param posit_grp HDF5 raw_data group
+        @param kind 'sylinders' or 'proteins'
+        """
+        self.kind = kind
+        self.parts = [(posit_grp[name], np.asarray(cols))
+                      for name, cols, _ in SPLIT_SCHEMA[kind]]
+        self.ncols = len(PACKED_COLUMNS[kind])
+        self.dtype = np.dtype('f8')
+
+    @property
+    def shape(self):
+        first = self.parts[0][0]
+        return (first.shape[0], self.ncols, first.shape[-1])
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def attrs(self):
+        # Progress marks and labels are kept on the first part
+        return self.parts[0][0].attrs
+
+    @property
+    def file(self):
+        return self.parts[0][0].file
+
+    @property
+    def maxshape(self):
+        return self.parts[0][0].maxshape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def resize(self, size, axis):
+        for dset, _ in self.parts:
+            dset.resize(size, axis=axis)
+
+    def _split_key(self, key):
+        bead_key, col_key, frame_key = _expand_key(key)
+        cols = np.arange(self.ncols)[col_key]
+        # Read integer indices as length one slices and drop the axes after
+        drop = [ax for ax, k in enumerate((bead_key, col_key, frame_key))
+                if isinstance(k, (int, np.integer))]
+        bead_key, frame_key = [slice(k, k + 1 if k != -1 else None)
+                               if isinstance(k, (int, np.integer)) else k
+                               for k in (bead_key, frame_key)]
+        return bead_key, np.atleast_1d(cols), frame_key, drop
+
+    def __getitem__(self, key):
+        bead_key, cols, frame_key, drop = self._split_key(key)
+        out = None
+        for dset, part_cols in self.parts:
+            # Only read the parts holding requested columns
+            sel = np.nonzero(np.isin(cols, part_cols))[0]
+            if sel.size == 0:
+                continue
+            part_ind = np.searchsorted(part_cols, cols[sel])
+            arr = dset[bead_key, :, frame_key][:, part_ind]
+            if out is None:
+                out = np.empty((arr.shape[0], cols.size, arr.shape[2]),
+                               dtype=self.dtype)
+            out[:, sel] = arr
+        return out.squeeze(axis=tuple(drop)) if drop else out
+
+    def __setitem__(self, key, value):
+        bead_key, cols, frame_key, drop = self._split_key(key)
+        value = np.asarray(value)
+        for ax in drop:
+            value = np.expand_dims(value, ax)
+        for dset, part_cols in self.parts:
+            sel = np.nonzero(np.isin(cols, part_cols))[0]
+            if sel.size != part_cols.size:
+                raise IndexError(
+                    f"Writes to {self.kind} must set all columns of {dset.name}.")
+            dset[bead_key, :, frame_key] = value[:, sel[np.argsort(cols[sel])]]
+
+
+def get_ragged_names(kind):
+    """Names of the rows, frame offsets, gid rows, and gid offsets data sets
+    of a ragged raw data kind."""
+    return (f'{kind}_rows', f'{kind}_offsets',
+            f'{kind}_gid_rows', f'{kind}_gid_offsets')
+
+
+def get_kind_schema(posit_grp, kind):
+    """Schema of the data already stored for one kind, or None."""
+    if kind in posit_grp:
+        return 'packed'
+    if SPLIT_SCHEMA[kind][0][0] in posit_grp:
+        return 'split'
+    if get_ragged_names(kind)[1] in posit_grp:
+        return 'ragged'
+    return None
+
+
+def build_gid_index(posit_grp, kind, block_rows=2**22):
+    """Write the gid index of a ragged raw data kind: the row numbers of the
+    rows data set sorted by gid (and by frame within a gid) and the offsets
+    of each gid into them.
+
+    Parameters
+    ----------
+    posit_grp : h5py.Group
+        raw_data group opened for writing
+    kind : str
+        'sylinders' or 'proteins'
+    block_rows : int, optional
+        Number of gid values read at once, by default 2**22
+    """
+    rows_name, _, gid_rows_name, gid_offsets_name = get_ragged_names(kind)
+    rows_dset = posit_grp[rows_name]
+    n_rows = rows_dset.shape[0]
+    gids = np.empty(n_rows, dtype=np.int64)
+    for start in range(0, n_rows, block_rows):
+        gids[start:start + block_rows] = rows_dset[start:start + block_rows, 0]
+    # Stable sort keeps the rows of a gid in frame order
+    gid_rows = np.argsort(gids, kind='stable')
+    counts = np.bincount(gids) if n_rows else np.zeros(0, dtype=np.int64)
+    gid_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    for name, arr in [(gid_rows_name, gid_rows),
+                      (gid_offsets_name, gid_offsets)]:
+        if name in posit_grp:
+            del posit_grp[name]
+        posit_grp.create_dataset(name, data=arr)
+    posit_grp[gid_rows_name].attrs['nrows'] = n_rows
+
+
+class RaggedRawData():
+
+    """Reader of ragged raw data. Frames and gid time series are read
+    through the stored offsets, so only the requested rows are touched."""
+
+    def __init__(self, posit_grp, kind):
+        """
+        @param posit_grp HDF5 raw_data group
+        @param kind 'sylinders' or 'proteins'
+        """
+        self.posit_grp = posit_grp
+        self.kind = kind
+        (rows_name, offsets_name,
+         self.gid_rows_name, self.gid_offsets_name) = get_ragged_names(kind)
+        self.rows = posit_grp[rows_name]
+        offsets_dset = posit_grp[offsets_name]
+        nframes = int(offsets_dset.attrs.get('nframes_complete',
+                                             offsets_dset.shape[0] - 1))
+        self.offsets = offsets_dset[:nframes + 1]
+        self.attrs = self.rows.attrs
+        self._gid_offsets = None
+
+    @property
+    def nframes(self):
+        return self.offsets.size - 1
+
+    def __len__(self):
+        return self.nframes
+
+    def frame_sizes(self):
+        """Number of rows in every frame."""
+        return np.diff(self.offsets)
+
+    def get_frame(self, frame):
+        """(n_rows, ncols) array of a single frame."""
+        frame = range(self.nframes)[frame]
+        return self.rows[self.offsets[frame]:self.offsets[frame + 1]]
+
+    def get_frames(self, start, stop):
+        """Rows of frames start to stop (exclusive) and their offsets, which
+        start at 0."""
+        start, stop, _ = slice(start, stop).indices(self.nframes)
+        rows = self.rows[self.offsets[start]:self.offsets[stop]]
+        return rows, self.offsets[start:stop + 1] - self.offsets[start]
+
+    def row_frames(self, rows):
+        """Frame index of each row number."""
+        return np.searchsorted(self.offsets, rows, side='right') - 1
+
+    def _load_gid_index(self):
+        if self._gid_offsets is not None:
+            return
+        gid_rows = self.posit_grp.get(self.gid_rows_name)
+        if (gid_rows is None
+                or gid_rows.attrs.get('nrows') != self.offsets[-1]):
+            raise KeyError(
+                f"The gid index of {self.kind} is missing or out of date. "
+                "Rebuild it with build_gid_index.")
+        self._gid_rows = gid_rows
+        self._gid_offsets = self.posit_grp[self.gid_offsets_name][...]
+
+    def get_gid(self, gid):
+        """Time series of one gid.
+
+        Parameters
+        ----------
+        gid : int
+            Object gid
+
+        Returns
+        -------
+        frames : (n,) ndarray of int
+            Frames the gid exists in
+        rows : (n, ncols) ndarray
+            Row of the gid in each of these frames
+        """
+        self._load_gid_index()
+        if gid < 0 or gid + 1 >= self._gid_offsets.size:
+            return np.zeros(0, dtype=np.int64), self.rows[0:0]
+        row_ind = self._gid_rows[self._gid_offsets[gid]:
+                                 self._gid_offsets[gid + 1]]
+        if row_ind.size == 0:
+            return np.zeros(0, dtype=np.int64), self.rows[0:0]
+        # Rows are in frame order, so the read is monotonic
+        return self.row_frames(row_ind), self.rows[row_ind, :]
+
+
+def get_raw_schema(h5_data):
+    """Schema ('packed' or 'split') of a raw data file."""
+    return h5_data['raw_data'].attrs.get('schema', 'packed')
+
+
+def get_raw_dset(h5_data, kind):
+    """Raw data of one kind indexable as a packed (N, ncols, T) array,
+    whatever schema the file was collected with.
+
+    Parameters
+    ----------
+    h5_data : h5py.File
+        Raw data file
+    kind : str
+        'sylinders' or 'proteins'
+
+    Returns
+    -------
+    h5py.Dataset or PackedRawView
+        The packed data set itself, or a view assembling it from split data
+        sets
+    """
+    posit_grp = h5_data['raw_data']
+    schema = get_kind_schema(posit_grp, kind)
+    if schema == 'packed':
+        return posit_grp[kind]
+    if schema == 'split':
+        return PackedRawView(posit_grp, kind)
+    if schema == 'ragged':
+        raise TypeError(f"The {kind} data in {h5_data.file.filename} is "
+                        "ragged. Read it with get_ragged_raw.")
+    raise KeyError(f"No {kind} data in {h5_data.file.filename}.")
+
+
+def get_ragged_raw(h5_data, kind):
+    """Ragged raw data of one kind.
+
+    @param h5_data: Raw data file collected with schema='ragged'
+    @param kind: 'sylinders' or 'proteins'
+    @return: RaggedRawData reader
+
+    """
+    return RaggedRawData(h5_data['raw_data'], kind)
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
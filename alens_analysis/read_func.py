@@ -7,17 +7,27 @@ Email: alamson@flatironinstitute.org
 Description:
 """
 import h5py
-import re
 import yaml
 import vtk
 from vtk.util import numpy_support as vn
 import time
+import multiprocessing
 import numpy as np
 from pathlib import Path
-from tqdm import tqdm
 from .objects import filament, protein, con_block
 from .runlog_funcs import get_walltime
-import zipfile
+from .frame_manifest import get_frame_paths, get_zip_frame_members
+from .raw_schema import (SPLIT_SCHEMA, PACKED_COLUMNS, RaggedRawData,
+                         get_raw_dset, get_kind_schema, get_ragged_names,
+                         build_gid_index)
+from .array_store import STORE_BACKENDS, export_raw_store
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+try:
+    # Registers the blosc/zstd HDF5 filters for writing and reading raw data
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
 
 def get_file_number(path):
@@ -75,186 +85,1066 @@ def read_dat_xlp(fpath):
     return proteins
 
 
-def read_dat_constraint(fpath):
+def read_dat_frame(fpath, ncols):
+    """Parse a whole SylinderAscii/ProteinAscii file in one pass, including
+    the time in its header.
 
-    con_blocks = []
-    # open the file and read the lines
-    # with fpath.open('r') as file1:
+    Parameters
+    ----------
+    fpath : Path, zipfile.Path or ZipMember
+        Ascii data file to read
+    ncols : int
+        Number of numeric columns after the type column (9 for sylinders,
+        10 for proteins)
+
+    Returns
+    -------
+    t : float
+        Time of the frame
+    type_arr : (N,) ndarray of str
+        Type of each object (e.g. 'C' or 'L'), sorted by gid
+    data_arr : (N, ncols) ndarray of float64
+        Numeric columns of each object, sorted by gid
+    """
+    with fpath.open('r') as file1:
+        # First two lines are the number of objects and the time
+        file1.readline()
+        t = float(file1.readline())
+        tokens = np.asarray(file1.read().split()).reshape(-1, ncols + 1)
+
+    type_arr = tokens[:, 0]
+    data_arr = tokens[:, 1:].astype(np.float64)
+    # Stable sort to match the ordering of sorted(..., key=gid)
+    order = np.argsort(data_arr[:, 0], kind='stable')
+    return t, type_arr[order], data_arr[order]
+
+
+def read_dat_arr(fpath, ncols):
+    """Parse a whole SylinderAscii/ProteinAscii file in one pass.
+
+    Parameters
+    ----------
+    fpath : Path, zipfile.Path or ZipMember
+        Ascii data file to read
+    ncols : int
+        Number of numeric columns after the type column (9 for sylinders,
+        10 for proteins)
+
+    Returns
+    -------
+    type_arr : (N,) ndarray of str
+        Type of each object (e.g. 'C' or 'L'), sorted by gid
+    data_arr : (N, ncols) ndarray of float64
+        Numeric columns of each object, sorted by gid
+    """
+    _, type_arr, data_arr = read_dat_frame(fpath, ncols)
+    return type_arr, data_arr
+
+
+def read_sylinder_time_arr(fpath, exclude_types=('L',)):
+    """Read the time and the (N, 9) sylinder array of a SylinderAscii_X.dat
+    file with a single read of the file.
+
+    Parameters
+    ----------
+    fpath : Path, zipfile.Path or ZipMember
+        SylinderAscii file to read
+    exclude_types : tuple of str, optional
+        Sylinder types to drop from the array, by default ('L',)
+
+    Returns
+    -------
+    t : float
+        Time of the frame
+    (N, 9) ndarray
+        gid, radius, minus end, plus end, and group of every sylinder
+    """
+    t, type_arr, data_arr = read_dat_frame(fpath, 9)
+    if exclude_types:
+        data_arr = data_arr[~np.isin(type_arr, exclude_types)]
+    return t, data_arr
+
+
+def read_sylinder_arr(fpath, exclude_types=('L',)):
+    """Read a SylinderAscii_X.dat file into an (N, 9) array sorted by gid.
+
+    Parameters
+    ----------
+    fpath : Path, zipfile.Path or ZipMember
+        SylinderAscii file to read
+    exclude_types : tuple of str, optional
+        Sylinder types to drop from the array, by default ('L',)
+
+    Returns
+    -------
+    (N, 9) ndarray
+        gid, radius, minus end, plus end, and group of every sylinder
+    """
+    return read_sylinder_time_arr(fpath, exclude_types)[1]
+
+
+def read_xlp_arr(fpath):
+    """Read a ProteinAscii_X.dat file into an (N, 10) array sorted by gid.
+
+    Parameters
+    ----------
+    fpath : Path, zipfile.Path or ZipMember
+        ProteinAscii file to read
+
+    Returns
+    -------
+    (N, 10) ndarray
+        gid, tag, end positions, and bind IDs of every protein
+    """
+    _, data_arr = read_dat_arr(fpath, 10)
+    return data_arr
+
+
+def read_vtk_arrays(fpath):
+    """Read the points and every cell and point data array of a VTK polydata
+    file as NumPy arrays.
+
+    Parameters
+    ----------
+    fpath : str or Path
+        .pvtp file (e.g. ConBlock_10.pvtp or Sylinder_10.pvtp)
+
+    Returns
+    -------
+    dict
+        'points' -> (2N, 3) array of point coordinates, 'cell_data' and
+        'point_data' -> dicts of data array name -> array. Arrays with one
+        component are 1D, others are (n, ncomponents).
+    """
     reader = vtk.vtkXMLPPolyDataReader()
     reader.SetFileName(str(fpath))
     reader.Update()
     data = reader.GetOutput()
-    # filecontent = file1.readlines()
-
-    nObj = int(data.GetPoints().GetNumberOfPoints() / 2)
-    # print("parsing data for ", nObj, " object(s)")
-    for i in range(nObj):
-        cb = con_block()
-        cb.end0 = data.GetPoints().GetPoint(2 * i)
-        cb.end1 = data.GetPoints().GetPoint(2 * i + 1)
-        con_blocks += [cb]
-
-    # step 2, member cell data
-    numCellData = data.GetCellData().GetNumberOfArrays()
-    # print("Number of CellDataArrays: ", numCellData)
-    for i in range(numCellData):
-        cdata = data.GetCellData().GetArray(i)
-        dataName = cdata.GetName()
-        # print("Parsing Cell Data", dataName)
-        for j in range(len(con_blocks)):
-            setattr(con_blocks[j], dataName, cdata.GetTuple(j))
-
-    # step 3, member point data
-    numPointData = data.GetPointData().GetNumberOfArrays()
-    # print("Number of PointDataArrays: ", numPointData)
-    for i in range(numPointData):
-        pdata = data.GetPointData().GetArray(i)
-        dataName = pdata.GetName()
-        # print("Parsing Point Data", dataName)
-        for j in range(len(con_blocks)):
-            setattr(con_blocks[j], dataName + "0", pdata.GetTuple(2 * j))
-            setattr(con_blocks[j], dataName + "1", pdata.GetTuple(2 * j + 1))
 
+    vtk_arrays = {'points': vn.vtk_to_numpy(data.GetPoints().GetData())
+                  if data.GetPoints() is not None else np.zeros((0, 3)),
+                  'cell_data': {},
+                  'point_data': {}}
+    for key, vtk_data in [('cell_data', data.GetCellData()),
+                          ('point_data', data.GetPointData())]:
+        for i in range(vtk_data.GetNumberOfArrays()):
+            arr = vtk_data.GetArray(i)
+            vtk_arrays[key][arr.GetName()] = vn.vtk_to_numpy(arr)
+    return vtk_arrays
+
+
+def read_con_block_arrays(fpath):
+    """Read all constraint blocks of a ConBlock file as a structure of arrays.
+
+    Parameters
+    ----------
+    fpath : str or Path
+        ConBlock_*.pvtp file
+
+    Returns
+    -------
+    dict
+        'end0' and 'end1' -> (N, 3) arrays of the constraint end points, every
+        cell data array by name (N or (N, ncomponents)), and every point data
+        array split per end as name + '0' and name + '1'.
+    """
+    vtk_arrays = read_vtk_arrays(fpath)
+    points = vtk_arrays['points']
+    con_arrays = {'end0': points[0::2], 'end1': points[1::2]}
+    con_arrays.update(vtk_arrays['cell_data'])
+    for name, arr in vtk_arrays['point_data'].items():
+        con_arrays[name + '0'] = arr[0::2]
+        con_arrays[name + '1'] = arr[1::2]
+    return con_arrays
+
+
+def read_dat_constraint(fpath):
+    """!Read constraint blocks as con_block objects. Prefer
+    read_con_block_arrays, which does not create an object per constraint.
+
+    @param fpath: ConBlock_*.pvtp file
+    @return: List of con_block objects
+
+    """
+    con_arrays = read_con_block_arrays(fpath)
+    con_blocks = [con_block() for _ in range(con_arrays['end0'].shape[0])]
+    for name, arr in con_arrays.items():
+        # Attributes keep the tuple of floats form GetTuple gave them
+        rows = arr.reshape(arr.shape[0], -1).astype(float).tolist()
+        for cb, row in zip(con_blocks, rows):
+            setattr(cb, name, tuple(row))
     return con_blocks
 
 
 def read_stress_from_con(fpath):
-    reader = vtk.vtkXMLPPolyDataReader()
-    reader.SetFileName(str(fpath))
-    reader.Update()
-    data = reader.GetOutput()
+    con_arrays = read_con_block_arrays(fpath)
 
-    stress_arr = vn.vtk_to_numpy(data.GetCellData().GetVectors('Stress'))
-    bilat_flag_arr = vn.vtk_to_numpy(
-        data.GetCellData().GetVectors('bilateral'))
+    stress_arr = con_arrays['Stress']
+    bilat_flag_arr = con_arrays['bilateral']
     collision_stress = stress_arr[bilat_flag_arr ==
                                   0, :].sum(axis=0).reshape((3, 3))
     bilat_stress = stress_arr[bilat_flag_arr ==
                               1, :].sum(axis=0).reshape((3, 3))
     return bilat_stress, collision_stress
 
-    # return stress_arr.sum(axis=0).reshape((3, 3))
+
+def get_con_grid_bins(con_arrays, box_low, box_high, grid_shape):
+    """Flat grid bin index of every constraint, binned by the midpoint of its
+    two ends. Midpoints outside the box are wrapped back into it.
+
+    Parameters
+    ----------
+    con_arrays : dict
+        Constraint arrays from read_con_block_arrays
+    box_low, box_high : array_like of 3 floats
+        Corners of the binned box (e.g. simBoxLow and simBoxHigh)
+    grid_shape : tuple of 3 ints
+        Number of bins along x, y, and z
+
+    Returns
+    -------
+    (N,) ndarray of int
+        Index into the flattened grid for every constraint
+    """
+    box_low = np.asarray(box_low, dtype=np.float64)
+    box_size = np.asarray(box_high, dtype=np.float64) - box_low
+    grid_shape = np.asarray(grid_shape)
+    mid = .5 * (con_arrays['end0'] + con_arrays['end1'])
+    frac = np.mod(mid - box_low, box_size) / box_size
+    ijk = np.minimum((frac * grid_shape).astype(np.int64), grid_shape - 1)
+    return np.ravel_multi_index(ijk.T, tuple(grid_shape))
+
+
+def bin_con_stress(bins, stress, nbins, weights=None):
+    """Sum constraint stress tensors into bins without looping over
+    constraints.
+
+    Parameters
+    ----------
+    bins : (N,) ndarray of int
+        Bin of each constraint. Constraints with bins outside [0, nbins) are
+        dropped.
+    stress : (N, 9) ndarray
+        Flattened stress tensor of each constraint
+    nbins : int
+        Number of bins
+    weights : (N,) ndarray, optional
+        Fraction of each stress to add, by default None (all of it)
+
+    Returns
+    -------
+    (nbins, 3, 3) ndarray
+        Summed stress tensor of every bin
+    """
+    keep = (bins >= 0) & (bins < nbins)
+    bins = bins[keep]
+    stress = stress[keep]
+    if weights is not None:
+        stress = stress * weights[keep, None]
+    stress_field = np.zeros((nbins, 9))
+    for k in range(9):
+        stress_field[:, k] = np.bincount(bins, weights=stress[:, k],
+                                         minlength=nbins)
+    return stress_field.reshape(nbins, 3, 3)
+
+
+def read_stress_field_from_con(fpath, grid_shape=None, box_low=None,
+                               box_high=None, nbeads=None):
+    """Bin the bilateral and collision stress of a ConBlock file on a spatial
+    grid or per bead (sylinder gid).
+
+    Parameters
+    ----------
+    fpath : str or Path
+        ConBlock_*.pvtp file
+    grid_shape : tuple of 3 ints, optional
+        Number of grid bins along x, y, and z. Binning is per bead if None.
+    box_low, box_high : array_like of 3 floats, optional
+        Corners of the binned box, needed with grid_shape
+    nbeads : int, optional
+        Number of beads, needed if grid_shape is None. The stress of a
+        constraint is split evenly between the beads at its two ends (one
+        sided constraints give all of it to the first bead).
+
+    Returns
+    -------
+    bilat_field, collision_field : ndarray
+        Stress tensors of shape grid_shape + (3, 3) or (nbeads, 3, 3)
+    """
+    con_arrays = read_con_block_arrays(fpath)
+    stress_arr = con_arrays['Stress']
+    bilat_mask = con_arrays['bilateral'] == 1
+
+    if grid_shape is not None:
+        nbins = int(np.prod(grid_shape))
+        bins = get_con_grid_bins(con_arrays, box_low, box_high, grid_shape)
+        fields = [bin_con_stress(bins[mask], stress_arr[mask], nbins)
+                  for mask in [bilat_mask, ~bilat_mask]]
+        return tuple(f.reshape(tuple(grid_shape) + (3, 3)) for f in fields)
+
+    gid0 = con_arrays['gid0'].astype(np.int64)
+    gid1 = con_arrays['gid1'].astype(np.int64)
+    one_side = (con_arrays['oneSide'] == 1 if 'oneSide' in con_arrays
+                else np.zeros(gid0.shape, dtype=bool))
+    weight0 = np.where(one_side, 1., .5)
+    # Second ends of one sided constraints get no stress
+    bins = np.concatenate([gid0, np.where(one_side, -1, gid1)])
+    weights = np.concatenate([weight0, 1. - weight0])
+    fields = []
+    for mask in [bilat_mask, ~bilat_mask]:
+        mask2 = np.concatenate([mask, mask])
+        fields += [bin_con_stress(bins[mask2],
+                                  np.concatenate([stress_arr, stress_arr])[mask2],
+                                  nbeads, weights[mask2])]
+    return tuple(fields)
+
+
+def read_dat_time(fpath):
+    """Read the time of a frame from the second line of an ascii data file.
+    Only the two header lines are read."""
+    with fpath.open(mode='r') as f:
+        f.readline()
+        return float(f.readline())
+
+
+def get_mp_context():
+    """Multiprocessing context of worker pools. Forking a process that has
+    run multithreaded numba (TBB or OpenMP) or h5py code can leave the child
+    waiting on a lock held by a thread that was not copied, so workers are
+    started from a forkserver, or spawned where there is none. The
+    forkserver preloads this module so workers do not import the package
+    again.
+
+    @return: multiprocessing context
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    ctx = multiprocessing.get_context('forkserver')
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+
+def map_frames(func, paths, workers=1, chunksize=8):
+    """Apply a parsing function to every frame file and yield the results in
+    frame order.
+
+    Parameters
+    ----------
+    func : callable
+        Module level function taking a single path (must be picklable)
+    paths : list
+        Frame file paths in frame order
+    workers : int, optional
+        Number of worker processes, by default 1 (parse serially)
+    chunksize : int, optional
+        Number of frames sent to a worker at once, by default 8
+
+    Yields
+    ------
+    object
+        Return value of func for each path, in the order of paths
+    """
+    if workers is None or workers <= 1:
+        yield from map(func, paths)
+        return
+
+    # Only hand out a bounded block of frames at a time so parsed frames do
+    # not pile up in memory when the writer is slower than the workers.
+    block_size = workers * chunksize * 4
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=get_mp_context()) as executor:
+        for start in range(0, len(paths), block_size):
+            yield from executor.map(func, paths[start:start + block_size],
+                                    chunksize=chunksize)
+
+
+def get_raw_dset_kwargs(row_shape, layout='auto', compression=None,
+                        chunk_bytes=2**20, itemsize=4, bead_chunk_frames=1024):
+    """Storage options (chunks and filters) for a raw data set with shape
+    row_shape + (nframes,).
+
+    Parameters
+    ----------
+    row_shape : tuple of int
+        Shape of a single frame, e.g. (n_syl, 9)
+    layout : str, optional
+        'auto' lets h5py pick chunks, 'frame' makes each chunk hold whole
+        frames (fast reads of single frames), 'bead' makes each chunk hold
+        long time series of a few objects (fast reads of single beads),
+        by default 'auto'
+    compression : str, optional
+        None, 'gzip', 'lzf', or 'blosc'/'zstd' (requires hdf5plugin),
+        by default None
+    chunk_bytes : int, optional
+        Target size of a chunk, by default 1 MiB
+    itemsize : int, optional
+        Bytes per element of the data set, by default 4
+    bead_chunk_frames : int, optional
+        Number of frames in a chunk for the 'bead' layout, by default 1024
+
+    Returns
+    -------
+    dict
+        Keyword arguments for h5py create_dataset
+    """
+    n_rows, n_cols = row_shape
+    row_bytes = n_cols * itemsize
+    if layout == 'auto' or n_rows == 0:
+        kwargs = {'chunks': True}
+    elif layout == 'frame':
+        frame_bytes = n_rows * row_bytes
+        if frame_bytes > chunk_bytes:
+            kwargs = {'chunks': (max(1, chunk_bytes // row_bytes), n_cols, 1)}
+        else:
+            kwargs = {'chunks': (n_rows, n_cols,
+                                 max(1, chunk_bytes // frame_bytes))}
+    elif layout == 'bead':
+        n_bead_rows = max(1, chunk_bytes // (row_bytes * bead_chunk_frames))
+        kwargs = {'chunks': (min(n_rows, n_bead_rows), n_cols,
+                             bead_chunk_frames)}
+    else:
+        raise ValueError(f'Storage layout "{layout}" is not supported.')
+
+    if compression in ('gzip', 'lzf'):
+        kwargs['compression'] = compression
+        kwargs['shuffle'] = True
+    elif compression in ('blosc', 'zstd'):
+        if hdf5plugin is None:
+            raise ImportError(
+                f'Compression "{compression}" requires the hdf5plugin package.')
+        if compression == 'blosc':
+            kwargs.update(hdf5plugin.Blosc(cname='zstd', clevel=5,
+                                           shuffle=hdf5plugin.Blosc.SHUFFLE))
+        else:
+            kwargs.update(hdf5plugin.Zstd(clevel=5))
+    elif compression is not None:
+        raise ValueError(f'Compression "{compression}" is not supported.')
+    return kwargs
+
+
+def get_nframes_complete(dset):
+    """Number of frames (last axis) of a raw data set that hold parsed data.
+    Files written before this was tracked are assumed to be complete."""
+    return int(dset.attrs.get('nframes_complete', dset.shape[-1]))
+
+
+def mark_frames_complete(dset, nframes):
+    """Record how many frames of a data set are written and flush them to disk
+    so an interrupted conversion can resume from this point."""
+    dset.attrs['nframes_complete'] = nframes
+    dset.file.flush()
 
 
-def read_time(fpaths, h5_data):
-    """!Read in data from all protein files
+def read_time(fpaths, h5_data, workers=1):
+    """!Read in data from all protein files. If a time data set already
+    exists, only the frames that are not complete are read and the data set
+    is extended.
 
     @param fnames: List posit file names
     @param h5_data: HDF5 position data gropu
+    @param workers: Number of processes used to parse files
     @return: HDF5 data set containing protein data
 
     """
-    t = []
-    for fp in tqdm(fpaths, disable=True):
-        # p = Path(fn).resolve()
-        with fp.open(mode='r') as f:
-            t += [float(f.readlines()[1])]
-    time_dset = h5_data.create_dataset('time', data=t)
+    nframes = len(fpaths)
+    if 'time' in h5_data:
+        time_dset = h5_data['time']
+        start = get_nframes_complete(time_dset)
+        time_dset.resize(nframes, axis=0)
+        time_dset[start:] = list(
+            map_frames(read_dat_time, fpaths[start:], workers))
+    else:
+        t = list(map_frames(read_dat_time, fpaths, workers))
+        time_dset = h5_data.create_dataset('time', data=t, maxshape=(None,))
+    mark_frames_complete(time_dset, nframes)
     return time_dset
 
 
+def read_sylinder_obj_arr(fpath):
+    """Read a SylinderAscii_X.dat file through filament objects. Slow, but
+    useful to check the bulk parser in read_sylinder_arr."""
+    filaments = read_dat_sylinder(fpath)
+    return np.asarray([fil.get_dat()
+                       for fil in filaments if (fil.fil_type != 'L')], dtype='f8')
+
+
+def read_sylinder_obj_time_arr(fpath):
+    """Object based counterpart of read_sylinder_time_arr."""
+    return read_dat_time(fpath), read_sylinder_obj_arr(fpath)
+
+
+def read_xlp_obj_arr(fpath):
+    """Read a ProteinAscii_X.dat file through protein objects. Slow, but
+    useful to check the bulk parser in read_xlp_arr."""
+    xlps = read_dat_xlp(fpath)
+    return np.asarray([p.get_dat() for p in xlps], dtype='f8')
+
+
+def write_frames(dset, parse_func, paths, start=0, workers=1, flush_every=100,
+                 time_dset=None):
+    """Parse frame files and write them into the last axis of a data set,
+    marking progress as frames are written.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Data set with frames along the last axis, already sized for all paths
+    parse_func : callable
+        Function returning the array of a single frame file, or a tuple of
+        (time, array) if time_dset is given
+    paths : list
+        Frame file paths in frame order (all frames, not just new ones)
+    start : int, optional
+        First frame to parse and write, by default 0
+    workers : int, optional
+        Number of processes used to parse files, by default 1
+    flush_every : int, optional
+        Number of frames between progress marks, by default 100
+    time_dset : h5py.Dataset, optional
+        Data set to write the time of every frame to, by default None
+    """
+    dsets = [dset] if time_dset is None else [dset, time_dset]
+    frame = start
+    for parsed in map_frames(parse_func, paths[start:], workers):
+        if time_dset is not None:
+            time_dset[frame], parsed = parsed
+        if parsed.shape != dset.shape[:-1]:
+            raise ValueError(
+                f"Frame {frame} has shape {parsed.shape}, not "
+                f"{dset.shape[:-1]}. Collect runs with changing numbers of "
+                "objects with schema='ragged'.")
+        dset[..., frame] = parsed
+        frame += 1
+        if (frame - start) % flush_every == 0:
+            for d in dsets:
+                mark_frames_complete(d, frame)
+    for d in dsets:
+        mark_frames_complete(d, frame)
+
+
+def require_time_dset(h5_data, nframes):
+    """Get (or create) the time data set of a raw data file sized for nframes.
+
+    @param h5_data: HDF5 raw data file
+    @param nframes: Total number of frames
+    @return: HDF5 time data set
+
+    """
+    if 'time' in h5_data:
+        time_dset = h5_data['time']
+        time_dset.resize(nframes, axis=0)
+    else:
+        time_dset = h5_data.create_dataset('time', shape=(nframes,),
+                                           dtype='f8', maxshape=(None,))
+        mark_frames_complete(time_dset, 0)
+    return time_dset
+
+
+def create_raw_dset(posit_grp, kind, n_rows, nframes, schema='packed',
+                    dtype='f4', layout='auto', compression=None):
+    """Create the frame data set(s) of one raw data kind.
+
+    Parameters
+    ----------
+    posit_grp : h5py.Group
+        raw_data group
+    kind : str
+        'sylinders' or 'proteins'
+    n_rows : int
+        Number of objects in a frame
+    nframes : int
+        Number of frames
+    schema : str, optional
+        'packed' stores every column in one (n_rows, ncols, nframes) data set
+        of dtype. 'split' stores the floating point columns with dtype and the
+        gid, group, tag, and bind ID columns as int32 (see raw_schema),
+        by default 'packed'
+    dtype : str, optional
+        Floating point precision, by default 'f4'
+    layout : str, optional
+        Chunk layout (see get_raw_dset_kwargs), by default 'auto'
+    compression : str, optional
+        Compression filter (see get_raw_dset_kwargs), by default None
+
+    Returns
+    -------
+    h5py.Dataset or PackedRawView
+        Writable data set with the packed column order
+    """
+    if schema == 'packed':
+        parts = [(kind, np.arange(len(PACKED_COLUMNS[kind])), dtype)]
+    elif schema == 'split':
+        parts = [(name, cols, dtype if part_dtype is None else part_dtype)
+                 for name, cols, part_dtype in SPLIT_SCHEMA[kind]]
+    else:
+        raise ValueError(f'Raw data schema "{schema}" is not supported.')
+    posit_grp.attrs['schema'] = schema
+
+    for name, cols, part_dtype in parts:
+        n_cols = len(cols)
+        dset = posit_grp.create_dataset(
+            name, shape=(n_rows, n_cols, nframes), dtype=part_dtype,
+            maxshape=(n_rows, n_cols, None),
+            **get_raw_dset_kwargs((n_rows, n_cols), layout, compression,
+                                  itemsize=np.dtype(part_dtype).itemsize))
+        dset.attrs['column labels'] = [PACKED_COLUMNS[kind][c] for c in cols]
+    return get_raw_dset(posit_grp.file, kind)
+
+
+def write_ragged_frames(rows_dset, offsets_dset, parse_func, paths, start=0,
+                        workers=1, flush_every=100, time_dset=None):
+    """Parse frame files with varying numbers of rows and append their rows
+    to a ragged data set, recording the row offset of every frame.
+
+    Parameters
+    ----------
+    rows_dset : h5py.Dataset
+        (total rows, ncols) data set resizable along the first axis
+    offsets_dset : h5py.Dataset
+        Frame offsets into rows_dset, already sized for len(paths) + 1
+    parse_func : callable
+        Function returning the (n_rows, ncols) array of a single frame file,
+        or a tuple of (time, array) if time_dset is given
+    paths : list
+        Frame file paths in frame order (all frames, not just new ones)
+    start : int, optional
+        First frame to parse and write, by default 0
+    workers : int, optional
+        Number of processes used to parse files, by default 1
+    flush_every : int, optional
+        Number of frames between progress marks, by default 100
+    time_dset : h5py.Dataset, optional
+        Data set to write the time of every frame to, by default None
+    """
+    dsets = [offsets_dset] if time_dset is None else [offsets_dset, time_dset]
+    # Rows of frames that were not marked complete are overwritten
+    n_rows = int(offsets_dset[start])
+    rows_dset.resize(n_rows, axis=0)
+    frame = start
+    for parsed in map_frames(parse_func, paths[start:], workers):
+        if time_dset is None:
+            arr = parsed
+        else:
+            time_dset[frame], arr = parsed
+        rows_dset.resize(n_rows + arr.shape[0], axis=0)
+        rows_dset[n_rows:] = arr
+        n_rows += arr.shape[0]
+        frame += 1
+        offsets_dset[frame] = n_rows
+        if (frame - start) % flush_every == 0:
+            for d in dsets:
+                mark_frames_complete(d, frame)
+    for d in dsets:
+        mark_frames_complete(d, frame)
+
+
+def read_ragged_data(paths, posit_grp, kind, parse_func, workers=1,
+                     compression=None, time_dset=None, dtype='f4'):
+    """!Read frames with varying numbers of objects into ragged data sets
+    (see raw_schema.RaggedRawData), resuming after the frames that are
+    already complete.
+
+    @param paths: List of frame files
+    @param posit_grp: HDF5 position data group
+    @param kind: 'sylinders' or 'proteins'
+    @param parse_func: Function parsing a frame file (see write_ragged_frames)
+    @param workers: Number of processes used to parse files
+    @param compression: Compression filter of new data sets
+    @param time_dset: HDF5 time data set sized for all frames (optional)
+    @param dtype: Floating point precision of new data sets
+    @return: RaggedRawData reader of the data
+
+    """
+    rows_name, offsets_name, _, _ = get_ragged_names(kind)
+    nframes = len(paths)
+    if offsets_name in posit_grp:
+        rows_dset = posit_grp[rows_name]
+        offsets_dset = posit_grp[offsets_name]
+        start = get_nframes_complete(offsets_dset)
+        offsets_dset.resize(nframes + 1, axis=0)
+    else:
+        ncols = len(PACKED_COLUMNS[kind])
+        kwargs = get_raw_dset_kwargs((0, ncols), 'auto', compression)
+        # Chunks of whole rows, about 1 MiB each
+        kwargs['chunks'] = (max(1, 2**20 // (ncols * np.dtype(dtype).itemsize)),
+                            ncols)
+        rows_dset = posit_grp.create_dataset(
+            rows_name, shape=(0, ncols), maxshape=(None, ncols), dtype=dtype,
+            **kwargs)
+        rows_dset.attrs['column labels'] = PACKED_COLUMNS[kind]
+        rows_dset.attrs['axis dimensions'] = ['row', 'state']
+        offsets_dset = posit_grp.create_dataset(
+            offsets_name, shape=(nframes + 1,), maxshape=(None,), dtype='i8')
+        offsets_dset.attrs['axis dimensions'] = ['frame']
+        posit_grp.attrs['schema'] = 'ragged'
+        start = 0
+        mark_frames_complete(offsets_dset, 0)
+    if time_dset is not None:
+        start = min(start, get_nframes_complete(time_dset))
+    write_ragged_frames(rows_dset, offsets_dset, parse_func, paths, start,
+                        workers, time_dset=time_dset)
+    build_gid_index(posit_grp, kind)
+    return RaggedRawData(posit_grp, kind)
+
+
 # @profile
-def read_sylinder_data(syl_paths, posit_grp):
-    """!Read in data from all tubule files
+def read_sylinder_data(syl_paths, posit_grp, use_objects=False, workers=1,
+                       layout='auto', compression=None, time_dset=None,
+                       schema='packed', dtype='f4'):
+    """!Read in data from all tubule files. If a sylinder data set already
+    exists, only the frames that are not complete are read and the data set
+    is extended. If a time data set is given, the time in the header of each
+    file is written to it during the same read.
 
     @param tubule_fnames: List of tubule posit file names
     @param posit_grp: HDF5 position data gropu
-    @return: HDF5 data set containing tubule data
+    @param use_objects: Parse every line into a filament object (slow, but
+                        useful for debugging the bulk array parser)
+    @param workers: Number of processes used to parse files
+    @param layout: Chunk layout of a new data set (see get_raw_dset_kwargs)
+    @param compression: Compression filter of a new data set
+    @param time_dset: HDF5 time data set sized for all frames (optional)
+    @param schema: Storage schema of a new data set, 'packed', 'split', or
+                   'ragged' (frames with varying numbers of sylinders)
+    @param dtype: Floating point precision of a new data set
+    @return: HDF5 data set (or packed view of split data sets, or ragged
+             data reader) containing tubule data
 
     """
     nframes = len(syl_paths)
-    # Get number of tubules
-    with syl_paths[0].open('r') as sp:
-        n_syl = int(sp.readline())
-    # Create dataset for MT info
-    sy_dset = posit_grp.create_dataset('sylinders',
-                                       shape=(n_syl, 9, nframes))
-    sy_dset.attrs['n_yslinders'] = n_syl
-    sy_dset.attrs['axis dimensions'] = ['sylinders', 'state', 'frame']
-    # Set tubule attribute: names of columns
-    sy_dset.attrs['column labels'] = ['gid', 'radius',
-                                      'minus pos x', 'minus pos y', 'minus pos z',
-                                      'plus pos x', 'plus pos y', 'plus pos z',
-                                      'group', ]
-    for frame, syl_path in tqdm(enumerate(syl_paths), total=len(syl_paths), disable=True):
-        filaments = read_dat_sylinder(syl_path)
-        data_arr = [fil.get_dat()
-                    for fil in filaments if (fil.fil_type != 'L')]
-        sy_dset[:, :, frame] = np.asarray(data_arr, dtype='f8')
+    if time_dset is None:
+        parse_func = read_sylinder_obj_arr if use_objects else read_sylinder_arr
+    else:
+        parse_func = read_sylinder_obj_time_arr if use_objects else read_sylinder_time_arr
+
+    # Existing data keeps the schema it was collected with
+    schema = get_kind_schema(posit_grp, 'sylinders') or schema
+    if schema == 'ragged':
+        return read_ragged_data(syl_paths, posit_grp, 'sylinders', parse_func,
+                                workers, compression, time_dset, dtype)
+
+    try:
+        sy_dset = get_raw_dset(posit_grp.file, 'sylinders')
+        start = get_nframes_complete(sy_dset)
+        sy_dset.resize(nframes, axis=2)
+    except KeyError:
+        start = 0
+        # Get number of tubules, without the types that are not stored
+        n_syl = read_sylinder_arr(syl_paths[0]).shape[0]
+        # Create dataset for MT info
+        sy_dset = create_raw_dset(posit_grp, 'sylinders', n_syl, nframes,
+                                  schema, dtype, layout, compression)
+        sy_dset.attrs['n_yslinders'] = n_syl
+        sy_dset.attrs['axis dimensions'] = ['sylinders', 'state', 'frame']
+    if time_dset is not None:
+        start = min(start, get_nframes_complete(time_dset))
+    write_frames(sy_dset, parse_func, syl_paths, start, workers,
+                 time_dset=time_dset)
     return sy_dset
 
 
-def read_protein_data(xlp_paths, posit_grp):
-    """!Read in data from all protein files
+def read_protein_data(xlp_paths, posit_grp, use_objects=False, workers=1,
+                      layout='auto', compression=None, schema='packed',
+                      dtype='f4'):
+    """!Read in data from all protein files. If a protein data set already
+    exists, only the frames that are not complete are read and the data set
+    is extended.
 
     @param protein_fnames: List of protein posit file names
     @param posit_grp: HDF5 position data group
-    @return: HDF5 data set containing protein data
+    @param use_objects: Parse every line into a protein object (slow, but
+                        useful for debugging the bulk array parser)
+    @param workers: Number of processes used to parse files
+    @param layout: Chunk layout of a new data set (see get_raw_dset_kwargs)
+    @param compression: Compression filter of a new data set
+    @param schema: Storage schema of a new data set, 'packed', 'split', or
+                   'ragged' (frames with varying numbers of proteins)
+    @param dtype: Floating point precision of a new data set
+    @return: HDF5 data set (or packed view of split data sets, or ragged
+             data reader) containing protein data
 
     """
     nframes = len(xlp_paths)
-    with xlp_paths[0].open(mode='r') as xp:
-        nproteins = int(xp.readline())
-
-    # Create dataset for protein info (input shape)
-    protein_dset = posit_grp.create_dataset('proteins',
-                                            shape=(nproteins, 10, nframes),
-                                            )
-    # Set protein attribute: names of columns
-    protein_dset.attrs['nproteins'] = nproteins
-    protein_dset.attrs['axis dimensions'] = ['protein', 'state', 'frame']
-    protein_dset.attrs['column labels'] = ['gid', 'tag',
-                                           'end1 pos x', 'end1 pos y', 'end1 pos z',
-                                           'end2 pos x', 'end2 pos y', 'end2 pos z',
-                                           'end1 bindID', 'end2 bindID']
-    # Loop over files adding to h5_data
-    for frame, xlp_path in tqdm(enumerate(xlp_paths), total=len(xlp_paths), disable=True):
-        # for frame, xlp_path in enumerate(xlp_paths):
-        xlps = read_dat_xlp(xlp_path)
-        data_arr = [p.get_dat() for p in xlps]
-        protein_dset[:, :, frame] = np.asarray(data_arr, dtype='f8')
+    parse_func = read_xlp_obj_arr if use_objects else read_xlp_arr
+
+    schema = get_kind_schema(posit_grp, 'proteins') or schema
+    if schema == 'ragged':
+        return read_ragged_data(xlp_paths, posit_grp, 'proteins', parse_func,
+                                workers, compression, dtype=dtype)
 
+    try:
+        protein_dset = get_raw_dset(posit_grp.file, 'proteins')
+        start = get_nframes_complete(protein_dset)
+        protein_dset.resize(nframes, axis=2)
+    except KeyError:
+        start = 0
+        with xlp_paths[0].open(mode='r') as xp:
+            nproteins = int(xp.readline())
+
+        # Create dataset for protein info (input shape)
+        protein_dset = create_raw_dset(posit_grp, 'proteins', nproteins,
+                                       nframes, schema, dtype, layout,
+                                       compression)
+        protein_dset.attrs['nproteins'] = nproteins
+        protein_dset.attrs['axis dimensions'] = ['protein', 'state', 'frame']
+    # Loop over files adding to h5_data
+    write_frames(protein_dset, parse_func, xlp_paths, start, workers)
     return protein_dset
 
 
-def read_constraint_data(cons_fnames, h5_data):
-    """!Read in data from constraint files
+def write_stress_data(cons_fnames, h5_data, parse_func, keys, row_shape,
+                      row_labels, workers=1, stride=1, flush_every=100):
+    """Write a pair of stress arrays per constraint file into resizable data
+    sets with frames along the last axis. If the data sets already exist,
+    only the frames that are not complete are read and the data sets are
+    extended.
+
+    Parameters
+    ----------
+    cons_fnames : list of Path
+        Constraint files in frame order
+    h5_data : h5py.File or h5py.Group
+        HDF5 group to write data sets to
+    parse_func : callable
+        Picklable function returning (bilateral, collision) arrays of shape
+        row_shape for a constraint file
+    keys : list of 2 str
+        Names of the bilateral and collision data sets
+    row_shape : tuple of int
+        Shape of the stress of a single frame
+    row_labels : list of str
+        Axis labels of row_shape
+    workers : int, optional
+        Number of processes used to parse files, by default 1
+    stride : int, optional
+        Only read every stride-th constraint file, by default 1
+    flush_every : int, optional
+        Number of frames between progress marks, by default 100
+
+    Returns
+    -------
+    list of h5py.Dataset
+        Bilateral and collision data sets
+    """
+    cons_fnames = cons_fnames[::stride]
+    nframes = len(cons_fnames)
+    row_shape = tuple(row_shape)
+    dsets = []
+    for key in keys:
+        if key in h5_data:
+            dset = h5_data[key]
+            if dset.attrs.get('stride', 1) != stride:
+                raise ValueError(
+                    f"Data set {key} was collected with stride "
+                    f"{dset.attrs.get('stride', 1)}, not {stride}.")
+            if dset.shape[:-1] != row_shape:
+                raise ValueError(
+                    f"Data set {key} has frames of shape {dset.shape[:-1]}, "
+                    f"not {row_shape}.")
+            dset.resize(nframes, axis=len(row_shape))
+        else:
+            dset = h5_data.create_dataset(key, shape=row_shape + (nframes,),
+                                          maxshape=row_shape + (None,))
+            dset.attrs['axis labels'] = list(row_labels) + ['frame']
+            dset.attrs['stride'] = stride
+        dsets += [dset]
+
+    start = min(get_nframes_complete(dset) for dset in dsets)
+    frame = start
+    for parsed in map_frames(parse_func, cons_fnames[start:], workers):
+        for dset, arr in zip(dsets, parsed):
+            dset[..., frame] = arr
+        frame += 1
+        if (frame - start) % flush_every == 0:
+            for dset in dsets:
+                mark_frames_complete(dset, frame)
+    for dset in dsets:
+        mark_frames_complete(dset, frame)
+    return dsets
+
+
+def read_constraint_data(cons_fnames, h5_data, workers=1, stride=1,
+                         flush_every=100):
+    """!Read in data from constraint files. If the stress data sets already
+    exist, only the frames that are not complete are read and the data sets
+    are extended.
 
     @param cons_fnames: List constraint file names
     @param h5_data: HDF5 data file to add stress
-    @return: HDF5 data set containing tubule data
+    @param workers: Number of processes used to parse files
+    @param stride: Only read every stride-th constraint file
+    @param flush_every: Number of frames between progress marks
+    @return: HDF5 data sets containing bilateral and collision stress
 
     """
-    nframes = len(cons_fnames)
-    bi_dset = h5_data.create_dataset('bilateral_stress',
-                                     shape=(3, 3, nframes))
-    col_dset = h5_data.create_dataset('collision_stress',
-                                      shape=(3, 3, nframes))
-    bi_dset.attrs['axis labels'] = ['dim', 'dim', 'frame']
-    col_dset.attrs['axis labels'] = ['dim', 'dim', 'frame']
-    for frame, tfname in enumerate(cons_fnames):
-        collision_stress, bilateral_stress = read_stress_from_con(tfname)
-        # print(f'Step {frame}: {collision_stress.flatten()}')
-        col_dset[:, :, frame] = collision_stress
-        bi_dset[:, :, frame] = bilateral_stress
+    bi_dset, col_dset = write_stress_data(
+        cons_fnames, h5_data, read_stress_from_con,
+        ['bilateral_stress', 'collision_stress'], (3, 3), ['dim', 'dim'],
+        workers, stride, flush_every)
+    return bi_dset, col_dset
+
+
+def read_constraint_field_data(cons_fnames, h5_data, grid_shape=None,
+                               box_low=None, box_high=None, nbeads=None,
+                               workers=1, stride=1, flush_every=100):
+    """!Read the binned stress field of constraint files. See
+    read_stress_field_from_con for the binning options.
 
+    @param cons_fnames: List constraint file names
+    @param h5_data: HDF5 data file to add stress field
+    @param workers: Number of processes used to parse files
+    @param stride: Only read every stride-th constraint file
+    @param flush_every: Number of frames between progress marks
+    @return: HDF5 data sets containing bilateral and collision stress fields
+
+    """
+    parse_func = partial(read_stress_field_from_con, grid_shape=grid_shape,
+                         box_low=box_low, box_high=box_high, nbeads=nbeads)
+    if grid_shape is not None:
+        row_shape = tuple(grid_shape) + (3, 3)
+        row_labels = ['x bin', 'y bin', 'z bin', 'dim', 'dim']
+    else:
+        row_shape = (nbeads, 3, 3)
+        row_labels = ['bead', 'dim', 'dim']
+    bi_dset, col_dset = write_stress_data(
+        cons_fnames, h5_data, parse_func,
+        ['bilateral_stress_field', 'collision_stress_field'],
+        row_shape, row_labels, workers, stride, flush_every)
+    for dset in [bi_dset, col_dset]:
+        if grid_shape is not None:
+            dset.attrs['box_low'] = box_low
+            dset.attrs['box_high'] = box_high
     return bi_dset, col_dset
 
 
-def collect_stress_from_con_pvtp(fname="stress.h5", path=Path('.')):
+def collect_stress_from_con_pvtp(fname="stress.h5", path=Path('.'), workers=1,
+                                 stride=1, append=False):
+    """Sum the stress of all constraints in every ConBlock file of a
+    simulation.
+
+    Parameters
+    ----------
+    fname : str or Path, optional
+        Stress HDF5 file to write, by default "stress.h5"
+    path : Path, optional
+        Simulation directory holding result/, by default Path('.')
+    workers : int, optional
+        Number of processes used to read ConBlock files, by default 1
+    stride : int, optional
+        Only read every stride-th ConBlock file, by default 1
+    append : bool, optional
+        Keep the frames of an existing stress file and only read the missing
+        ones, by default False
+    """
     result_dir = path / 'result'
     if not result_dir.exists():
         raise FileNotFoundError(
             f'Result directory {str(result_dir)} does not exist.')
 
-    with h5py.File(fname, 'w') as h5_data:
-        con_dat_paths = sorted(result_dir.glob("**/ConBlock*.pvtp"),
-                               key=get_file_number)
-        bi_dset, col_dset = read_constraint_data(con_dat_paths, h5_data)
-        t4 = time.time()
+    mode = 'w'
+    if append and Path(fname).exists():
+        if can_append_raw_data(fname, ('bilateral_stress', 'collision_stress')):
+            mode = 'a'
+        else:
+            print(f"Rebuilding {fname} from scratch.")
 
+    with h5py.File(fname, mode) as h5_data:
+        con_dat_paths = get_frame_paths(result_dir, 'ConBlock', 'pvtp')
+        bi_dset, col_dset = read_constraint_data(con_dat_paths, h5_data,
+                                                 workers, stride)
 
-def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False):
+
+def collect_stress_field_from_con_pvtp(fname="stress_field.h5", path=Path('.'),
+                                       grid_shape=None, workers=1, stride=1,
+                                       append=False):
+    """Bin the stress of the constraints in every ConBlock file of a
+    simulation on a spatial grid spanning the simulation box, or per bead.
+
+    Parameters
+    ----------
+    fname : str or Path, optional
+        Stress field HDF5 file to write, by default "stress_field.h5"
+    path : Path, optional
+        Simulation directory holding result/ and RunConfig.yaml, by default
+        Path('.')
+    grid_shape : tuple of 3 ints, optional
+        Number of bins along x, y, and z, by default None (bin per bead)
+    workers : int, optional
+        Number of processes used to read ConBlock files, by default 1
+    stride : int, optional
+        Only read every stride-th ConBlock file, by default 1
+    append : bool, optional
+        Keep the frames of an existing stress field file and only read the
+        missing ones, by default False
+    """
+    result_dir = path / 'result'
+    if not result_dir.exists():
+        raise FileNotFoundError(
+            f'Result directory {str(result_dir)} does not exist.')
+
+    box_low = box_high = nbeads = None
+    if grid_shape is not None:
+        with (path / 'RunConfig.yaml').open('r') as rc_file:
+            rc_params = yaml.safe_load(rc_file)
+        box_low = rc_params['simBoxLow']
+        box_high = rc_params['simBoxHigh']
+    else:
+        # Constraint gids index sylinders, so bin up to the largest gid
+        syl_paths = get_frame_paths(result_dir, 'SylinderAscii', 'dat')
+        nbeads = int(read_dat_arr(syl_paths[0], 9)[1][:, 0].max()) + 1
+
+    mode = 'w'
+    if append and Path(fname).exists():
+        if can_append_raw_data(fname, ('bilateral_stress_field',
+                                       'collision_stress_field')):
+            mode = 'a'
+        else:
+            print(f"Rebuilding {fname} from scratch.")
+
+    with h5py.File(fname, mode) as h5_data:
+        con_dat_paths = get_frame_paths(result_dir, 'ConBlock', 'pvtp')
+        bi_dset, col_dset = read_constraint_field_data(
+            con_dat_paths, h5_data, grid_shape, box_low, box_high, nbeads,
+            workers, stride)
+
+
+def can_append_raw_data(fname, keys=('time', 'raw_data/sylinders',
+                                      'raw_data/proteins',
+                                      'raw_data/sylinder_pos',
+                                      'raw_data/sylinder_ids',
+                                      'raw_data/protein_pos',
+                                      'raw_data/protein_ids')):
+    """Check if an existing raw data file can be opened and extended in place.
+
+    Parameters
+    ----------
+    fname : str or Path
+        Raw data HDF5 file
+    keys : tuple of str, optional
+        Frame data sets that have to be resizable, by default the time,
+        sylinder, and protein data sets of either schema
+
+    Returns
+    -------
+    bool
+        False if the file cannot be opened (e.g. a conversion was killed while
+        writing metadata) or if its frame data sets are not resizable.
+    """
+    try:
+        with h5py.File(fname, 'r') as h5_data:
+            for key in keys:
+                if key in h5_data and h5_data[key].maxshape[-1] is not None:
+                    print(f"Data set {key} in {fname} is not resizable.")
+                    return False
+    except OSError as e:
+        print(f"Could not open {fname} to append: {e}")
+        return False
+    return True
+
+
+def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False,
+                       workers=1, append=False, layout='auto', compression=None,
+                       schema='packed', dtype='f4', store=None):
     """Convert separate ascii and vtk data files into a single hdf5 file
 
     Parameters
@@ -265,6 +1155,37 @@ def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False):
         The seed directory of the simulation, by default Path('.')
     store_stress : bool, optional
         Should you spend the space to store the stress calculated in the system, by default False
+    workers : int, optional
+        Number of processes used to parse frame files, by default 1. Frames
+        are still written by this process in order, so the output does not
+        depend on the number of workers.
+    append : bool, optional
+        Only parse frames that are not already in an existing raw data file
+        and grow its data sets in place, by default False. Also resumes a
+        conversion that was interrupted. If the existing file cannot be
+        extended, it is rebuilt from scratch.
+    layout : str, optional
+        Chunk layout of the sylinder and protein data sets, 'auto', 'frame'
+        (per-frame reads) or 'bead' (per-bead time series), by default 'auto'.
+        Ignored when appending to existing data sets.
+    compression : str, optional
+        Compression of the sylinder and protein data sets, None, 'gzip',
+        'lzf', 'blosc' or 'zstd', by default None
+    schema : str, optional
+        'packed' stores each kind in one float array, 'split' stores
+        coordinates and integer ids (gid, group, tag, bind IDs) in separate
+        float and int32 data sets, by default 'packed'. Read either with
+        raw_schema.get_raw_dset. 'ragged' stores frames with varying numbers
+        of objects as concatenated rows with frame offsets; read it with
+        raw_schema.get_ragged_raw. Ignored when appending to existing data
+        sets.
+    dtype : str, optional
+        Floating point precision of the sylinder and protein data, 'f4' or
+        'f8', by default 'f4'
+    store : str, optional
+        Also export the raw data file to an array store beside it, 'npy'
+        (memory mapped .npy files) or 'zarr', by default None. Open either
+        with array_store.open_raw_data.
 
     Raises
     ------
@@ -275,30 +1196,38 @@ def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False):
         result_dir = path / 'result'
         is_zip = False
     elif (path / 'result.zip').exists():
-        result_zip = zipfile.ZipFile(path / 'result.zip')
-        result_path = zipfile.Path(path / 'result.zip')
+        result_zip_path = path / 'result.zip'
         is_zip = True
     else:
         raise OSError(f'Could not find result directory or zipfile in {path}.')
 
+    # Check storage options before any existing file is truncated
+    get_raw_dset_kwargs((1, 9), layout, compression)
+    if schema not in ('packed', 'split', 'ragged'):
+        raise ValueError(f'Raw data schema "{schema}" is not supported.')
+    if store is not None and store not in STORE_BACKENDS:
+        raise ValueError(f'Array store "{store}" is not supported.')
+
+    mode = 'w'
+    if append and Path(fname).exists():
+        if can_append_raw_data(fname):
+            mode = 'a'
+        else:
+            print(f"Rebuilding {fname} from scratch.")
+
     # Open raw h5 data objec to write to
-    with h5py.File(fname, 'w') as h5_data:
+    with h5py.File(fname, mode) as h5_data:
         # Get paths (depends on if you are using zip archive or not)
         if is_zip:
-            sy_reg = re.compile(r'.*SylinderAscii.*.dat')
-            sy_dat_paths = sorted(list(filter(sy_reg.search, result_zip.namelist())),
-                                  key=get_file_number)
-            sy_dat_paths = [result_path / f for f in sy_dat_paths]
-
-            xlp_reg = re.compile(r'.*ProteinAscii.*.dat')
-            xlp_dat_paths = sorted(list(filter(xlp_reg.search, result_zip.namelist())),
-                                   key=get_file_number)
-            xlp_dat_paths = [result_path / f for f in xlp_dat_paths]
+            # Members are read straight from the archive (no unpacking) and
+            # can be decompressed and parsed by the worker processes.
+            sy_dat_paths = get_zip_frame_members(
+                result_zip_path, 'SylinderAscii', 'dat')
+            xlp_dat_paths = get_zip_frame_members(
+                result_zip_path, 'ProteinAscii', 'dat')
         else:
-            sy_dat_paths = sorted(result_dir.glob("**/SylinderAscii*.dat"),
-                                  key=get_file_number)
-            xlp_dat_paths = sorted(result_dir.glob("**/ProteinAscii*.dat"),
-                                   key=get_file_number)
+            sy_dat_paths = get_frame_paths(result_dir, 'SylinderAscii', 'dat')
+            xlp_dat_paths = get_frame_paths(result_dir, 'ProteinAscii', 'dat')
 
         # assert(len(protein_fnames) == len(tubule_fnames))
         with (path / 'RunConfig.yaml').open('r') as rc_file:
@@ -309,22 +1238,23 @@ def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False):
             xlp_params = yaml.safe_load(xlp_file)
             h5_data.attrs['ProteinConfig'] = yaml.dump(xlp_params)
 
-        # Make time array
         t0 = time.time()
-        time_dset = read_time(sy_dat_paths, h5_data)
-        t1 = time.time()
-        print(f"Made time data set in {t1-t0} seconds.")
-
         # Create group of position data
-        posit_grp = h5_data.create_group('raw_data')
-
-        # Make sylinder data
-        sy_dset = read_sylinder_data(sy_dat_paths, posit_grp)
+        posit_grp = h5_data.require_group('raw_data')
+
+        # Make sylinder data and time array, reading each file once
+        time_dset = require_time_dset(h5_data, len(sy_dat_paths))
+        sy_dset = read_sylinder_data(sy_dat_paths, posit_grp, workers=workers,
+                                     layout=layout, compression=compression,
+                                     time_dset=time_dset, schema=schema,
+                                     dtype=dtype)
         t2 = time.time()
-        print(f"Made sylinder data set in {t2-t1} seconds.")
+        print(f"Made time and sylinder data sets in {t2-t0} seconds.")
 
         # Make protein data
-        xlp_dset = read_protein_data(xlp_dat_paths, posit_grp)
+        xlp_dset = read_protein_data(xlp_dat_paths, posit_grp, workers=workers,
+                                     layout=layout, compression=compression,
+                                     schema=schema, dtype=dtype)
         t3 = time.time()
         print(f"Made protin data set in {t3-t2} seconds.")
 
@@ -353,6 +1283,10 @@ def convert_dat_to_hdf(fname="raw_data.h5", path=Path('.'), store_stress=False):
         t = time.time()
         print(f"Made raw data file in a total of {t-t0} seconds.")
 
+    if store is not None:
+        store_path = export_raw_store(fname, store)
+        print(f"Exported raw data to {store_path} in {time.time()-t} seconds.")
+
 
 ##########################################
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import re
 import os
 from pathlib import Path
+from .frame_manifest import get_frame_paths
 
 
 def getFrameNumber_lambda(filename): return int(
@@ -8,9 +9,8 @@ def getFrameNumber_lambda(filename): return int(
 
 
 def result_to_pvd(path, name, ext):
-    FileList = list(path.glob(f'./result*/{name}_*.{ext}'))
-    # sort as numerical order
-    FileList.sort(key=getFrameNumber_lambda)
+    # sorted in numerical order
+    FileList = get_frame_paths(path, name, ext, r'result[^/]*')
     with open(path / f'{name}{ext}.pvd', "w") as fpvd:
         fpvd.write(
             '<VTKFile type="Collection" version="1.0" byte_order="LittleEndian" header_type="UInt64"> \n')
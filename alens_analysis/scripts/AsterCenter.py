@@ -1,7 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import os
-import itertools as itt
+import scipy.sparse as ss
 
 import sklearn.cluster as skc  # density based method
 import networkx as nx   # connectivity based method
@@ -9,6 +9,8 @@ import networkx as nx   # connectivity based method
 import Util.aLENS as am
 import Util.HDF5_Wrapper as h5
 import point_cloud.PointCloud as pc
+from alens_analysis.periodic import (find_pairs_within, wrap_positions,
+                                     periodic_mean)
 
 
 parser = am.getDefaultArgParser('detect aster centers ')
@@ -25,6 +27,8 @@ args = parser.parse_args()
 
 config = am.parseConfig(args.config)
 boxsize = np.array(config['simBoxHigh'])-np.array(config['simBoxLow'])
+# Box lengths along periodic axes only (zero if not periodic)
+pbc_boxsize = np.where(config['simBoxPBC'], boxsize, 0.)
 
 if args.rcut < 0:
     args.rcut = np.min(0.5*boxsize)
@@ -44,31 +48,16 @@ except FileExistsError:
     pass
 
 
-def pbc_replicate(pts=None, boxsize=None,
-                  pbc=[True, True, True]):
-    px = [-1, 0, 1] if pbc[0] else [0]
-    py = [-1, 0, 1] if pbc[1] else [0]
-    pz = [-1, 0, 1] if pbc[2] else [0]
-    print(px, py, pz)
-    rep = list(itt.product(px, py, pz))
-    npts = np.shape(pts)[0]
-    pbcpts = np.zeros((len(rep)*npts, 3))
-    for i in range(len(rep)):
-        shift = np.zeros(pts.shape)
-        shift[:, 0] = rep[i][0]*boxsize[0]
-        shift[:, 1] = rep[i][1]*boxsize[1]
-        shift[:, 2] = rep[i][2]*boxsize[2]
-        # print(shift)
-        pbcpts[i*npts:(i+1)*npts] = shift+pts
-    # keep only part
-    xcon = np.logical_and(pbcpts[:, 0] > -boxsize[0]
-                          * 0.5, pbcpts[:, 0] < boxsize[0]*1.5)
-    ycon = np.logical_and(pbcpts[:, 1] > -boxsize[1]
-                          * 0.5, pbcpts[:, 1] < boxsize[1]*1.5)
-    zcon = np.logical_and(pbcpts[:, 2] > -boxsize[2]
-                          * 0.5, pbcpts[:, 2] < boxsize[2]*1.5)
-
-    return pbcpts[np.logical_and(np.logical_and(xcon, ycon), zcon)]
+def periodic_dist_graph(pts, eps, boxsize):
+    """Sparse matrix of the minimum image distances of all pairs of points
+    closer than eps, for DBSCAN with a precomputed metric."""
+    npts = pts.shape[0]
+    i_ind, j_ind, sep_vec = find_pairs_within(pts, eps, boxsize)
+    dist = np.linalg.norm(sep_vec, axis=1)
+    return ss.coo_matrix((np.concatenate([dist, dist]),
+                          (np.concatenate([i_ind, j_ind]),
+                           np.concatenate([j_ind, i_ind]))),
+                         shape=(npts, npts)).tocsr()
 
 
 def calc_gr_sq(pts, path, label):
@@ -148,9 +137,11 @@ def plot_centers(pts, ccs1, ccs2, label1, label2, path):
 
 def ac_dbscan(frame):
     minus_pts = frame.TList[:, 2:5]
-    pts = pbc_replicate(minus_pts, boxsize, config['simBoxPBC'])
+    # Neighbors are found in the periodic box instead of replicating points
+    pts = wrap_positions(minus_pts, pbc_boxsize)
     clustering = skc.DBSCAN(
-        eps=args.dbs_eps, min_samples=args.min).fit(pts)
+        eps=args.dbs_eps, min_samples=args.min, metric='precomputed').fit(
+            periodic_dist_graph(pts, args.dbs_eps, pbc_boxsize))
     result = clustering.labels_
     nc = np.max(result)
     centers = []
@@ -159,11 +150,7 @@ def ac_dbscan(frame):
         pts_cluster = pts[idx]
         # print for debug
         # print(pts_cluster)
-        center = np.mean(pts_cluster, axis=0)
-        if center[0] > 0 and center[0] < boxsize[0] \
-                and center[1] > 0 and center[1] < boxsize[1] \
-                and center[2] > 0 and center[2] < boxsize[2]:
-            centers.append(np.mean(pts_cluster, axis=0))
+        centers.append(periodic_mean(pts_cluster, pbc_boxsize))
 
     centers = np.array(centers)
     pc.impose_pbc(coords=centers, boxsize=boxsize)
@@ -186,14 +173,8 @@ def ac_nx(frame):
         gid_cluster = s.nodes()
         idx = np.isin(gid, gid_cluster)
         pts_cluster = minus_pts[idx]
-        trg = pts_cluster[0]
-        for i in range(1, pts_cluster.shape[1]):
-            nbpts = pts_cluster[i]
-            for k in range(3):
-                if config['simBoxPBC'][k]:
-                    m = am.findMove(trg[k], nbpts[k], boxsize[k])
-                    nbpts[k] = trg[k]+m
-        center = np.mean(pts_cluster, axis=0)
+        # Points are unwrapped to the images nearest the first point
+        center = periodic_mean(pts_cluster, pbc_boxsize)
         centers.append(center)
 
     centers = np.array(centers)
@@ -14,6 +14,8 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import h5py
 
+from alens_analysis.periodic import min_image
+
 parser = argparse.ArgumentParser()
 # parser.add_argument('pbcX', type=float, help='periodic bc length along X')
 # parser.add_argument('pbcY', type=float, help='periodic bc length along Y')
@@ -89,12 +91,7 @@ def closest_point1d(target, points):
 def get_closetimage(target, source, boxsize):
     dim = target.shape[0]
     assert source.shape[0] == dim
-    image = np.zeros(dim)
-    for i in range(dim):
-        pos, ind = closest_point1d(
-            target[i], [source[i], source[i]-boxsize[i], source[i]+boxsize[i]])
-        image[i] = pos
-    return image
+    return target + min_image(source - target, boxsize)
 
 
 def applypbc(points, boxsize):
@@ -123,20 +120,10 @@ def get_pair(coords, boxsize, rcut=None):
 
 
 def get_rvec(coords, boxsize, rcut, pairs):
-    rvec = []
-#     print(pairs)
-    for pair in pairs:
-        id0 = pair[0]
-        id1 = pair[1]
-        pos0 = coords[id0]
-        pos1 = coords[id1]
-        vec01 = pos1-pos0
-        if np.linalg.norm(vec01) < rcut:
-            rvec.append(vec01)
-        else:  # fix periodic image
-            image = get_closetimage(pos0, pos1, boxsize)
-            rvec.append(image-pos0)
-    return np.array(rvec)
+    # Minimum image vectors of all pairs at once
+    pairs = np.array(list(pairs), dtype=int).reshape(-1, 2)
+    vec01 = coords[pairs[:, 1]] - coords[pairs[:, 0]]
+    return min_image(vec01, np.asarray(boxsize, dtype=float))
 
 
 def gen_rdf(rvec, npar, density, rcut=0, nbins=20):
@@ -1,6 +1,7 @@
 import re
 import os
 import glob
+import fnmatch
 import argparse as agp
 
 import numpy as np
@@ -8,11 +9,21 @@ from numpy.lib.recfunctions import structured_to_unstructured
 import scipy.sparse as ss
 import scipy.io as sio
 
-import vtk
-from vtk.util.numpy_support import vtk_to_numpy
-
 import yaml
 
+try:
+    from alens_analysis.frame_manifest import get_frame_paths
+except ImportError:
+    get_frame_paths = None
+
+# Without the alens_analysis package, frames are parsed here with vtk
+try:
+    from alens_analysis.read_func import read_vtk_arrays
+except ImportError:
+    read_vtk_arrays = None
+    import vtk
+    from vtk.util.numpy_support import vtk_to_numpy
+
 
 def cart2sph(xyz):
     '''xyz.shape==(N,3), xyz => r, theta, phi'''
@@ -157,9 +168,20 @@ def getFrameNumber_lambda(filename): return int(
     re.search('_([^_.]+)(?:\.[^_]*)?$', filename).group(1))
 
 
+# <root>/result*-*/<Kind>_*.<ext> patterns can use the cached frame manifest
+frameGlobReg = re.compile(
+    r'^(?:(?P<root>.*)/)?(?P<dir>result[^/]*)/(?P<kind>[A-Za-z]+)_\*\.(?P<ext>\w+)$')
+
+
 def getFileListSorted(files, info=True):
-    files = glob.glob(files)
-    files.sort(key=getFrameNumber_lambda)
+    match = frameGlobReg.match(files)
+    if get_frame_paths is not None and match:
+        files = [str(p) for p in get_frame_paths(
+            match['root'] or '.', match['kind'], match['ext'],
+            fnmatch.translate(match['dir']))]
+    else:
+        files = glob.glob(files)
+        files.sort(key=getFrameNumber_lambda)
     if info:
         print(files)
     return files
@@ -304,6 +326,13 @@ class FrameVTK:
 
     def parseFile(self, dataFile):
         print("Parsing data from " + dataFile)
+        if read_vtk_arrays is not None:
+            vtk_arrays = read_vtk_arrays(dataFile)
+            self.data["points"] = vtk_arrays['points']
+            self.data.update(vtk_arrays['cell_data'])
+            self.data.update(vtk_arrays['point_data'])
+            return
+
         # create vtk reader
         reader = vtk.vtkXMLPPolyDataReader()
         reader.SetFileName(dataFile)
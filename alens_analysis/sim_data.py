@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: sim_data.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: SimulationData, a wrapper of an open raw data file (HDF5 or
+array store) that parses the configs once and memoizes arrays derived from
+the raw data (centers of mass, directions, lengths, bound states) so
+analyses sharing a file do not reread and recompute them.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from .array_store import open_raw_data, find_raw_data
+from .raw_schema import get_raw_dset
+from .time_blocks import iter_time_blocks
+from .periodic import get_box_size
+
+
+def _norm_range(rng):
+    """(start, stop) tuple of a range given as None, a slice, or a pair."""
+    if rng is None:
+        return (0, None)
+    if isinstance(rng, slice):
+        return (rng.start or 0, rng.stop)
+    return (rng[0] or 0, rng[-1])
+
+
+class SimulationData():
+
+    """Raw data of one simulation with lazily computed, memoized arrays.
+
+    Arrays are indexed (bead, ..., frame) like the packed raw data and can be
+    restricted to bead and time (frame) ranges given as (start, stop) pairs.
+    A range that was already read in full is sliced from memory rather than
+    read again. Unknown attributes and item lookups fall through to the
+    underlying h5py.File (or array store), so a SimulationData can be passed
+    wherever an open raw data file is expected.
+
+    Memoized arrays are shared by every caller and are therefore read only:
+    writing to one (e.g. com_arr -= shift) raises a ValueError. Take a copy
+    first to modify an array in place.
+    """
+
+    def __init__(self, h5_data, mode='r'):
+        """
+        @param h5_data Open raw data file, or the path of one to open
+        @param mode File mode used when a path is given
+        """
+        self._owns_file = isinstance(h5_data, (str, Path))
+        if self._owns_file:
+            h5_data = open_raw_data(find_raw_data(h5_data) if mode == 'r'
+                                    else h5_data, mode)
+        self.h5_data = h5_data
+        self._cache = {}
+
+    @property
+    def path(self):
+        """Path of the raw data file (or store)."""
+        return Path(self.h5_data.filename)
+
+    def close(self):
+        self._cache.clear()
+        if self._owns_file:
+            self.h5_data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Fall through to the raw data file
+    def __getattr__(self, name):
+        if name == 'h5_data':
+            raise AttributeError(name)
+        return getattr(self.h5_data, name)
+
+    def __getitem__(self, key):
+        return self.h5_data[key]
+
+    def __contains__(self, key):
+        return key in self.h5_data
+
+    def __delitem__(self, key):
+        del self.h5_data[key]
+
+    def memo(self, key, func):
+        """Value of func() computed once per key and kept until close. Arrays
+        are made read only since every caller shares them."""
+        if key not in self._cache:
+            val = func()
+            if isinstance(val, np.ndarray):
+                val.flags.writeable = False
+            self._cache[key] = val
+        return self._cache[key]
+
+    def clear_cache(self):
+        """Drop all memoized arrays."""
+        self._cache.clear()
+
+    def _ranged(self, name, func, bead_range, ts_range):
+        """Memoized func(bead_range, ts_range), sliced out of the full array
+        if that was already computed."""
+        bead_range, ts_range = _norm_range(bead_range), _norm_range(ts_range)
+        full_key = (name, (0, None), (0, None))
+        if full_key in self._cache:
+            return self._cache[full_key][slice(*bead_range), ...,
+                                         slice(*ts_range)]
+        return self.memo((name, bead_range, ts_range),
+                         lambda: func(bead_range, ts_range))
+
+    ############
+    #  Config  #
+    ############
+
+    @property
+    def run_params(self):
+        """Parsed RunConfig of the simulation."""
+        return self.memo('run_params',
+                         lambda: yaml.safe_load(self.h5_data.attrs['RunConfig']))
+
+    @property
+    def protein_params(self):
+        """Parsed ProteinConfig of the simulation."""
+        return self.memo('protein_params',
+                         lambda: yaml.safe_load(self.h5_data.attrs['ProteinConfig']))
+
+    @property
+    def box_size(self):
+        """Periodic box lengths (zero along non-periodic axes), or None if
+        the run is not periodic. See periodic.get_box_size."""
+        return self.memo('box_size', lambda: get_box_size(self.run_params))
+
+    ##############
+    #  Raw data  #
+    ##############
+
+    def time(self, ts_range=None):
+        """Time of every frame in ts_range."""
+        ts_range = _norm_range(ts_range)
+        time_arr = self.memo('time', lambda: self.h5_data['time'][...])
+        return time_arr[slice(*ts_range)]
+
+    def sylinders(self, bead_range=None, ts_range=None):
+        """(nbeads, 9, nframes) raw sylinder data."""
+        return self._ranged(
+            'sylinders',
+            lambda br, tr: get_raw_dset(self.h5_data, 'sylinders')[
+                br[0]:br[1], :, tr[0]:tr[1]],
+            bead_range, ts_range)
+
+    def proteins(self, ts_range=None):
+        """(nproteins, 10, nframes) raw protein data."""
+        return self._ranged(
+            'proteins',
+            lambda br, tr: get_raw_dset(self.h5_data, 'proteins')[
+                br[0]:br[1], :, tr[0]:tr[1]],
+            None, ts_range)
+
+    def iter_blocks(self, kind='com', **kwargs):
+        """Stream the raw data in blocks of frames without caching them. See
+        time_blocks.iter_time_blocks for the arguments."""
+        return iter_time_blocks(self.h5_data, kind, **kwargs)
+
+    ###################
+    #  Derived arrays #
+    ###################
+
+    def com(self, bead_range=None, ts_range=None):
+        """(nbeads, 3, nframes) centers of mass of the sylinders."""
+        def calc(br, tr):
+            sy_dat = self.sylinders(br, tr)
+            return .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+        return self._ranged('com', calc, bead_range, ts_range)
+
+    def _end_vec(self, bead_range, ts_range):
+        sy_dat = self.sylinders(bead_range, ts_range)
+        return sy_dat[:, 5:8, :] - sy_dat[:, 2:5, :]
+
+    def lengths(self, bead_range=None, ts_range=None):
+        """(nbeads, nframes) distance between the minus and plus ends."""
+        return self._ranged(
+            'lengths',
+            lambda br, tr: np.linalg.norm(self._end_vec(br, tr), axis=1),
+            bead_range, ts_range)
+
+    def directions(self, bead_range=None, ts_range=None):
+        """(nbeads, 3, nframes) unit vectors from minus to plus end. Zero
+        length sylinders get zero vectors."""
+        def calc(br, tr):
+            end_vec = self._end_vec(br, tr)
+            lengths = self.lengths(br, tr)[:, np.newaxis, :]
+            return np.divide(end_vec, lengths, out=np.zeros(end_vec.shape),
+                             where=lengths > 0)
+        return self._ranged('directions', calc, bead_range, ts_range)
+
+    def bound_state(self, ts_range=None):
+        """(nproteins, 2, nframes) bool array of whether each protein end is
+        bound (bind ID other than -1)."""
+        return self._ranged(
+            'bound_state',
+            lambda br, tr: self.proteins(tr)[:, 8:10, :] > -1,
+            None, ts_range)
+
+    def n_bound_ends(self, ts_range=None):
+        """(nproteins, nframes) number of bound ends of every protein."""
+        return self._ranged(
+            'n_bound_ends',
+            lambda br, tr: self.bound_state(tr).sum(axis=1),
+            None, ts_range)
+
+
+def get_sim_data(h5_data):
+    """SimulationData wrapping an open raw data file, or the object itself if
+    it already is one."""
+    if isinstance(h5_data, SimulationData):
+        return h5_data
+    return SimulationData(h5_data)
+
+
+@contextmanager
+def open_sim_data(source, mode='r'):
+    """Context manager yielding a SimulationData. A SimulationData passed in
+    is yielded as is and left open; a path is opened and closed after."""
+    if isinstance(source, SimulationData):
+        yield source
+        return
+    with SimulationData(source, mode) as sim:
+        yield sim
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: time_blocks.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Iterate over a raw data file in blocks of frames so analyses
+can stream a run instead of loading the full (N, ncols, T) arrays. The next
+block is read on a background thread while the current one is processed.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .raw_schema import get_raw_dset
+
+BLOCK_KINDS = ('com', 'sylinders', 'proteins')
+
+TimeBlock = namedtuple('TimeBlock', ['data', 'time', 'frames', 'core'])
+TimeBlock.__doc__ = """Block of frames of a raw data set.
+
+data : (N, ..., n) ndarray
+    Data of the n frames in the block, frame axis last
+time : (n,) ndarray
+    Time of every frame in the block
+frames : (n,) ndarray of int
+    Frame index of every frame in the block
+core : slice
+    Frames of the block (along the last axis) that are not overlap with
+    neighbouring blocks. Concatenating data[..., core] over all blocks gives
+    every selected frame exactly once.
+"""
+
+
+def get_block_bounds(nframes, block_size, overlap=0):
+    """(start, stop, core start, core stop) of the blocks of nframes frames,
+    in units of selected frames. Blocks have block_size core frames plus up
+    to overlap frames on either side.
+
+    @param nframes: Number of frames to split
+    @param block_size: Core frames per block
+    @param overlap: Extra frames read before and after each core
+    @return: list of (start, stop, core_start, core_stop)
+
+    """
+    if block_size < 1:
+        raise ValueError("Block size must be at least one frame.")
+    if overlap < 0:
+        raise ValueError("Block overlap can not be negative.")
+    bounds = []
+    for core_start in range(0, nframes, block_size):
+        core_stop = min(core_start + block_size, nframes)
+        bounds += [(max(core_start - overlap, 0),
+                    min(core_stop + overlap, nframes),
+                    core_start, core_stop)]
+    return bounds
+
+
+def _read_block(h5_data, kind, bead_slice, frame_slice):
+    if kind == 'proteins':
+        return get_raw_dset(h5_data, 'proteins')[bead_slice, :, frame_slice]
+    sy_dat = get_raw_dset(h5_data, 'sylinders')[bead_slice, :, frame_slice]
+    if kind == 'com':
+        return .5 * (sy_dat[:, 2:5, :] + sy_dat[:, 5:8, :])
+    return sy_dat
+
+
+def iter_time_blocks(h5_data, kind='com', block_size=256, stride=1, overlap=0,
+                     ts_range=(0, None), bead_range=(0, None), prefetch=True):
+    """Iterate over a raw data file in aligned blocks of frames.
+
+    Parameters
+    ----------
+    h5_data : h5py.File, ArrayStore or SimulationData
+        Raw data file
+    kind : str, optional
+        'com' (sylinder centers of mass, (N, 3, n)), 'sylinders' (N, 9, n)
+        or 'proteins' (N, 10, n), by default 'com'
+    block_size : int, optional
+        Number of selected frames per block, not counting overlap, by
+        default 256
+    stride : int, optional
+        Only use every stride-th frame of ts_range, by default 1
+    overlap : int, optional
+        Number of selected frames added before and after every block for
+        windowed filters, by default 0. See TimeBlock.core.
+    ts_range : tuple, optional
+        (start, stop) frames to iterate over, by default (0, None)
+    bead_range : tuple, optional
+        (start, stop) sylinders or proteins to read, by default (0, None)
+    prefetch : bool, optional
+        Read the next block on a background thread while the current block
+        is processed, by default True
+
+    Yields
+    ------
+    TimeBlock
+        Data, time, frame indices, and core slice of each block
+    """
+    if kind not in BLOCK_KINDS:
+        raise ValueError(f'Block kind "{kind}" is not one of {BLOCK_KINDS}.')
+    if stride < 1:
+        raise ValueError("Stride must be at least one frame.")
+    time_dset = h5_data['time']
+    frames = np.arange(time_dset.shape[0])[
+        ts_range[0]:ts_range[-1]][::stride]
+    bead_slice = slice(bead_range[0], bead_range[-1])
+    bounds = get_block_bounds(frames.size, block_size, overlap)
+
+    def read(bound):
+        start, stop, core_start, core_stop = bound
+        block_frames = frames[start:stop]
+        frame_slice = slice(block_frames[0], block_frames[-1] + 1, stride)
+        return TimeBlock(_read_block(h5_data, kind, bead_slice, frame_slice),
+                         time_dset[frame_slice], block_frames,
+                         slice(core_start - start, core_stop - start))
+
+    if not prefetch:
+        yield from map(read, bounds)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(read, bounds[0]) if bounds else None
+        for i in range(len(bounds)):
+            block = future.result()
+            if i + 1 < len(bounds):
+                future = executor.submit(read, bounds[i + 1])
+            yield block
+
+
+##########################################
+if __name__ == "__main__":
+    print("Not implemented.")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: conftest.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Shared fixtures of synthetic simulation data.
+"""
+
+import h5py
+import numpy as np
+import pytest
+import yaml
+
+NBEADS = 40
+NPROTS = 12
+NFRAMES = 30
+
+
+def make_chain_com(nbeads=NBEADS, nframes=NFRAMES, seed=0):
+    """(nbeads, 3, nframes) random walk chain that moves in time."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(scale=.01, size=(nbeads, 3, 1))
+    moves = rng.normal(scale=.002, size=(nbeads, 3, nframes))
+    return np.cumsum(steps, axis=0) + np.cumsum(moves, axis=-1)
+
+
+def write_raw_h5(path, com_arr, seed=0, run_params=None):
+    """Write a packed raw data file of a chain of beads with bead centers
+    com_arr and randomly bound proteins."""
+    rng = np.random.default_rng(seed)
+    nbeads, _, nframes = com_arr.shape
+    direc = np.zeros((nbeads, 3, nframes))
+    direc[:, 2] = .005
+    sy_dat = np.zeros((nbeads, 9, nframes))
+    sy_dat[:, 0] = np.arange(nbeads)[:, np.newaxis]
+    sy_dat[:, 1] = .01
+    sy_dat[:, 2:5] = com_arr - direc
+    sy_dat[:, 5:8] = com_arr + direc
+
+    prot_dat = rng.normal(size=(NPROTS, 10, nframes))
+    prot_dat[:, 0] = np.arange(NPROTS)[:, np.newaxis]
+    prot_dat[:, 8:10] = rng.integers(-1, nbeads, size=(NPROTS, 2, nframes))
+
+    params = {'rngSeed': seed, 'timeSnap': .1, 'KBT': .00411,
+              'linkKappa': 100., 'linkGap': .002,
+              'sylinderDiameter': .02,
+              'simBoxLow': [-1., -1., -1.], 'simBoxHigh': [1., 1., 1.],
+              'simBoxPBC': [False, False, False]}
+    params.update(run_params or {})
+    with h5py.File(path, 'w') as h5_data:
+        h5_data.attrs['RunConfig'] = yaml.dump(params)
+        h5_data.attrs['ProteinConfig'] = yaml.dump({'proteins': []})
+        h5_data.create_dataset('time', data=.1 * np.arange(nframes))
+        posit_grp = h5_data.create_group('raw_data')
+        posit_grp.create_dataset('sylinders', data=sy_dat)
+        posit_grp.create_dataset('proteins', data=prot_dat)
+    return path
+
+
+def format_row(row, int_cols):
+    """Ascii frame file line of a data row with integer id columns."""
+    return ' '.join(str(int(v)) if i in int_cols else repr(float(v))
+                    for i, v in enumerate(row))
+
+
+def write_result_dir(path, nframes=7, nsyl=6, nprot=4, seed=0, ragged=False,
+                     per_dir=3):
+    """Write an aLENS result directory of SylinderAscii and ProteinAscii
+    frames (objects in shuffled gid order, plus one 'L' sylinder that is
+    not collected) and its config files. With ragged the number of proteins
+    changes from frame to frame.
+
+    @return: list of (time, (nsyl, 9) array, (nprot, 10) array) per frame,
+             sorted by gid, as collection should store them
+    """
+    rng = np.random.default_rng(seed)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / 'RunConfig.yaml').write_text(yaml.dump({'timeSnap': .1}))
+    (path / 'ProteinConfig.yaml').write_text(yaml.dump({'proteins': []}))
+    frames = []
+    for i in range(nframes):
+        frame_dir = path / 'result' / f'result{i // per_dir * per_dir}-{(i // per_dir + 1) * per_dir - 1}'
+        frame_dir.mkdir(parents=True, exist_ok=True)
+        t = round(.1 * i, 6)
+        syl = np.column_stack([np.arange(nsyl), np.full(nsyl, .01),
+                               rng.normal(size=(nsyl, 6)).round(6),
+                               np.zeros(nsyl)])
+        n_p = nprot + (i % 3 if ragged else 0)
+        prot = np.column_stack([np.arange(n_p), np.zeros(n_p),
+                                rng.normal(size=(n_p, 6)).round(6),
+                                rng.integers(-1, nsyl, size=(n_p, 2))])
+        lines = [f'C {format_row(row, [0, 8])}'
+                 for row in syl] + [f'L {nsyl} .01 0 0 0 0 0 1 0']
+        order = rng.permutation(len(lines))
+        (frame_dir / f'SylinderAscii_{i}.dat').write_text(
+            f'{nsyl + 1}\n{t}\n' + '\n'.join(lines[j] for j in order) + '\n')
+        lines = [f'P {format_row(row, [0, 1, 8, 9])}' for row in prot]
+        order = rng.permutation(len(lines))
+        (frame_dir / f'ProteinAscii_{i}.dat').write_text(
+            f'{n_p}\n{t}\n' + '\n'.join(lines[j] for j in order) + '\n')
+        frames += [(t, syl, prot)]
+    return frames
+
+
+@pytest.fixture
+def chain_com():
+    return make_chain_com()
+
+
+@pytest.fixture
+def raw_h5_path(tmp_path, chain_com):
+    return write_raw_h5(tmp_path / 'raw_test.h5', chain_com)
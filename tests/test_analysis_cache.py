@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_analysis_cache.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Parameter-keyed cache of analysis products.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.analysis_cache import (AnalysisCache, get_func_id,
+                                           get_source_id, UNKEYED_GRP_NAME)
+
+
+def product(scale):
+    return np.arange(4) * scale
+
+
+def product_edited(scale):
+    return np.arange(5) * scale
+
+
+def product_names(scale):
+    return np.ones(4) * scale
+
+
+def product_names_edited(scale):
+    return np.zeros(4) * scale
+
+
+def test_func_id_sees_consts_and_names():
+    # Same byte code, different constant
+    assert product.__code__.co_code == product_edited.__code__.co_code
+    assert (get_func_id(product).split(':')[-1] !=
+            get_func_id(product_edited).split(':')[-1])
+    # Same byte code, different attribute name
+    assert (product_names.__code__.co_code ==
+            product_names_edited.__code__.co_code)
+    assert (get_func_id(product_names).split(':')[-1] !=
+            get_func_id(product_names_edited).split(':')[-1])
+    assert get_func_id(product) == get_func_id(product)
+    assert get_func_id(product, version=2) != get_func_id(product)
+
+
+def test_lookup_and_store(raw_h5_path, tmp_path):
+    with h5py.File(raw_h5_path, 'r') as h5_data:
+        source_id = get_source_id(h5_data)
+    with h5py.File(tmp_path / 'anal.h5', 'w') as h5_anal:
+        analysis = h5_anal.create_group('analysis')
+        cache = AnalysisCache(analysis, source_id)
+        entry, hit = cache.lookup('prod', product, {'scale': 2})
+        assert not hit
+        entry['prod'] = product(2)
+        cache.store(entry)
+
+        entry, hit = cache.lookup('prod', product, {'scale': 2})
+        assert hit
+        np.testing.assert_array_equal(analysis['prod'][...], product(2))
+
+        # New parameters or version make a new entry and move the link
+        entry3, hit = cache.lookup('prod', product, {'scale': 3})
+        assert not hit
+        entry3['prod'] = product(3)
+        cache.store(entry3)
+        np.testing.assert_array_equal(analysis['prod'][...], product(3))
+        _, hit = cache.lookup('prod', product, {'scale': 3}, version=1)
+        assert not hit
+
+
+def test_unkeyed_products_are_kept(tmp_path):
+    with h5py.File(tmp_path / 'anal.h5', 'w') as h5_anal:
+        analysis = h5_anal.create_group('analysis')
+        analysis['prod'] = np.full(4, -1.)
+        cache = AnalysisCache(analysis, 'source')
+        entry, _ = cache.lookup('prod', product, {'scale': 2})
+        entry['prod'] = product(2)
+        with pytest.warns(UserWarning):
+            cache.store(entry)
+        np.testing.assert_array_equal(analysis['prod'][...], product(2))
+        np.testing.assert_array_equal(
+            cache.cache_grp[UNKEYED_GRP_NAME]['prod'][...], -1.)
+        assert [e.name for e in cache.entries()] == [entry.name]
+
+
+def test_evict_least_recently_used(tmp_path):
+    with h5py.File(tmp_path / 'anal.h5', 'w') as h5_anal:
+        analysis = h5_anal.create_group('analysis')
+        cache = AnalysisCache(analysis, 'source', max_bytes=None)
+        for scale in range(3):
+            entry, _ = cache.lookup('prod', product, {'scale': scale})
+            entry['prod'] = product(scale).astype(float)
+            cache.store(entry)
+        # A new cache has not used any entry, so all can be evicted
+        cache = AnalysisCache(analysis, 'source', max_bytes=32)
+        cache.evict()
+        entries = cache.entries()
+        assert len(entries) == 1
+        np.testing.assert_array_equal(entries[0]['prod'][...], product(2))
+        np.testing.assert_array_equal(analysis['prod'][...], product(2))
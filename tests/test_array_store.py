@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_array_store.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Array store exports of raw data files.
+"""
+
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.array_store import (export_raw_store, open_raw_data,
+                                        find_raw_data, ArrayStore)
+from alens_analysis.read_func import convert_dat_to_hdf
+from alens_analysis.raw_schema import get_raw_dset, get_ragged_raw
+from alens_analysis.time_blocks import iter_time_blocks
+
+from .conftest import write_result_dir
+
+
+def assert_store_matches(h5_path, store_path):
+    with h5py.File(h5_path, 'r') as h5_data, \
+            open_raw_data(store_path) as store:
+        assert isinstance(store, ArrayStore)
+        assert store.attrs['RunConfig'] == h5_data.attrs['RunConfig']
+
+        def check(name, obj):
+            assert name in store
+            if isinstance(obj, h5py.Dataset):
+                arr = store[name]
+                assert arr.dtype == obj.dtype
+                np.testing.assert_array_equal(arr[...], obj[...])
+                np.testing.assert_array_equal(arr[..., :2], obj[..., :2])
+                for key, val in obj.attrs.items():
+                    np.testing.assert_array_equal(arr.attrs[key], val)
+        h5_data.visititems(check)
+
+
+@pytest.mark.parametrize('schema', ['packed', 'split'])
+def test_npy_store_round_trip(tmp_path, schema):
+    write_result_dir(tmp_path / 'run')
+    h5_path = tmp_path / 'raw.h5'
+    convert_dat_to_hdf(h5_path, tmp_path / 'run', schema=schema, store='npy')
+    store_path = find_raw_data(h5_path)
+    assert store_path != h5_path
+    assert_store_matches(h5_path, store_path)
+    # Frames and rows are copied a few at a time
+    assert_store_matches(h5_path, export_raw_store(
+        h5_path, 'npy', tmp_path / 'blocks.npystore', frames_per_copy=2,
+        rows_per_copy=3))
+
+    with h5py.File(h5_path, 'r') as h5_data, \
+            open_raw_data(store_path) as store:
+        for kind in ('sylinders', 'proteins'):
+            np.testing.assert_array_equal(get_raw_dset(store, kind)[1:3, :, 2],
+                                          get_raw_dset(h5_data, kind)[1:3, :, 2])
+        for h5_block, store_block in zip(
+                iter_time_blocks(h5_data, block_size=3),
+                iter_time_blocks(store, block_size=3)):
+            np.testing.assert_array_equal(store_block.data, h5_block.data)
+            np.testing.assert_array_equal(store_block.time, h5_block.time)
+
+    # A raw data file written after the export is used instead of the store
+    mtime = os.stat(store_path / '.exported').st_mtime
+    os.utime(h5_path, (mtime + 10, mtime + 10))
+    assert find_raw_data(h5_path) == h5_path
+
+
+def test_ragged_store(tmp_path):
+    write_result_dir(tmp_path / 'run', ragged=True)
+    h5_path = tmp_path / 'raw.h5'
+    convert_dat_to_hdf(h5_path, tmp_path / 'run', schema='ragged')
+    # Rows are copied a few at a time
+    store_path = export_raw_store(h5_path, 'npy', rows_per_copy=5)
+    assert_store_matches(h5_path, store_path)
+    with h5py.File(h5_path, 'r') as h5_data, \
+            open_raw_data(store_path) as store:
+        h5_prot = get_ragged_raw(h5_data, 'proteins')
+        store_prot = get_ragged_raw(store, 'proteins')
+        for i in range(h5_prot.nframes):
+            np.testing.assert_array_equal(store_prot.get_frame(i),
+                                          h5_prot.get_frame(i))
+        for arr_a, arr_b in zip(store_prot.get_gid(1), h5_prot.get_gid(1)):
+            np.testing.assert_array_equal(arr_a, arr_b)
+
+
+def test_zarr_store(tmp_path):
+    pytest.importorskip('zarr')
+    write_result_dir(tmp_path / 'run')
+    h5_path = tmp_path / 'raw.h5'
+    convert_dat_to_hdf(h5_path, tmp_path / 'run')
+    assert_store_matches(h5_path, export_raw_store(h5_path, 'zarr'))
+
+
+def test_store_is_read_only(tmp_path):
+    write_result_dir(tmp_path / 'run')
+    h5_path = tmp_path / 'raw.h5'
+    convert_dat_to_hdf(h5_path, tmp_path / 'run')
+    with pytest.raises(ValueError):
+        open_raw_data(export_raw_store(h5_path, 'npy'), mode='a')
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_chrom_poly_stats.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: P(s) curves against a per-diagonal reference.
+"""
+
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from alens_analysis.chromatin.chrom_poly_stats import (dist_vs_idx_dist,
+                                                       contact_vs_idx_dist,
+                                                       get_idx_dist_stats)
+
+
+def diag_means(mat):
+    """Baseline reduction: mean of every upper diagonal."""
+    return np.array([np.diagonal(mat, i).mean()
+                     for i in range(1, mat.shape[0])])
+
+
+def sep_mats(com_arr):
+    return np.linalg.norm(com_arr[:, np.newaxis] - com_arr[np.newaxis],
+                          axis=2)
+
+
+def test_single_frame_matches_baseline(chain_com):
+    com_arr = chain_com[:, :, 0]
+    sep_mat = sep_mats(com_arr)
+    avg_dist = dist_vs_idx_dist(com_arr)
+    avg_cont = contact_vs_idx_dist(com_arr, .03)
+    assert avg_dist.dtype == torch.float32
+    assert avg_cont.dtype == torch.float32
+    np.testing.assert_allclose(avg_dist.numpy(), diag_means(sep_mat),
+                               rtol=1e-5)
+    np.testing.assert_allclose(avg_cont.numpy(),
+                               diag_means((sep_mat < .03).astype(float)),
+                               rtol=1e-5)
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 256])
+def test_time_average_matches_baseline(chain_com, block_size):
+    sep_mat = sep_mats(chain_com)
+    ref_dist = np.mean([diag_means(sep_mat[:, :, t])
+                        for t in range(sep_mat.shape[-1])], axis=0)
+    ref_cont = np.mean([diag_means((sep_mat[:, :, t] < .03).astype(float))
+                        for t in range(sep_mat.shape[-1])], axis=0)
+    idx_dist, avg_dist, avg_cont = get_idx_dist_stats(
+        chain_com, .03, block_size=block_size)
+    np.testing.assert_array_equal(idx_dist, np.arange(1, chain_com.shape[0]))
+    np.testing.assert_allclose(avg_dist, ref_dist)
+    np.testing.assert_allclose(avg_cont, ref_cont)
+
+
+def test_per_frame_and_cutoff(chain_com):
+    _, avg_dist, _ = get_idx_dist_stats(chain_com, per_frame=True,
+                                        max_idx_dist=5, block_size=4)
+    assert avg_dist.shape == (5, chain_com.shape[-1])
+    ref = diag_means(sep_mats(chain_com[:, :, 3]))[:5]
+    np.testing.assert_allclose(avg_dist[:, 3], ref)
+
+
+def test_file_source_writes_analysis(raw_h5_path, chain_com, tmp_path):
+    with h5py.File(raw_h5_path, 'r') as h5_data, \
+            h5py.File(tmp_path / 'anal.h5', 'w') as h5_anal:
+        _, avg_dist, avg_cont = get_idx_dist_stats(
+            h5_data, .03, block_size=8, analysis=h5_anal)
+        _, ref_dist, _ = get_idx_dist_stats(chain_com, .03)
+        np.testing.assert_allclose(avg_dist, ref_dist)
+        dset = h5_anal['idx_dist_avg_dist']
+        np.testing.assert_array_equal(dset.attrs['timestep_range'],
+                                      [0, chain_com.shape[-1]])
+        np.testing.assert_array_equal(dset.attrs['bead_range'],
+                                      [0, chain_com.shape[0]])
+        assert h5_anal['idx_dist_contact_prob'].attrs['contact_thresh'] == .03
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_condensate_graphs.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Full condensate analysis of a run against the dense baseline
+analyses, and the cached rerun.
+"""
+
+from argparse import Namespace
+
+import h5py
+import matplotlib
+import numpy as np
+import pytest
+
+from alens_analysis.chromatin.chrom_analysis import (get_contact_mat_analysis,
+                                                     smooth_kymo_mat)
+from alens_analysis.chromatin.chrom_graph_funcs import \
+    make_all_condensate_graphs
+from alens_analysis.helpers import contiguous_regions
+
+from .conftest import make_chain_com, write_raw_h5
+
+matplotlib.use('Agg')
+
+# The condensate windows of make_all_condensate_graphs need more than 101
+# beads and 201 frames
+NBEADS = 110
+NFRAMES = 212
+
+
+def baseline_cond_edges(time_arr, kymo, threshold, bead_win, time_win,
+                        centers=None):
+    """Per time point condensate edges, as computed before batching."""
+    smooth = smooth_kymo_mat(kymo, bead_win, time_win)
+    edges, nums = [], []
+    for i, t in enumerate(time_arr):
+        regions = contiguous_regions(smooth[:, i] > threshold)
+        nums += [len(regions)]
+        for start, end in regions:
+            edges += [[t, start, end] if centers is None else
+                      [t, centers[start], centers[end]]]
+    return np.asarray(edges), np.asarray(nums)
+
+
+@pytest.fixture(scope='module')
+def condensate_run(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('cond')
+    com_arr = make_chain_com(NBEADS, NFRAMES, seed=3)
+    raw_path = write_raw_h5(tmp_path / 'raw.h5', com_arr)
+    opts = Namespace(analysis_dir=tmp_path)
+    with h5py.File(raw_path, 'a') as h5_data:
+        sy_dat = h5_data['raw_data/sylinders'][...]
+        make_all_condensate_graphs(h5_data, opts)
+    # Centers as read back from the file; analyses use frames [0, -1)
+    com_arr = .5 * (sy_dat[:, 2:5, :-1] + sy_dat[:, 5:8, :-1])
+    return raw_path, com_arr, opts
+
+
+def read_products(raw_path):
+    names = ['avg_contact_mat', 'contact_kymo', 'contact_cond_edges',
+             'contact_cond_num', 'pos_kymo', 'pos_cond_edges', 'pos_cond_num']
+    with h5py.File(raw_path, 'r') as h5_data:
+        return {name: h5_data['analysis'][name][...] for name in names}
+
+
+def test_contacts_match_baseline(condensate_run):
+    raw_path, com_arr, _ = condensate_run
+    avg_ref, _, kymo_ref = get_contact_mat_analysis(com_arr, .02)
+    products = read_products(raw_path)
+    np.testing.assert_allclose(products['avg_contact_mat'], avg_ref,
+                               rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(products['contact_kymo'], kymo_ref,
+                               rtol=1e-6, atol=1e-9)
+
+    time_arr = .1 * np.arange(NFRAMES - 1)
+    edges_ref, num_ref = baseline_cond_edges(
+        time_arr, products['contact_kymo'], 3.5, 101, 201)
+    np.testing.assert_array_equal(products['contact_cond_edges'], edges_ref)
+    np.testing.assert_array_equal(products['contact_cond_num'], num_ref)
+
+
+def test_pos_kymo_matches_baseline(condensate_run):
+    raw_path, com_arr, _ = condensate_run
+    proj_vec = com_arr[-1, :, 0] - com_arr[0, :, 0]
+    proj_vec /= np.linalg.norm(proj_vec)
+    proj_arr = np.einsum('ijk,j->ik', com_arr, proj_vec)
+    hist_range = (np.dot([-1., -1., -1.], proj_vec),
+                  np.dot([1., 1., 1.], proj_vec))
+    hist_ref = np.asarray([np.histogram(proj, bins=200, range=hist_range)[0]
+                           for proj in proj_arr.T]).T
+    bin_edges = np.histogram(proj_arr[:, 0], bins=200, range=hist_range)[1]
+    products = read_products(raw_path)
+    np.testing.assert_allclose(products['pos_kymo'], hist_ref)
+
+    time_arr = .1 * np.arange(NFRAMES - 1)
+    edges_ref, num_ref = baseline_cond_edges(
+        time_arr, hist_ref, 10, 0, 201, .5 * (bin_edges[:-1] + bin_edges[1:]))
+    np.testing.assert_allclose(products['pos_cond_edges'], edges_ref)
+    np.testing.assert_array_equal(products['pos_cond_num'], num_ref)
+
+
+def test_rerun_uses_cache(condensate_run):
+    raw_path, _, opts = condensate_run
+    before = read_products(raw_path)
+    with h5py.File(raw_path, 'r') as h5_data:
+        nentries = {name: len(grp)
+                    for name, grp in h5_data['analysis/cache'].items()}
+    with h5py.File(raw_path, 'a') as h5_data:
+        make_all_condensate_graphs(h5_data, opts)
+    after = read_products(raw_path)
+    for name in before:
+        np.testing.assert_array_equal(after[name], before[name])
+    with h5py.File(raw_path, 'r') as h5_data:
+        assert nentries == {name: len(grp) for name, grp in
+                            h5_data['analysis/cache'].items()}
+    for fig_name in ('pos_kymo.png', 'average_log_contact.png',
+                     'contact_cond_charact.png', 'contact_cond_track.png',
+                     'tension_kymo.png', 'tension_hists.png'):
+        assert (opts.analysis_dir / fig_name).exists()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_contact_analysis.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Streamed and sparse contact matrix analyses against the dense
+analysis.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.chromatin.chrom_analysis import (
+    get_contact_mat_analysis, stream_contact_mat_analysis,
+    sparse_contact_mat_analysis, sparse_gauss_weighted_contact,
+    gauss_weighted_contact, find_neighbors, get_contact_cond_data,
+    smooth_kymo_mat)
+from alens_analysis.helpers import contiguous_regions
+
+
+def sep_dists(com_arr):
+    return np.linalg.norm(com_arr[:, np.newaxis] - com_arr[np.newaxis],
+                          axis=-1)
+
+
+@pytest.mark.parametrize('kernel', ['numpy', 'numba'])
+@pytest.mark.parametrize('log', [True, False])
+def test_stream_array_matches_dense(chain_com, kernel, log):
+    avg_ref, _, kymo_ref = get_contact_mat_analysis(chain_com, .02, log=log)
+    # A small budget splits the run into many blocks
+    avg_mat, _, kymo = stream_contact_mat_analysis(
+        chain_com, .02, log=log, mem_bytes=2**16, kernel=kernel)
+    np.testing.assert_allclose(avg_mat, avg_ref, rtol=1e-10)
+    np.testing.assert_allclose(kymo, kymo_ref, rtol=1e-10, atol=1e-12)
+
+
+def test_stream_file_matches_dense(raw_h5_path, chain_com):
+    ts_range, bead_range = (3, 25), (5, 35)
+    sub_com = chain_com[5:35, :, 3:25]
+    avg_ref, contact_ref, kymo_ref = get_contact_mat_analysis(sub_com, .02)
+    with h5py.File(raw_h5_path, 'r') as h5_data, \
+            h5py.File(raw_h5_path.with_name('anal.h5'), 'w') as h5_anal:
+        avg_mat, contact_dset, kymo = stream_contact_mat_analysis(
+            h5_data, .02, mem_bytes=2**16, store_contact_mat=True,
+            ts_range=ts_range, bead_range=bead_range, analysis=h5_anal)
+        np.testing.assert_allclose(avg_mat, avg_ref, rtol=1e-8)
+        np.testing.assert_allclose(kymo, kymo_ref, rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(contact_dset[...], contact_ref,
+                                   rtol=1e-6, atol=1e-7)
+        np.testing.assert_allclose(h5_anal['avg_contact_mat'][...], avg_ref,
+                                   rtol=1e-8)
+        np.testing.assert_allclose(h5_anal['contact_kymo'][...], kymo_ref,
+                                   rtol=1e-8, atol=1e-10)
+
+
+def test_stream_bad_options(chain_com):
+    with pytest.raises(ValueError):
+        stream_contact_mat_analysis(chain_com, kernel='cuda')
+    with pytest.raises(ValueError):
+        stream_contact_mat_analysis(chain_com, kernel='numba',
+                                    store_contact_mat=True)
+    with pytest.raises(ValueError):
+        stream_contact_mat_analysis(chain_com, store_contact_mat=True)
+
+
+@pytest.mark.parametrize('radius', [None, .005])
+def test_sparse_frame_matches_dense(chain_com, radius):
+    com_arr = chain_com[:, :, 0]
+    radius_arr = None if radius is None else np.full(com_arr.shape[0], radius)
+    dense = gauss_weighted_contact(sep_dists(com_arr)[:, :, np.newaxis],
+                                   .02, radius_arr)[:, :, 0]
+    sparse = sparse_gauss_weighted_contact(com_arr, .02, radius_arr,
+                                           n_sigma=5.).toarray()
+    # Only weights below exp(-n_sigma**2 / 2) are dropped
+    kept = sparse != 0
+    np.testing.assert_allclose(sparse[kept], dense[kept], rtol=1e-12)
+    assert dense[~kept].max(initial=0.) <= np.exp(-5. ** 2 / 2.)
+
+
+def test_sparse_analysis_matches_dense(raw_h5_path, chain_com):
+    avg_ref, _, kymo_ref = get_contact_mat_analysis(chain_com, .02, log=False)
+    # A cutoff beyond every pair keeps the full matrix
+    avg_mat, contact_mats, kymo = sparse_contact_mat_analysis(
+        chain_com, .02, log=False, n_sigma=100., keep_frames=True)
+    np.testing.assert_allclose(avg_mat.toarray(), avg_ref, rtol=1e-10)
+    np.testing.assert_allclose(kymo, kymo_ref, rtol=1e-10, atol=1e-12)
+    assert len(contact_mats) == chain_com.shape[-1]
+
+    with h5py.File(raw_h5_path, 'r') as h5_data:
+        log_avg, _, kymo = sparse_contact_mat_analysis(
+            h5_data, .02, n_sigma=100., block_size=7)
+    np.testing.assert_allclose(log_avg, np.log(avg_ref), rtol=1e-8)
+    np.testing.assert_allclose(kymo, kymo_ref, rtol=1e-8, atol=1e-10)
+
+
+def test_sparse_neighbors_match_dense(chain_com):
+    dense = find_neighbors(chain_com, .02, time_ind=4)
+    sparse = find_neighbors(chain_com, .02, time_ind=4, sparse=True)
+    np.testing.assert_array_equal(sparse.toarray(), dense)
+
+
+@pytest.mark.parametrize('windows', [(0, 0), (5, 7)])
+def test_contact_cond_edges_match_baseline(chain_com, windows):
+    _, _, kymo = get_contact_mat_analysis(chain_com, .02)
+    time_arr = .1 * np.arange(kymo.shape[1])
+    threshold = np.median(kymo)
+    # Per time point loop of the baseline implementation
+    smooth = smooth_kymo_mat(kymo, *windows)
+    ref_edges, ref_num = [], []
+    for i, t in enumerate(time_arr):
+        edges = contiguous_regions(smooth[:, i] > threshold)
+        ref_num += [len(edges)]
+        ref_edges += [[t, start, end] for start, end in edges]
+    edges, cond_num = get_contact_cond_data(time_arr, kymo, threshold,
+                                            *windows)
+    np.testing.assert_array_equal(edges, np.asarray(ref_edges))
+    np.testing.assert_array_equal(cond_num, ref_num)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_contact_kernels.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Fused numba contact kernel against the dense contact analysis.
+"""
+
+import subprocess
+import sys
+import textwrap
+
+import numba
+import numpy as np
+import pytest
+
+from alens_analysis.chromatin.chrom_analysis import (
+    get_contact_mat_analysis, stream_contact_mat_analysis)
+from alens_analysis.chromatin.contact_kernels import (accumulate_contacts,
+                                                      clamp_threads,
+                                                      get_kernel_block_size)
+
+from .conftest import write_result_dir
+
+
+@pytest.mark.parametrize('radius', [None, .01])
+def test_accumulate_matches_dense(chain_com, radius):
+    nbeads, _, nframes = chain_com.shape
+    radius_arr = None if radius is None else np.full(nbeads, radius)
+    avg_ref, _, kymo_ref = get_contact_mat_analysis(
+        chain_com, .02, log=False, radius_arr=radius_arr)
+    contact_sum = np.zeros((nbeads, nbeads))
+    contact_kymo = np.zeros((nbeads, nframes))
+    accumulate_contacts(chain_com, contact_sum, contact_kymo, .02,
+                        radius_arr, threads=2)
+    np.testing.assert_allclose(contact_sum / nframes, avg_ref, rtol=1e-10)
+    np.testing.assert_allclose(contact_kymo, kymo_ref, rtol=1e-10,
+                               atol=1e-12)
+
+
+def test_accumulate_periodic(chain_com):
+    box_size = np.array([.1, 0., .1])
+    avg_ref, _, kymo_ref = get_contact_mat_analysis(
+        chain_com, .02, log=False, box_size=box_size)
+    avg_mat, _, kymo = stream_contact_mat_analysis(
+        chain_com, .02, log=False, kernel='numba', mem_bytes=2**14,
+        box_size=box_size)
+    np.testing.assert_allclose(avg_mat, avg_ref, rtol=1e-10)
+    np.testing.assert_allclose(kymo, kymo_ref, rtol=1e-10, atol=1e-12)
+
+
+def test_threads_are_clamped(chain_com):
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    assert clamp_threads(max_threads + 8) == max_threads
+    assert clamp_threads(0) == 1
+    assert (get_kernel_block_size(40, 2**20, max_threads + 8) ==
+            get_kernel_block_size(40, 2**20, max_threads))
+
+    nbeads, _, nframes = chain_com.shape
+    old_threads = numba.get_num_threads()
+    contact_sum = np.zeros((nbeads, nbeads))
+    # Asking for more threads than numba has does not raise
+    accumulate_contacts(chain_com, contact_sum, np.zeros((nbeads, nframes)),
+                        threads=max_threads + 8)
+    assert numba.get_num_threads() == old_threads
+
+
+def test_parallel_convert_after_kernel(tmp_path):
+    write_result_dir(tmp_path / 'run')
+    # A fresh interpreter, so the kernel's threads are up when the
+    # conversion starts its workers
+    script = textwrap.dedent(f"""
+        from pathlib import Path
+        import numpy as np
+        from alens_analysis.chromatin.contact_kernels import (
+            accumulate_contacts)
+        from alens_analysis.read_func import convert_dat_to_hdf
+
+        com_arr = np.random.default_rng(0).normal(size=(30, 3, 8))
+        accumulate_contacts(com_arr, np.zeros((30, 30)), np.zeros((30, 8)))
+        convert_dat_to_hdf(Path({str(tmp_path / 'raw.h5')!r}),
+                           Path({str(tmp_path / 'run')!r}), workers=2)
+        """)
+    proc = subprocess.run([sys.executable, '-c', script], timeout=240,
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert (tmp_path / 'raw.h5').exists()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_convert.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Collection of ascii frame files into raw data files.
+"""
+
+import zipfile
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.read_func import (read_sylinder_arr, read_sylinder_obj_arr,
+                                      read_sylinder_time_arr, read_xlp_arr,
+                                      read_xlp_obj_arr, read_dat_time,
+                                      convert_dat_to_hdf, get_mp_context)
+from alens_analysis.frame_manifest import get_frame_paths
+
+from .conftest import write_result_dir
+
+
+def h5_contents(path):
+    """Every data set (dtype and values) and attribute of an HDF5 file."""
+    contents = {}
+
+    def add(name, obj):
+        attrs = {k: np.asarray(v).tolist() for k, v in obj.attrs.items()}
+        if isinstance(obj, h5py.Dataset):
+            contents[name] = (obj.dtype.str, obj[...].tobytes(), attrs)
+        else:
+            contents[name] = attrs
+    with h5py.File(path, 'r') as h5_data:
+        contents['/'] = {k: np.asarray(v).tolist()
+                         for k, v in h5_data.attrs.items()}
+        h5_data.visititems(add)
+    return contents
+
+
+def assert_same_h5(path_a, path_b):
+    contents_a, contents_b = h5_contents(path_a), h5_contents(path_b)
+    assert sorted(contents_a) == sorted(contents_b)
+    for name in contents_a:
+        assert contents_a[name] == contents_b[name], name
+
+
+def test_bulk_parsers_match_objects(tmp_path):
+    frames = write_result_dir(tmp_path / 'run')
+    result_dir = tmp_path / 'run' / 'result'
+    sy_paths = get_frame_paths(result_dir, 'SylinderAscii', 'dat')
+    xlp_paths = get_frame_paths(result_dir, 'ProteinAscii', 'dat')
+    for (t, syl, prot), sy_path, xlp_path in zip(frames, sy_paths, xlp_paths):
+        sy_arr = read_sylinder_arr(sy_path)
+        np.testing.assert_array_equal(sy_arr, read_sylinder_obj_arr(sy_path))
+        # Sorted by gid without the 'L' sylinder
+        np.testing.assert_array_equal(sy_arr, syl)
+        t_sy, sy_arr = read_sylinder_time_arr(sy_path)
+        assert t_sy == t == read_dat_time(sy_path)
+        np.testing.assert_array_equal(sy_arr, syl)
+        xlp_arr = read_xlp_arr(xlp_path)
+        np.testing.assert_array_equal(xlp_arr, read_xlp_obj_arr(xlp_path))
+        np.testing.assert_array_equal(xlp_arr, prot)
+
+
+@pytest.mark.parametrize('schema', ['packed', 'split', 'ragged'])
+def test_parallel_matches_serial(tmp_path, schema):
+    frames = write_result_dir(tmp_path / 'run', ragged=(schema == 'ragged'))
+    serial = tmp_path / 'serial.h5'
+    parallel = tmp_path / 'parallel.h5'
+    convert_dat_to_hdf(serial, tmp_path / 'run', schema=schema, workers=1)
+    convert_dat_to_hdf(parallel, tmp_path / 'run', schema=schema, workers=3)
+    # Byte for byte the same data and attributes
+    assert_same_h5(serial, parallel)
+    with h5py.File(serial, 'r') as h5_data:
+        np.testing.assert_array_equal(h5_data['time'][...],
+                                      [t for t, _, _ in frames])
+
+
+def test_workers_are_not_forked():
+    # Forked workers of a process running numba or h5py threads can hang
+    assert get_mp_context().get_start_method() in ('forkserver', 'spawn')
+
+
+@pytest.mark.parametrize('schema', ['packed', 'split', 'ragged'])
+def test_append_matches_full(tmp_path, schema):
+    ragged = schema == 'ragged'
+    write_result_dir(tmp_path / 'full_run', ragged=ragged)
+    full = tmp_path / 'full.h5'
+    convert_dat_to_hdf(full, tmp_path / 'full_run', schema=schema)
+
+    # Same first frames, then the rest of the run is written and appended
+    write_result_dir(tmp_path / 'run', nframes=4, ragged=ragged)
+    appended = tmp_path / 'appended.h5'
+    convert_dat_to_hdf(appended, tmp_path / 'run', schema=schema)
+    write_result_dir(tmp_path / 'run', ragged=ragged)
+    convert_dat_to_hdf(appended, tmp_path / 'run', append=True)
+    assert_same_h5(full, appended)
+
+
+@pytest.mark.parametrize('schema', ['packed', 'split', 'ragged'])
+def test_resume_matches_full(tmp_path, schema):
+    write_result_dir(tmp_path / 'run', ragged=(schema == 'ragged'))
+    full = tmp_path / 'full.h5'
+    resumed = tmp_path / 'resumed.h5'
+    convert_dat_to_hdf(full, tmp_path / 'run', schema=schema)
+    convert_dat_to_hdf(resumed, tmp_path / 'run', schema=schema)
+
+    # Interrupt the conversion after 2 frames, leaving garbage after them
+    def interrupt(name, obj):
+        if isinstance(obj, h5py.Dataset) and 'nframes_complete' in obj.attrs:
+            obj.attrs['nframes_complete'] = 2
+            if obj.ndim == 3 or name == 'time':
+                obj[..., 2:] = -1
+    with h5py.File(resumed, 'a') as h5_data:
+        h5_data.visititems(interrupt)
+
+    convert_dat_to_hdf(resumed, tmp_path / 'run', append=True)
+    assert_same_h5(full, resumed)
+
+
+def test_zip_matches_directory(tmp_path):
+    write_result_dir(tmp_path / 'run')
+    zip_run = tmp_path / 'zip_run'
+    zip_run.mkdir()
+    for name in ('RunConfig.yaml', 'ProteinConfig.yaml'):
+        (zip_run / name).write_bytes((tmp_path / 'run' / name).read_bytes())
+    # Frames stored in reverse order
+    with zipfile.ZipFile(zip_run / 'result.zip', 'w',
+                         zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted((tmp_path / 'run').glob('result/*/*.dat'),
+                           reverse=True):
+            zf.write(path, path.relative_to(tmp_path / 'run'))
+    convert_dat_to_hdf(tmp_path / 'dir.h5', tmp_path / 'run')
+    convert_dat_to_hdf(tmp_path / 'zip.h5', zip_run, workers=2)
+    assert_same_h5(tmp_path / 'dir.h5', tmp_path / 'zip.h5')
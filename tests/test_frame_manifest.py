@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_frame_manifest.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Frame manifests of result directories.
+"""
+
+import os
+import pickle
+import zipfile
+
+from alens_analysis.frame_manifest import (FrameManifest, ZipFrameIndex,
+                                           get_frame_paths,
+                                           get_zip_frame_members,
+                                           parse_frame_file_name,
+                                           close_zip_handles, _ZIP_HANDLES)
+
+
+def make_result_dir(root, nframes=12, per_dir=5):
+    for i in range(nframes):
+        sub = root / 'result' / f'result{i // per_dir * per_dir}-{(i // per_dir + 1) * per_dir - 1}'
+        sub.mkdir(parents=True, exist_ok=True)
+        (sub / f'SylinderAscii_{i}.dat').write_text(f'frame {i}\n')
+        (sub / f'ProteinAscii_{i}.dat').write_text(f'frame {i}\n')
+    (root / 'result' / 'notes.txt').write_text('not a frame')
+
+
+def test_parse_frame_file_name():
+    assert parse_frame_file_name('SylinderAscii_10.dat') == (
+        'SylinderAscii', 10, 'dat')
+    assert parse_frame_file_name('image.00010.png') == ('image', 10, 'png')
+    assert parse_frame_file_name('RunConfig.yaml') is None
+
+
+def test_paths_match_glob(tmp_path):
+    make_result_dir(tmp_path)
+    ref = sorted(tmp_path.glob('result/result*/SylinderAscii_*.dat'),
+                 key=lambda p: int(p.stem.split('_')[-1]))
+    paths = get_frame_paths(tmp_path, 'SylinderAscii', 'dat',
+                            r'result/result.*-.*')
+    assert paths == ref
+    # The saved manifest gives the same answer
+    assert (tmp_path / '.frame_manifest.json').exists()
+    assert get_frame_paths(tmp_path, 'SylinderAscii', 'dat') == ref
+
+
+def test_refresh_new_and_removed_files(tmp_path):
+    make_result_dir(tmp_path)
+    FrameManifest(tmp_path)
+    last = tmp_path / 'result' / 'result10-14'
+    (last / 'SylinderAscii_12.dat').write_text('frame 12\n')
+    os.remove(tmp_path / 'result' / 'result0-4' / 'SylinderAscii_0.dat')
+    frames = [e['frame']
+              for e in FrameManifest(tmp_path).get_entries('SylinderAscii')]
+    assert frames == list(range(1, 13))
+
+
+def test_refresh_restats_growing_files(tmp_path):
+    make_result_dir(tmp_path)
+    FrameManifest(tmp_path)
+    last = tmp_path / 'result' / 'result10-14' / 'SylinderAscii_11.dat'
+    dir_mtime = os.stat(last.parent).st_mtime_ns
+    with last.open('a') as f:
+        f.write('more rows\n' * 10)
+    assert os.stat(last.parent).st_mtime_ns == dir_mtime
+    entry = FrameManifest(tmp_path).get_entries('SylinderAscii')[-1]
+    assert entry['size'] == last.stat().st_size
+    assert entry['mtime'] == last.stat().st_mtime_ns
+
+
+def test_refresh_restats_newest_files_only(tmp_path, monkeypatch):
+    make_result_dir(tmp_path)
+    FrameManifest(tmp_path)
+    stat = os.stat
+    stated = []
+
+    def counting_stat(path, *args, **kwargs):
+        if str(path).endswith('.dat'):
+            stated.append(os.path.basename(path))
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', counting_stat)
+    FrameManifest(tmp_path)
+    assert sorted(stated) == sorted(f'{kind}_{i}.dat'
+                                    for kind in ('SylinderAscii', 'ProteinAscii')
+                                    for i in (4, 9, 11))
+
+
+def make_result_zip(path, frames=(3, 0, 2, 1)):
+    """Archive with frames stored out of order, some of them compressed."""
+    with zipfile.ZipFile(path, 'w') as zf:
+        for i in frames:
+            compress = zipfile.ZIP_DEFLATED if i % 2 else zipfile.ZIP_STORED
+            zf.writestr(f'result/result0-9/SylinderAscii_{i}.dat',
+                        f'frame {i}\n' * (i + 1), compress_type=compress)
+            zf.writestr(f'result/result0-9/ProteinAscii_{i}.dat', 'p\n')
+    return path
+
+
+def test_zip_members(tmp_path):
+    zip_path = make_result_zip(tmp_path / 'result.zip')
+    index = ZipFrameIndex(zip_path)
+    stored = index.get_members('SylinderAscii', 'dat')
+    assert [m.frame for m in stored] == [3, 0, 2, 1]
+    assert [m.header_offset for m in stored] == sorted(
+        m.header_offset for m in stored)
+
+    members = get_zip_frame_members(zip_path, 'SylinderAscii', 'dat')
+    assert [m.frame for m in members] == [0, 1, 2, 3]
+    with zipfile.ZipFile(zip_path) as zf:
+        for m in members:
+            assert m.read_bytes() == zf.read(m.name)
+            assert m.open().read() == zf.read(m.name).decode()
+    # Members survive pickling, as they do when sent to workers
+    assert pickle.loads(pickle.dumps(members[2])).read_bytes() == \
+        members[2].read_bytes()
+
+    assert _ZIP_HANDLES
+    close_zip_handles()
+    assert not _ZIP_HANDLES
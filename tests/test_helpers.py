@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_helpers.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Contiguous region finders.
+"""
+
+import numpy as np
+import pytest
+
+from alens_analysis.helpers import contiguous_regions, batch_contiguous_regions
+
+
+def column_regions(condition):
+    """Baseline: contiguous_regions of every column in turn."""
+    cols, starts, ends = [], [], []
+    for i in range(condition.shape[1]):
+        for start, end in contiguous_regions(condition[:, i]):
+            cols += [i]
+            starts += [start]
+            ends += [end]
+    return np.array(cols, dtype=int), np.array(starts), np.array(ends)
+
+
+@pytest.mark.parametrize('nrows', [1, 2, 17])
+@pytest.mark.parametrize('frac', [0., .3, .7, 1.])
+def test_batch_matches_per_column(nrows, frac):
+    rng = np.random.default_rng(nrows)
+    condition = rng.random((nrows, 23)) < frac
+    # Regions touching both ends and single element regions
+    condition[:, 0] = True
+    condition[-1, 1] = True
+    condition[0, 2] = True
+    cols, starts, ends, nregions = batch_contiguous_regions(condition)
+    ref_cols, ref_starts, ref_ends = column_regions(condition)
+    np.testing.assert_array_equal(cols, ref_cols)
+    np.testing.assert_array_equal(starts, ref_starts)
+    np.testing.assert_array_equal(ends, ref_ends)
+    np.testing.assert_array_equal(
+        nregions, [len(contiguous_regions(condition[:, i]))
+                   for i in range(condition.shape[1])])
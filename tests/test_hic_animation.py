@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_hic_animation.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Hi-C movie frames rendered from a raw data file.
+"""
+
+from argparse import Namespace
+from contextlib import contextmanager
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from alens_analysis.chromatin import hic_animation
+from alens_analysis.chromatin.hic_animation import (hic_frame_from_com,
+                                                    render_hic_movie)
+
+matplotlib.use('Agg')
+
+
+class NullWriter():
+
+    """Movie writer that keeps a copy of the Hi-C image and its color limits
+    of every grabbed frame instead of piping it to ffmpeg."""
+
+    grabbed = []
+    clims = []
+
+    def __init__(self, *args, **kwargs):
+        NullWriter.grabbed = []
+        NullWriter.clims = []
+
+    @contextmanager
+    def saving(self, fig, path, dpi):
+        self.fig = fig
+        yield self
+
+    def grab_frame(self):
+        self.fig.canvas.draw()
+        img = self.fig.axes[0].images[0]
+        NullWriter.grabbed += [np.array(img.get_array())]
+        NullWriter.clims += [img.get_clim()]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_frames_in_order(raw_h5_path, chain_com, tmp_path, monkeypatch,
+                         workers):
+    monkeypatch.setattr(hic_animation, 'FFMpegWriter', NullWriter)
+    opts = Namespace(params={'fps': 5, 'style': 'log_contact', 'vmin': -7,
+                             'dpi': 20},
+                     workers=workers)
+    # Out of order and repeated frames come out as asked
+    frames = [5, 0, 17, 3, 3, 29, 11]
+    fig, ax = plt.subplots(figsize=(2, 2))
+    render_hic_movie(fig, ax, tmp_path / 'movie.mp4', raw_h5_path, frames,
+                     opts)
+    plt.close(fig)
+    assert len(NullWriter.grabbed) == len(frames)
+    for frame, mat, clim in zip(frames, NullWriter.grabbed,
+                                NullWriter.clims):
+        ref, _, _ = hic_frame_from_com(chain_com[:, :, frame], 'log_contact')
+        np.testing.assert_allclose(mat, ref)
+        # Color limits follow every frame, not only the first
+        assert clim == (-7, pytest.approx(ref.max()))
+
+
+def test_fixed_vmax(raw_h5_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(hic_animation, 'FFMpegWriter', NullWriter)
+    opts = Namespace(params={'fps': 5, 'style': 'log_contact', 'vmin': -7,
+                             'vmax': -1, 'dpi': 20})
+    fig, ax = plt.subplots(figsize=(2, 2))
+    render_hic_movie(fig, ax, tmp_path / 'movie.mp4', raw_h5_path, [0, 4],
+                     opts)
+    plt.close(fig)
+    assert NullWriter.clims == [(-7, -1), (-7, -1)]
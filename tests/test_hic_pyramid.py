@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_hic_pyramid.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Multi-resolution contact matrices.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.chromatin.hic_pyramid import (coarsen_contact_mat,
+                                                  write_hic_pyramid,
+                                                  read_hic_level,
+                                                  get_pyramid_bin_size)
+
+
+def block_means(mat, bin_size):
+    """Mean of every bin_size x bin_size block, partial blocks included."""
+    edges = np.append(np.arange(0, mat.shape[0], bin_size), mat.shape[0])
+    return np.array([[mat[a:b, c:d].mean()
+                      for c, d in zip(edges[:-1], edges[1:])]
+                     for a, b in zip(edges[:-1], edges[1:])])
+
+
+@pytest.fixture
+def contact_mat():
+    rng = np.random.default_rng(0)
+    mat = rng.random((37, 37))
+    return mat + mat.T
+
+
+def test_coarsen(contact_mat):
+    coarse = coarsen_contact_mat(contact_mat, 4)
+    assert coarse.shape == (10, 10)
+    assert coarse.sum() == pytest.approx(contact_mat.sum())
+    assert coarse[-1, -1] == contact_mat[36:, 36:].sum()
+
+
+def test_pyramid_levels(contact_mat, tmp_path):
+    with h5py.File(tmp_path / 'pyr.h5', 'w') as h5_file:
+        grp = h5_file.create_group('pyramid')
+        bin_sizes = write_hic_pyramid(grp, contact_mat, min_bins=5)
+        assert bin_sizes == [1, 2, 4, 8]
+        for bin_size in bin_sizes:
+            mat, size, edges = read_hic_level(grp, bin_size=bin_size)
+            assert size == bin_size
+            np.testing.assert_allclose(mat, block_means(contact_mat, bin_size))
+            assert edges[0] == 0 and edges[-1] == 37
+        mat, _, _ = read_hic_level(grp, bin_size=4, mean=False)
+        np.testing.assert_allclose(mat, coarsen_contact_mat(contact_mat, 4))
+
+        assert get_pyramid_bin_size(grp) == 1
+        assert get_pyramid_bin_size(grp, max_bins=10) == 4
+        assert get_pyramid_bin_size(grp, max_bins=2) == 8
+
+
+def test_read_region(contact_mat, tmp_path):
+    with h5py.File(tmp_path / 'pyr.h5', 'w') as h5_file:
+        grp = h5_file.create_group('pyramid')
+        write_hic_pyramid(grp, contact_mat, min_bins=5)
+        full, _, full_edges = read_hic_level(grp, bin_size=4)
+        mat, _, edges = read_hic_level(grp, bin_size=4, bead_range=(6, 30))
+        # Rounded out to whole bins 4 to 32
+        np.testing.assert_array_equal(edges, full_edges[1:9])
+        np.testing.assert_allclose(mat, full[1:8, 1:8])
+        mat, _, edges = read_hic_level(grp, bin_size=4, bead_range=(6, None))
+        np.testing.assert_allclose(mat, full[1:, 1:])
+        assert edges[-1] == 37
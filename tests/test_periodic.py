@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_periodic.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Minimum image separations in (partially) periodic boxes.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from alens_analysis.periodic import (get_box_size, min_image, wrap_positions,
+                                     pair_distances, find_pairs_within,
+                                     periodic_mean)
+
+BOX = np.array([1., 0., 2.])
+
+
+def brute_distances(pos_arr, box_size):
+    """Shortest distance over all neighbouring images."""
+    shifts = np.array(list(itertools.product([-1, 0, 1], repeat=3))) * box_size
+    sep = pos_arr[np.newaxis, :, np.newaxis] - pos_arr[:, np.newaxis,
+                                                       np.newaxis]
+    return np.linalg.norm(sep + shifts, axis=-1).min(axis=-1)
+
+
+def test_get_box_size():
+    params = {'simBoxLow': [0, 0, -1], 'simBoxHigh': [1, 3, 1],
+              'simBoxPBC': [True, False, True]}
+    np.testing.assert_array_equal(get_box_size(params), BOX)
+    params['simBoxPBC'] = [False] * 3
+    assert get_box_size(params) is None
+    assert get_box_size({}) is None
+
+
+def test_min_image_and_wrap():
+    sep = np.array([[.9, 5., -1.5], [-.4, -5., 1.1]])
+    np.testing.assert_allclose(min_image(sep, BOX),
+                               [[-.1, 5., .5], [-.4, -5., -.9]])
+    assert min_image(sep) is sep
+    pos = np.array([[1.2, 7., -.5], [-.3, -7., 4.1]])
+    np.testing.assert_allclose(wrap_positions(pos, BOX),
+                               [[.2, 7., 1.5], [.7, -7., .1]])
+    np.testing.assert_allclose(wrap_positions(pos, BOX, box_low=[0, 0, -1]),
+                               [[.2, 7., -.5], [.7, -7., .1]])
+
+
+def test_pair_distances_match_brute_force():
+    rng = np.random.default_rng(0)
+    pos = rng.random((30, 3)) * [1., 3., 2.]
+    np.testing.assert_allclose(pair_distances(pos, BOX),
+                               brute_distances(pos, BOX), atol=1e-12)
+    np.testing.assert_allclose(pair_distances(pos),
+                               brute_distances(pos, np.zeros(3)), atol=1e-12)
+    # Frame axis last
+    pos_t = np.stack([pos, pos[::-1]], axis=-1)
+    np.testing.assert_allclose(pair_distances(pos_t, BOX)[:, :, 1],
+                               brute_distances(pos[::-1], BOX), atol=1e-12)
+
+
+@pytest.mark.parametrize('box_size', [None, BOX])
+def test_find_pairs_within(box_size):
+    rng = np.random.default_rng(1)
+    # Positions outside the box are wrapped before building the tree
+    pos = rng.random((60, 3)) * [1., 3., 2.] - .5
+    i_ind, j_ind, sep_vec = find_pairs_within(pos, .3, box_size)
+    dist = pair_distances(pos, box_size)
+    ref_i, ref_j = np.nonzero(np.triu(dist < .3, k=1))
+    assert (set(zip(i_ind.tolist(), j_ind.tolist())) ==
+            set(zip(ref_i.tolist(), ref_j.tolist())))
+    np.testing.assert_allclose(np.linalg.norm(sep_vec, axis=1),
+                               dist[i_ind, j_ind])
+
+
+def test_periodic_mean_across_boundary():
+    pos = np.array([[.95, 1., 1.9], [.05, 1.2, .1], [.9, 1.4, .2]])
+    np.testing.assert_allclose(periodic_mean(pos, BOX),
+                               [.95 + .05 / 3., 1.2, 1.9 + .5 / 3. - 2.])
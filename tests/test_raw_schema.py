@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_raw_schema.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Split and ragged raw data schemas.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.read_func import convert_dat_to_hdf
+from alens_analysis.raw_schema import (get_raw_dset, get_kind_schema,
+                                       get_ragged_raw, PackedRawView)
+
+from .conftest import write_result_dir
+
+KEYS = [np.s_[...], np.s_[2], np.s_[:, 3], np.s_[1:4, 2:5, ::2],
+        np.s_[..., -1], np.s_[-1, :, 3], np.s_[:, [0, 8], 1:3]]
+
+
+@pytest.fixture
+def packed_and_split(tmp_path):
+    write_result_dir(tmp_path / 'run')
+    convert_dat_to_hdf(tmp_path / 'packed.h5', tmp_path / 'run')
+    convert_dat_to_hdf(tmp_path / 'split.h5', tmp_path / 'run',
+                       schema='split')
+    return tmp_path / 'packed.h5', tmp_path / 'split.h5'
+
+
+@pytest.mark.parametrize('kind', ['sylinders', 'proteins'])
+def test_split_reads_as_packed(packed_and_split, kind):
+    packed_path, split_path = packed_and_split
+    with h5py.File(packed_path, 'r') as packed, \
+            h5py.File(split_path, 'r') as split:
+        assert get_kind_schema(packed['raw_data'], kind) == 'packed'
+        assert get_kind_schema(split['raw_data'], kind) == 'split'
+        packed_dset = get_raw_dset(packed, kind)
+        split_view = get_raw_dset(split, kind)
+        assert isinstance(split_view, PackedRawView)
+        assert split_view.shape == packed_dset.shape
+        # Integer id columns are stored exactly as int32
+        assert split[f'raw_data/{kind[:-1]}_ids'].dtype == np.int32
+        for key in KEYS:
+            np.testing.assert_array_equal(split_view[key], packed_dset[key],
+                                          err_msg=str(key))
+
+
+def test_split_view_writes(packed_and_split):
+    _, split_path = packed_and_split
+    with h5py.File(split_path, 'a') as split:
+        view = get_raw_dset(split, 'proteins')
+        new = np.arange(view.shape[0] * 10, dtype=float).reshape(-1, 10)
+        view[:, :, 0] = new
+        np.testing.assert_array_equal(view[:, :, 0], new)
+        with pytest.raises(IndexError):
+            view[:, 2:5, 0] = new[:, 2:5]
+
+
+def test_ragged_round_trip(tmp_path):
+    frames = write_result_dir(tmp_path / 'run', ragged=True)
+    convert_dat_to_hdf(tmp_path / 'ragged.h5', tmp_path / 'run',
+                       schema='ragged', dtype='f8')
+    with h5py.File(tmp_path / 'ragged.h5', 'r') as h5_data:
+        assert get_kind_schema(h5_data['raw_data'], 'proteins') == 'ragged'
+        with pytest.raises(TypeError):
+            get_raw_dset(h5_data, 'proteins')
+        prot = get_ragged_raw(h5_data, 'proteins')
+        syl = get_ragged_raw(h5_data, 'sylinders')
+        assert prot.nframes == syl.nframes == len(frames)
+        np.testing.assert_array_equal(prot.frame_sizes(),
+                                      [p.shape[0] for _, _, p in frames])
+        for i, (_, syl_ref, prot_ref) in enumerate(frames):
+            np.testing.assert_array_equal(prot.get_frame(i), prot_ref)
+            np.testing.assert_array_equal(syl.get_frame(i), syl_ref)
+
+        rows, offsets = prot.get_frames(2, 5)
+        for frame_rows, (_, _, prot_ref) in zip(
+                np.split(rows, offsets[1:-1]), frames[2:5]):
+            np.testing.assert_array_equal(frame_rows, prot_ref)
+
+        # gid time series only hold the frames the gid exists in
+        max_gid = max(p.shape[0] for _, _, p in frames) - 1
+        for gid in (0, max_gid):
+            gid_frames, gid_rows = prot.get_gid(gid)
+            ref = [(i, p[gid]) for i, (_, _, p) in enumerate(frames)
+                   if gid < p.shape[0]]
+            np.testing.assert_array_equal(gid_frames, [i for i, _ in ref])
+            np.testing.assert_array_equal(gid_rows, [r for _, r in ref])
+        assert prot.get_gid(max_gid + 1)[0].size == 0
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_seed_scan.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Seed averaged contact maps of a seed scan.
+"""
+
+import h5py
+import numpy as np
+import pytest
+import yaml
+
+from alens_analysis.chromatin.chrom_seed_scan_analysis import (
+    aggregate_scan_contacts, get_scan_avg_contact_level,
+    SCAN_CONTACT_GRP_NAME)
+from alens_analysis.chromatin.hic_pyramid import (write_hic_pyramid,
+                                                  PYRAMID_GRP_NAME)
+
+NBEADS = 24
+NSEEDS = 5
+
+
+def write_seed_file(path, seed, log_contact_mat, contact_kymo, pyramid=False):
+    """Seed file with the contact analysis products the scan reads."""
+    with h5py.File(path, 'w') as h5d:
+        h5d.attrs['RunConfig'] = yaml.dump({'rngSeed': seed})
+        analysis = h5d.create_group('analysis')
+        dset = analysis.create_dataset('avg_contact_mat',
+                                       data=log_contact_mat)
+        dset.attrs['log'] = True
+        analysis.create_dataset('contact_kymo', data=contact_kymo)
+        if pyramid:
+            write_hic_pyramid(analysis.create_group(PYRAMID_GRP_NAME),
+                              np.exp(log_contact_mat), min_bins=4)
+    return path
+
+
+def write_seeds(tmp_path, log_mats, pyramid=False):
+    rng = np.random.default_rng(1)
+    kymos = rng.random((len(log_mats), NBEADS, 9))
+    paths = [write_seed_file(tmp_path / f's{i}.h5', 10 + i, log_mat, kymo,
+                             pyramid)
+             for i, (log_mat, kymo) in enumerate(zip(log_mats, kymos))]
+    return paths, kymos
+
+
+def block_means(mat, bin_size):
+    edges = np.append(np.arange(0, mat.shape[0], bin_size), mat.shape[0])
+    return np.array([[mat[a:b, c:d].mean()
+                      for c, d in zip(edges[:-1], edges[1:])]
+                     for a, b in zip(edges[:-1], edges[1:])])
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_log_sum_exp_matches_mean(tmp_path, workers):
+    rng = np.random.default_rng(0)
+    log_mats = rng.uniform(-3., 0., size=(NSEEDS, NBEADS, NBEADS))
+    paths, kymos = write_seeds(tmp_path, log_mats)
+    with h5py.File(tmp_path / 'scan.h5', 'w') as h5_scan:
+        analysis = h5_scan.create_group('analysis')
+        log_avg, bin_edges, avg_kymo = aggregate_scan_contacts(
+            paths, analysis, workers=workers)
+        np.testing.assert_allclose(log_avg,
+                                   np.log(np.mean(np.exp(log_mats), axis=0)))
+        np.testing.assert_allclose(avg_kymo, kymos.mean(axis=0))
+        np.testing.assert_array_equal(bin_edges, np.arange(NBEADS + 1))
+        scan_grp = analysis[SCAN_CONTACT_GRP_NAME]
+        # Provenance in seed list order
+        assert list(scan_grp.attrs['seeds']) == [10 + i for i in range(NSEEDS)]
+        assert list(scan_grp.attrs['sources']) == [str(p) for p in paths]
+        np.testing.assert_allclose(scan_grp['log_avg_contact_mat'][...],
+                                   log_avg)
+
+
+def test_no_underflow(tmp_path):
+    rng = np.random.default_rng(2)
+    # Contact probabilities about 1e-7 (vmin=-7 of a log10 map) and far
+    # below the smallest double, where exp underflows to zero
+    log_mats = rng.uniform(-1., 1., size=(NSEEDS, NBEADS, NBEADS))
+    log_mats[:, :NBEADS // 2] += -7. * np.log(10.)
+    log_mats[:, NBEADS // 2:] += -800.
+    paths, _ = write_seeds(tmp_path, log_mats)
+    log_avg, _, _ = aggregate_scan_contacts(paths)
+    assert np.isfinite(log_avg).all()
+    shift = log_mats.max(axis=0)
+    ref = shift + np.log(np.mean(np.exp(log_mats - shift), axis=0))
+    np.testing.assert_allclose(log_avg, ref)
+    with np.errstate(divide='ignore'):
+        assert np.isinf(np.log(np.mean(np.exp(log_mats), axis=0))).any()
+
+
+def test_pyramid_level(tmp_path):
+    rng = np.random.default_rng(3)
+    log_mats = rng.uniform(-3., 0., size=(NSEEDS, NBEADS, NBEADS))
+    paths, _ = write_seeds(tmp_path, log_mats, pyramid=True)
+    log_avg, bin_edges = get_scan_avg_contact_level(paths, max_bins=7)
+    # Bins of 4 beads are the finest level with at most 7 bins
+    np.testing.assert_array_equal(bin_edges, np.arange(0, NBEADS + 1, 4))
+    ref = block_means(np.mean(np.exp(log_mats), axis=0), 4)
+    np.testing.assert_allclose(log_avg, np.log(ref))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_pyramid_fallback(tmp_path, workers):
+    rng = np.random.default_rng(4)
+    log_mats = rng.uniform(-3., 0., size=(NSEEDS, NBEADS, NBEADS))
+    paths, _ = write_seeds(tmp_path, log_mats, pyramid=True)
+    # A later seed without a pyramid is binned from its full matrix
+    write_seed_file(paths[2], 12, log_mats[2], np.zeros((NBEADS, 9)))
+    log_avg, bin_edges, _ = aggregate_scan_contacts(paths, max_bins=7,
+                                                    workers=workers)
+    np.testing.assert_array_equal(bin_edges, np.arange(0, NBEADS + 1, 4))
+    ref = block_means(np.mean(np.exp(log_mats), axis=0), 4)
+    np.testing.assert_allclose(log_avg, np.log(ref))
+
+
+def test_no_pyramid_in_first_seed(tmp_path):
+    rng = np.random.default_rng(5)
+    log_mats = rng.uniform(-3., 0., size=(NSEEDS, NBEADS, NBEADS))
+    paths, _ = write_seeds(tmp_path, log_mats, pyramid=True)
+    write_seed_file(paths[0], 10, log_mats[0], np.zeros((NBEADS, 9)))
+    log_avg, bin_edges = get_scan_avg_contact_level(paths, max_bins=7)
+    np.testing.assert_array_equal(bin_edges, np.arange(NBEADS + 1))
+    np.testing.assert_allclose(log_avg,
+                               np.log(np.mean(np.exp(log_mats), axis=0)))
+
+
+def test_empty_seed_list():
+    with pytest.raises(ValueError):
+        aggregate_scan_contacts([])
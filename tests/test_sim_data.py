@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_sim_data.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Memoized arrays of SimulationData against the raw data file.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.sim_data import SimulationData, get_sim_data, open_sim_data
+
+
+def test_arrays_are_memoized(raw_h5_path, chain_com):
+    with SimulationData(raw_h5_path) as sim:
+        com = sim.com()
+        np.testing.assert_allclose(com, chain_com)
+        # Later calls view the same memory instead of reading again
+        assert np.shares_memory(sim.com(), com)
+        assert np.shares_memory(sim.sylinders(), sim.sylinders())
+        np.testing.assert_allclose(sim.lengths(), .01)
+        np.testing.assert_allclose(sim.directions()[:, 2], 1.)
+        with h5py.File(raw_h5_path, 'r') as h5_data:
+            prot_dat = h5_data['raw_data/proteins'][...]
+        np.testing.assert_array_equal(sim.bound_state(),
+                                      prot_dat[:, 8:10] > -1)
+        np.testing.assert_array_equal(sim.n_bound_ends(),
+                                      (prot_dat[:, 8:10] > -1).sum(axis=1))
+        sim.clear_cache()
+        assert not np.shares_memory(sim.com(), com)
+
+
+def test_arrays_are_read_only(raw_h5_path):
+    with SimulationData(raw_h5_path) as sim:
+        com = sim.com()
+        with pytest.raises(ValueError):
+            com[0, 0, 0] = 1.
+        # Slices of a cached array are read only too
+        with pytest.raises(ValueError):
+            sim.com((0, 2), (0, 3))[...] = 0.
+        with pytest.raises(ValueError):
+            sim.sylinders()[:, 2:5] -= 1.
+        # A copy can be modified without touching the cache
+        com_copy = sim.com().copy()
+        com_copy += 1.
+        np.testing.assert_allclose(sim.com(), com)
+
+
+def test_ranges(raw_h5_path, chain_com):
+    with SimulationData(raw_h5_path) as sim:
+        # Read on its own before the full array exists
+        part = sim.com((2, 9), (5, 20))
+        np.testing.assert_allclose(part, chain_com[2:9, :, 5:20])
+        assert sim.com((2, 9), (5, 20)) is part
+
+        # Sliced out of the full array once it is cached
+        com = sim.com()
+        part = sim.com(slice(3, 7), (None, 12))
+        np.testing.assert_allclose(part, chain_com[3:7, :, :12])
+        assert np.shares_memory(part, com)
+        np.testing.assert_allclose(sim.time((4, 8)), .1 * np.arange(4, 8))
+
+
+def test_file_pass_through(raw_h5_path):
+    with h5py.File(raw_h5_path, 'r') as h5_data:
+        sim = get_sim_data(h5_data)
+        assert get_sim_data(sim) is sim
+        assert 'raw_data/sylinders' in sim
+        np.testing.assert_array_equal(sim['time'][...], h5_data['time'][...])
+        assert sim.attrs['RunConfig'] == h5_data.attrs['RunConfig']
+        assert sim.run_params['timeSnap'] == .1
+        assert sim.protein_params == {'proteins': []}
+        assert sim.path == raw_h5_path
+        with open_sim_data(sim) as same_sim:
+            assert same_sim is sim
+        # A SimulationData passed in is left open
+        assert sim['time'].shape == (h5_data['time'].shape[0],)
+        sim.close()
+        # so is a file it did not open
+        assert h5_data['time'].shape[0] > 0
+
+    with open_sim_data(raw_h5_path) as sim:
+        h5_file = sim.h5_data
+        assert sim.com().shape[0] > 0
+    assert not h5_file
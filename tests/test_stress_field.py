@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_stress_field.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Binned constraint stress against the total constraint stress.
+"""
+
+import h5py
+import numpy as np
+import pytest
+import vtk
+import yaml
+from vtk.util import numpy_support as vn
+
+from alens_analysis.read_func import (collect_stress_from_con_pvtp,
+                                      collect_stress_field_from_con_pvtp,
+                                      read_stress_field_from_con)
+
+from .conftest import write_result_dir
+
+NSYL = 6
+GRID_SHAPE = (2, 3, 4)
+BOX_LOW = [-1., -1., -1.]
+BOX_HIGH = [1., 1., 1.]
+
+
+def write_con_block(path, end0, end1, gid0, gid1, stress, bilateral,
+                    one_side):
+    """Write a ConBlock .pvtp file (and its piece) with one line cell per
+    constraint, as aLENS does."""
+    ncons = end0.shape[0]
+    points = vtk.vtkPoints()
+    points.SetData(vn.numpy_to_vtk(
+        np.ascontiguousarray(np.stack([end0, end1], axis=1).reshape(-1, 3)),
+        deep=True))
+    lines = vtk.vtkCellArray()
+    for i in range(ncons):
+        lines.InsertNextCell(2)
+        lines.InsertCellPoint(2 * i)
+        lines.InsertCellPoint(2 * i + 1)
+    poly = vtk.vtkPolyData()
+    poly.SetPoints(points)
+    poly.SetLines(lines)
+
+    gid = vn.numpy_to_vtk(np.stack([gid0, gid1], axis=1).ravel(), deep=True,
+                          array_type=vtk.VTK_INT)
+    gid.SetName('gid')
+    poly.GetPointData().AddArray(gid)
+    for name, arr, array_type in [('Stress', stress, vtk.VTK_DOUBLE),
+                                  ('bilateral', bilateral, vtk.VTK_INT),
+                                  ('oneSide', one_side, vtk.VTK_INT)]:
+        vtk_arr = vn.numpy_to_vtk(np.ascontiguousarray(arr), deep=True,
+                                  array_type=array_type)
+        vtk_arr.SetName(name)
+        poly.GetCellData().AddArray(vtk_arr)
+
+    writer = vtk.vtkXMLPPolyDataWriter()
+    writer.SetFileName(str(path))
+    writer.SetNumberOfPieces(1)
+    writer.SetStartPiece(0)
+    writer.SetEndPiece(0)
+    writer.SetInputData(poly)
+    writer.Write()
+
+
+def random_con_block(path, rng, ncons=40):
+    """Random constraints in the box plus three on bin edges: midpoints on an
+    inner grid plane, on the lower box corner, and on the upper box corner
+    (which wraps to the first bin)."""
+    end0 = rng.uniform(-1., 1., size=(ncons, 3))
+    end1 = end0 + rng.normal(scale=.05, size=(ncons, 3))
+    edge_mid = np.array([[0., -1. / 3., .5], BOX_LOW, BOX_HIGH])
+    end0 = np.concatenate([end0, edge_mid - .01])
+    end1 = np.concatenate([end1, edge_mid + .01])
+    ncons = end0.shape[0]
+    gid0 = rng.integers(0, NSYL, size=ncons)
+    gid1 = rng.integers(0, NSYL, size=ncons)
+    stress = rng.normal(size=(ncons, 9))
+    bilateral = rng.integers(0, 2, size=ncons)
+    one_side = (rng.random(ncons) < .3).astype(int)
+    write_con_block(path, end0, end1, gid0, gid1, stress, bilateral,
+                    one_side)
+    return end0, end1, stress, bilateral
+
+
+@pytest.fixture
+def con_run(tmp_path):
+    write_result_dir(tmp_path / 'run', nframes=4, nsyl=NSYL)
+    (tmp_path / 'run' / 'RunConfig.yaml').write_text(yaml.dump(
+        {'timeSnap': .1, 'simBoxLow': BOX_LOW, 'simBoxHigh': BOX_HIGH}))
+    rng = np.random.default_rng(3)
+    for frame_dir in (tmp_path / 'run' / 'result').iterdir():
+        for syl_path in frame_dir.glob('SylinderAscii_*.dat'):
+            i = syl_path.stem.split('_')[-1]
+            random_con_block(frame_dir / f'ConBlock_{i}.pvtp', rng)
+    return tmp_path / 'run'
+
+
+def test_edge_constraints_land_in_one_bin(tmp_path):
+    rng = np.random.default_rng(0)
+    con_path = tmp_path / 'ConBlock_0.pvtp'
+    _, _, stress, bilateral = random_con_block(con_path, rng, ncons=0)
+    bilat_field, col_field = read_stress_field_from_con(
+        con_path, GRID_SHAPE, BOX_LOW, BOX_HIGH)
+    field = bilat_field + col_field
+    ref = np.zeros(GRID_SHAPE + (3, 3))
+    # x = 0 is the lower edge of the second x bin, y = -1/3 the lower edge of
+    # the second y bin, and z = .5 the lower edge of the last z bin
+    ref[1, 1, 3] += stress[0].reshape(3, 3)
+    ref[0, 0, 0] += stress[1].reshape(3, 3) + stress[2].reshape(3, 3)
+    np.testing.assert_allclose(field, ref)
+
+
+@pytest.mark.parametrize('grid_shape', [GRID_SHAPE, None])
+def test_bins_sum_to_total_stress(con_run, tmp_path, grid_shape):
+    stress_path = tmp_path / 'stress.h5'
+    field_path = tmp_path / 'stress_field.h5'
+    collect_stress_from_con_pvtp(stress_path, con_run)
+    collect_stress_field_from_con_pvtp(field_path, con_run,
+                                       grid_shape=grid_shape, workers=2)
+    with h5py.File(stress_path, 'r') as h5_stress, \
+            h5py.File(field_path, 'r') as h5_field:
+        for kind in ('bilateral', 'collision'):
+            total = h5_stress[f'{kind}_stress'][...]
+            field = h5_field[f'{kind}_stress_field'][...]
+            nbin_axes = field.ndim - 3
+            assert field.shape[-1] == total.shape[-1]
+            np.testing.assert_allclose(
+                field.sum(axis=tuple(range(nbin_axes))), total, atol=1e-12)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""@package docstring
+File: test_time_blocks.py
+Author: Adam Lamson
+Email: alamson@flatironinstitute.org
+Description: Block iteration over raw data files.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from alens_analysis.time_blocks import get_block_bounds, iter_time_blocks
+
+
+def test_block_bounds():
+    assert get_block_bounds(10, 4) == [(0, 4, 0, 4), (4, 8, 4, 8),
+                                       (8, 10, 8, 10)]
+    assert get_block_bounds(10, 4, overlap=2) == [(0, 6, 0, 4), (2, 10, 4, 8),
+                                                  (6, 10, 8, 10)]
+    assert get_block_bounds(0, 4) == []
+    with pytest.raises(ValueError):
+        get_block_bounds(10, 0)
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+@pytest.mark.parametrize('stride,overlap', [(1, 0), (3, 0), (2, 2)])
+def test_cores_cover_selection(raw_h5_path, chain_com, prefetch, stride,
+                               overlap):
+    ts_range, bead_range = (2, 27), (4, 33)
+    ref = chain_com[4:33, :, 2:27:stride]
+    with h5py.File(raw_h5_path, 'r') as h5_data:
+        blocks = list(iter_time_blocks(h5_data, 'com', block_size=4,
+                                       stride=stride, overlap=overlap,
+                                       ts_range=ts_range,
+                                       bead_range=bead_range,
+                                       prefetch=prefetch))
+        time_ref = h5_data['time'][2:27:stride]
+        sy_blocks = list(iter_time_blocks(h5_data, 'sylinders', block_size=5,
+                                          ts_range=ts_range,
+                                          prefetch=prefetch))
+        sy_ref = h5_data['raw_data/sylinders'][:, :, 2:27]
+    com = np.concatenate([b.data[..., b.core] for b in blocks], axis=-1)
+    np.testing.assert_allclose(com, ref, rtol=1e-12, atol=1e-15)
+    np.testing.assert_array_equal(
+        np.concatenate([b.time[b.core] for b in blocks]), time_ref)
+    np.testing.assert_array_equal(
+        np.concatenate([b.frames[b.core] for b in blocks]),
+        np.arange(2, 27)[::stride])
+    for b in blocks:
+        # Overlap frames are real neighbouring frames
+        np.testing.assert_array_equal(b.frames, np.arange(
+            b.frames[0], b.frames[-1] + 1, stride))
+    np.testing.assert_array_equal(
+        np.concatenate([b.data[..., b.core] for b in sy_blocks], axis=-1),
+        sy_ref)
+
+
+def test_bad_kind(raw_h5_path):
+    with h5py.File(raw_h5_path, 'r') as h5_data:
+        with pytest.raises(ValueError):
+            next(iter_time_blocks(h5_data, 'filaments'))